@@ -0,0 +1,495 @@
+# KAGC Change Tracking and Incremental Recompute
+
+"""
+This moduel keeps track of changes to the art table of the project SQLite database so that, when
+the specialists add or edit rows, only the affected contexts and Depositional Units (DU) are
+recomputed. Every row is identified by its SQLite rowid and a hash of its contents; comparing two
+snapshots gives the added, deleted and edited rows, their contexts, and through the
+KAGC_Depositional_Units lists the DUs whose summaries, TPQ tables and figures need refreshing.
+
+# File Metadata
+* Associated Publication: Given, Michael, Chris Mavromatis, and R. Smadar Gabrieli, ed. (2024) City and Cemetery: Excavations at Kourion’s Amathous Gate Cemetery, Cyprus. The Excavations of Danielle A. Parks (Annual of the American Society of Overseas Research, Volumes 76 & 77, ASOR).
+
+    * Main Publication Chapter(s) that use or mention these functions:
+
+    Mavromatis, Christopher. Michae Given (2024) Chapter 3 Methodology. Pp: 21-34. In Given, Michael, Chris Mavromatis, and R. Smadar Gabrieli, ed. (2024) City and Cemetery: Excavations at Kourion’s Amathous Gate Cemetery, Cyprus. The Excavations of Danielle A. Parks (Annual of the American Society of Overseas Research, Volume 76 ASOR)
+
+* File Name: KAGC_Cache.py
+
+* File Format: text
+
+* Software:
+    * Python (3.10.10), Ipython (8.12.0),
+        * Python Distibution: Anaconda 3
+    * Visual Studio Code (1.79.2)
+
+* Processing History:
+    * Incremental analysis of cleaned artifact datasets by Depositional Unit (DU).
+
+* Required Python Packages:
+    * pandas    : 1.5.3
+    * numpy     : 1.23.5
+    * sqlite3   : 2.6.0
+    * pyarrow   : optional (ResultCache writes Parquet with it, pickles without it)
+    * pickle, json, hashlib, atexit (standard library)
+
+* Other Project Moduels:
+    * KAGC_Functions
+    * KAGC_Context_Class
+    * KAGC_Depositional_Units
+"""
+
+
+# Change tracking
+def Snapshot(db):
+    """
+    Reads the rowid, cxn and a content hash of every row of the art table.
+
+    Arguments:
+        * db = path to the project SQLite database, or a KAGC_FUN.DBSession
+
+    Returns:
+        a dataframe with _rowid, cxn and hash (uint64 over all the row's values)
+
+    Requires:
+        * pandas
+        * KAGC_Functions
+
+    e.g., snap = KAGC_CACHE.Snapshot(art_db)
+    """
+
+    import pandas as pd
+    import KAGC_Functions as KAGC_FUN
+
+    conn, own = KAGC_FUN._db_conn(db)
+    df = pd.read_sql_query('SELECT rowid AS _rowid, * FROM art', conn)
+    if own:
+        conn.close()
+
+    h = pd.util.hash_pandas_object(df.drop(columns='_rowid'), index=False)
+    return pd.DataFrame({'_rowid': df._rowid.to_numpy(),
+                         'cxn': df.cxn.to_numpy(),
+                         'hash': h.to_numpy()})
+
+
+def Changes(old, new):
+    """
+    Compares two snapshots of the art table.
+
+    Arguments:
+        * old, new = dataframes from Snapshot(); old may be None (everything is new)
+
+    Returns:
+        a dictionary with
+            - 'added', 'deleted', 'edited': arrays of rowids
+            - 'contexts': the set of cxn values touched, including the old cxn of edited rows that moved context
+
+    e.g., KAGC_CACHE.Changes(snap, KAGC_CACHE.Snapshot(art_db))
+    """
+
+    import numpy as np
+    import pandas as pd
+
+    if old is None:
+        old = new.iloc[:0]
+    m = old.merge(new, on='_rowid', how='outer', suffixes=('_old', '_new'), indicator=True)
+
+    added = m[m._merge == 'right_only']
+    deleted = m[m._merge == 'left_only']
+    edited = m[(m._merge == 'both') & (m.hash_old != m.hash_new)]
+
+    contexts = set(added.cxn_new) | set(deleted.cxn_old) | set(edited.cxn_old) | set(edited.cxn_new)
+    return {'added': added._rowid.to_numpy(),
+            'deleted': deleted._rowid.to_numpy(),
+            'edited': edited._rowid.to_numpy(),
+            'contexts': {c for c in contexts if not pd.isna(c)}}
+
+
+def Affected(contexts, DUS):
+    """
+    Returns the names of the DUs that list any of the given contexts as Contributing Contexts.
+
+    Arguments:
+        * contexts = a set of cxn values, eg Changes(...)['contexts']
+        * DUS = a dictionary of DU names and Contributing Context lists, eg KAGC_DUS.DU_Dict()
+
+    e.g., KAGC_CACHE.Affected({'TRA12-52.2'}, KAGC_DUS.DU_Dict())  -> ['A002', 'A005']
+    """
+
+    contexts = set(contexts)
+    return [du for du, cc in DUS.items() if not contexts.isdisjoint(cc)]
+
+
+class Tracker():
+    """
+    Runs per-DU tasks (DU summaries, TPQ tables, figures) and re-runs them only for DUs whose
+    contexts changed in the art table since the last run. The table snapshot and the results are
+    kept in a pickle state file between sessions.
+
+    A task is a function taking the DU's Context object; its return value is kept (a task that
+    saves a figure can return None). A DU is recomputed when one of its contexts changed, when its
+    Contributing Context list or the res value changed, or when a task has no result for it yet.
+    Unaffected DUs keep their previous results, and only recomputed DUs are loaded from the
+    database (with KAGC_FUN.DU_Load).
+
+    Arguments:
+        * db = path to the project SQLite database, or a KAGC_FUN.DBSession
+        * state = path of the pickle file that holds the snapshot and results
+        * DUS = a dictionary of DU names and Contributing Context lists, eg KAGC_DUS.DU_Dict()
+        * res = residual cutoff date, as for the Context class
+
+    Requires:
+        * pickle
+        * pathlib
+        * KAGC_Functions
+        * KAGC_Context_Class
+
+    E.g., tr = KAGC_CACHE.Tracker(art_db, 'kagc_state.pkl', KAGC_DUS.DU_Dict(), -24)
+          out = tr.Run({'DUSmry': lambda c: c.DUSmry(), 'TPQ': lambda c: c.MCLS_TPQS()})
+          KAGC_CACHE.Table(out['DUSmry'])
+    """
+
+    def __init__(self, db, state, DUS, res):
+        import pickle
+        import pathlib
+
+        self.db = db
+        self.state = pathlib.Path(state)
+        self.DUS = {k: list(v) for k, v in DUS.items()}
+        self.res = res
+        if self.state.exists():
+            with open(self.state, 'rb') as f:
+                saved = pickle.load(f)
+        else:
+            saved = {}
+        self.snapshot = saved.get('snapshot')
+        self.results = saved.get('results', {})
+        self.lists = saved.get('lists', {})
+        self.last_res = saved.get('res')
+        self.last = {}
+
+    def Scan(self):
+        """
+        Snapshots the art table and returns the changes since the last run and the affected DUs.
+        """
+        new = Snapshot(self.db)
+        ch = Changes(self.snapshot, new)
+        ch['DUs'] = Affected(ch['contexts'], self.DUS)
+        return new, ch
+
+    def Stale(self, tasks, changes):
+        """
+        The DUs that need recomputing for the given task names and changes.
+        """
+        if self.snapshot is None or self.res != self.last_res:
+            return list(self.DUS)
+        stale = set(changes['DUs'])
+        stale |= {du for du, cc in self.DUS.items() if self.lists.get(du) != cc}
+        for t in tasks:
+            stale |= set(self.DUS) - set(self.results.get(t, {}))
+        return [du for du in self.DUS if du in stale]
+
+    def Run(self, tasks):
+        """
+        Runs the tasks for the stale DUs, saves the state, and returns {task: {DU: result}} for every DU.
+        """
+        import pickle
+        import KAGC_Functions as KAGC_FUN
+        import KAGC_Context_Class as co
+
+        new, ch = self.Scan()
+        stale = self.Stale(tasks, ch)
+        if self.res != self.last_res:
+            self.results = {}
+
+        for du in stale:
+            cdu = KAGC_FUN.DU_Load(self.db, self.DUS[du], du)
+            ctx = co.Context(cdu, self.res)
+            for t, fn in tasks.items():
+                self.results.setdefault(t, {})[du] = fn(ctx) if len(cdu) else None
+
+        for t in self.results:
+            for du in set(self.results[t]) - set(self.DUS):
+                del self.results[t][du]
+
+        self.snapshot = new
+        self.lists = {k: list(v) for k, v in self.DUS.items()}
+        self.last_res = self.res
+        self.last = {'changes': ch, 'recomputed': stale}
+        with open(self.state, 'wb') as f:
+            pickle.dump({'snapshot': self.snapshot, 'results': self.results,
+                         'lists': self.lists, 'res': self.res}, f)
+
+        return {t: {du: self.results[t].get(du) for du in self.DUS} for t in tasks}
+
+
+def Table(results):
+    """
+    Stacks the dataframe results of one Tracker task into a single dataframe (eg every DU's DUSmry).
+
+    e.g., KAGC_CACHE.Table(out['DUSmry'])
+    """
+
+    import pandas as pd
+
+    parts = [r for r in results.values() if isinstance(r, pd.DataFrame)]
+    return pd.concat(parts, ignore_index=True) if parts else pd.DataFrame()
+
+
+# Results cache
+def Code_Version():
+    """
+    A short hash of the analysis code (KAGC_Functions, KAGC_Context_Class, KAGC_Marker_Artifacts), 
+    so cached results are not reused after the code that made them changes.
+    """
+
+    import hashlib
+    import pathlib
+
+    h = hashlib.sha256()
+    here = pathlib.Path(__file__).parent
+    for f in ['KAGC_Functions.py', 'KAGC_Context_Class.py', 'KAGC_Marker_Artifacts.py']:
+        p = here / f
+        if p.exists():
+            h.update(p.read_bytes())
+    return h.hexdigest()[:12]
+
+
+def Data_Hash(df, columns=None):
+    """
+    A hash of a dataframe's rows (index and values), eg a Context's source rows.
+    """
+
+    import hashlib
+    import pandas as pd
+
+    if columns is not None:
+        df = df[[c for c in columns if c in df.columns]]
+    h = pd.util.hash_pandas_object(df, index=True).to_numpy()
+    return hashlib.sha256(h.tobytes() + repr(list(df.columns)).encode()).hexdigest()
+
+
+class ResultCache():
+    """
+    A persistent on-disk cache for Context outputs (FCounts, MCLS_TPQS, CC_TPQS, DUSmry, the MKG 
+    crosstabs, ...), so a new session can rebuild its tables without SQLite. Each table is written 
+    as Parquet (or as a pickle when pyarrow is missing or the table cannot be stored as Parquet) 
+    and recorded in manifest.json.
+
+    An entry is keyed by a hash of the method, the source rows, the DU's Contributing Context list, 
+    the res cutoff and the code version. The manifest keeps those parts, so an entry can also be found 
+    from its definition and the source-data hash (Load) without recomputing it. Each file's sha256 
+    is recorded, and a file whose size or modification time has changed is only used if it still 
+    matches. When the files pass max_bytes the least recently used entries are removed.
+
+    The manifest is written when entries are added or removed; the access times of cache hits are 
+    kept in memory and written by Flush(), which also runs when the session ends.
+
+    Arguments:
+        * path = cache directory
+        * max_bytes = size limit of the cached files
+        * version = code version; defaults to Code_Version()
+
+    Requires:
+        * pandas
+        * json
+        * hashlib
+        * pathlib
+
+    E.g., rc = KAGC_CACHE.ResultCache('kagc_cache')
+          fc = rc.Fetch(b503, 'FCounts', KAGC_DUS.B503)          # computed once, then read from disk
+          rc.Load('DUSmry', 'B503', KAGC_DUS.B503, -24, b503.SourceHash())   # another session
+    """
+
+    methods = ['FCounts', 'MCLS_TPQS', 'CC_TPQS', 'UniqueForms', 'ResidualForms', 'DUCatNos', 
+               'DUSmry', 'MKG1', 'MKG2', 'MKG3']
+
+    def __init__(self, path, max_bytes=2**30, version=None):
+        import atexit
+        import json
+        import pathlib
+
+        self.path = pathlib.Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.version = version or Code_Version()
+        self.mf = self.path / 'manifest.json'
+        self.manifest = json.loads(self.mf.read_text()) if self.mf.exists() else {}
+        self.tick = max([e['used'] for e in self.manifest.values()], default=0)
+        self.dirty = False
+        atexit.register(self.Flush)
+
+    def _save(self):
+        import json
+        import os
+
+        tmp = self.mf.with_suffix('.tmp')
+        tmp.write_text(json.dumps(self.manifest, indent=1, default=str))
+        os.replace(tmp, self.mf)
+        self.dirty = False
+
+    def Flush(self):
+        """
+        Writes the manifest if cache hits have updated access times since it was last written.
+        """
+        if self.dirty and self.path.exists():
+            self._save()
+
+    def _touch(self, key):
+        self.tick += 1
+        self.manifest[key]['used'] = self.tick
+        self.dirty = True
+
+    def _definition(self, method, du, cc, res):
+        return {'method': method, 'DU': str(du), 'cc': list(cc), 'res': res, 'version': self.version}
+
+    def Key(self, method, du, cc, res, data):
+        """
+        The cache key for a method's result on a DU definition and a source-data hash.
+        """
+        import hashlib
+        import json
+
+        d = self._definition(method, du, cc, res)
+        d['data'] = data
+        return hashlib.sha256(json.dumps(d, sort_keys=True, default=str).encode()).hexdigest()[:32]
+
+    def Valid(self, key):
+        """
+        True if the entry is in the manifest and its file is present and unchanged: the same size, 
+        and the same modification time or, failing that, the same sha256.
+        """
+        import KAGC_Functions as KAGC_FUN
+
+        e = self.manifest.get(key)
+        if e is None or 'sha256' not in e:
+            return False
+        f = self.path / e['file']
+        if not f.exists():
+            return False
+        st = f.stat()
+        if st.st_size != e['size']:
+            return False
+        if st.st_mtime_ns == e['mtime']:
+            return True
+        if KAGC_FUN._file_hash(f) != e['sha256']:
+            return False
+        e['mtime'] = st.st_mtime_ns
+        self.dirty = True
+        return True
+
+    def Get(self, key):
+        """
+        The cached result for key, or None.
+        """
+        import pandas as pd
+
+        if not self.Valid(key):
+            return None
+        e = self.manifest[key]
+        f = self.path / e['file']
+        x = pd.read_parquet(f) if e['format'] == 'parquet' else pd.read_pickle(f)
+        self._touch(key)
+        return x
+
+    def Put(self, key, x, **meta):
+        """
+        Stores a result under key and evicts least recently used entries beyond max_bytes.
+        """
+        import pandas as pd
+        import KAGC_Functions as KAGC_FUN
+
+        f, fmt = self.path / (key + '.parquet'), 'parquet'
+        try:
+            if not isinstance(x, pd.DataFrame):
+                raise TypeError
+            x.to_parquet(f)
+            if not pd.read_parquet(f).equals(x):
+                raise ValueError
+        except Exception:
+            if f.exists():
+                f.unlink()
+            f, fmt = self.path / (key + '.pkl'), 'pickle'
+            pd.to_pickle(x, f)
+
+        st = f.stat()
+        self.manifest[key] = dict(meta, file=f.name, format=fmt, size=st.st_size, mtime=st.st_mtime_ns, 
+                                  sha256=KAGC_FUN._file_hash(f), used=0)
+        self._touch(key)
+        self.Evict()
+        self._save()
+
+    def Evict(self, max_bytes=None):
+        """
+        Removes least recently used entries until the cached files fit in max_bytes.
+        """
+        limit = self.max_bytes if max_bytes is None else max_bytes
+        total = sum(e['size'] for e in self.manifest.values())
+        for key in sorted(self.manifest, key=lambda k: self.manifest[k]['used']):
+            if total <= limit:
+                break
+            total -= self.manifest[key]['size']
+            self.Remove(key)
+
+    def Remove(self, key):
+        e = self.manifest.pop(key, None)
+        if e is not None:
+            f = self.path / e['file']
+            if f.exists():
+                f.unlink()
+            self.dirty = True
+
+    def Clear(self):
+        for key in list(self.manifest):
+            self.Remove(key)
+        self._save()
+
+    def Fetch(self, ctx, method, cc=None):
+        """
+        A Context method's result from the cache, computing and storing it on a miss.
+
+        Arguments:
+            * ctx = a Context object
+            * method = the method name, eg 'FCounts'
+            * cc = the DU's Contributing Context list (defaults to the contexts in ctx.cdu)
+        """
+        du = ctx.cdu.DU.iloc[0] if len(ctx.cdu) else ''
+        cc = sorted(ctx.cdu.cxn.dropna().unique()) if cc is None else cc
+        key = self.Key(method, du, cc, ctx.res, ctx.SourceHash())
+        x = self.Get(key)
+        if x is None:
+            x = getattr(ctx, method)()
+            self.Put(key, x, data=ctx.SourceHash(), **self._definition(method, du, cc, ctx.res))
+        return x
+
+    def Load(self, method, du, cc, res, data):
+        """
+        The most recently used entry for a DU definition whose source rows match data (or None), 
+        without recomputing it. The source hash is required, so results computed from other data 
+        are never returned.
+
+        Arguments:
+            * data = the hash of the source rows, eg b503.SourceHash() or Data_Hash(...), or the 
+              source dataframe itself
+        """
+        import pandas as pd
+
+        if isinstance(data, pd.DataFrame):
+            data = Data_Hash(data)
+        if not data:
+            raise ValueError('Load needs the hash of the source rows (eg ctx.SourceHash())')
+        want = self._definition(method, du, cc, res)
+        hits = [k for k, e in self.manifest.items() 
+                if all(e.get(f) == v for f, v in want.items()) and e.get('data') == data]
+        hits = [k for k in hits if self.Valid(k)]
+        if not hits:
+            return None
+        return self.Get(max(hits, key=lambda k: self.manifest[k]['used']))
+
+    def Info(self):
+        """
+        The cached entries as a dataframe.
+        """
+        import pandas as pd
+
+        return pd.DataFrame.from_dict(self.manifest, orient='index').drop(columns=['cc'], errors='ignore')
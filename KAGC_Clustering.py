@@ -0,0 +1,259 @@
+# KAGC Clustering and Seriation
+
+"""
+This moduel contains functions for grouping and ordering contexts and Depositional Units (DU)
+from their assemblages: hierarchical clustering of the Jaccard or Gower matrices in KAGC_Functions,
+and correspondence analysis (CA) seriation of type-frequency incidence tables. The groups it returns
+are in the same form as KAGC_Depositional_Units, so hand-made DUs can be checked against them.
+
+# File Metadata
+* Associated Publication: Given, Michael, Chris Mavromatis, and R. Smadar Gabrieli, ed. (2024) City and Cemetery: Excavations at Kourion’s Amathous Gate Cemetery, Cyprus. The Excavations of Danielle A. Parks (Annual of the American Society of Overseas Research, Volumes 76 & 77, ASOR).
+
+    * Main Publication Chapter(s) that use or mention these functions:
+
+    Mavromatis, Christopher. Michae Given (2024) Chapter 3 Methodology. Pp: 21-34. In Given, Michael, Chris Mavromatis, and R. Smadar Gabrieli, ed. (2024) City and Cemetery: Excavations at Kourion’s Amathous Gate Cemetery, Cyprus. The Excavations of Danielle A. Parks (Annual of the American Society of Overseas Research, Volume 76 ASOR)
+
+* File Name: KAGC_Clustering.py
+
+* File Format: text
+
+* Software:
+    * Python (3.10.10), Ipython (8.12.0),
+        * Python Distibution: Anaconda 3
+    * Visual Studio Code (1.79.2)
+
+* Processing History:
+    * Grouping and ordering of contexts and DUs from cleaned artifact datasets.
+
+* Required Python Packages:
+    * pandas    : 1.5.3
+    * numpy     : 1.23.5
+    * scipy     : 1.10.0
+
+* Other Project Moduels:
+    * KAGC_Functions
+    * KAGC_Context_Class
+    * KAGC_Depositional_Units
+"""
+
+
+def _condensed(D, similarity=False):
+    """
+    Returns a condensed distance vector and the unit labels from a condensed vector,
+    a square array or a labelled square dataframe (eg Jaccard_Matrix output).
+    """
+
+    import numpy as np
+    import pandas as pd
+    from scipy.spatial.distance import squareform
+
+    labels = None
+    if isinstance(D, pd.DataFrame):
+        labels = list(D.index)
+        D = D.to_numpy(dtype=float)
+    D = np.asarray(D, dtype=float)
+
+    if D.ndim == 2:
+        if similarity:
+            D = 1.0 - D
+        np.fill_diagonal(D, 0.0)
+        D = squareform(D, checks=False)
+    elif similarity:
+        D = 1.0 - D
+    return np.nan_to_num(D, nan=1.0), labels
+
+
+def Type_Table(contexts, on='idn'):
+    """
+    Builds a unit x type-form frequency table from a dictionary of Context objects,
+    using each one's FCounts() frequencies.
+
+    Parameters:
+        * contexts = a dictionary of names and Context objects, eg {'A603': A603, 'A009': A009}
+        * on = the FCounts column used as the type, eg 'idn' or 'diag'
+
+    Returns:
+        a tuple of (scipy csr matrix, unit labels, type labels), as KAGC_FUN.Incidence
+
+    e.g., KAGC_CLU.Type_Table({'A603': A603, 'A009': A009})
+    """
+
+    import numpy as np
+    import pandas as pd
+    from scipy import sparse
+
+    parts = []
+    for name, c in contexts.items():
+        fc = c.FCounts()
+        parts.append(pd.DataFrame({'unit': name, 'item': fc[on].astype(object), 'freq': fc['freq']}))
+    long = pd.concat(parts, ignore_index=True).dropna(subset=['item'])
+
+    ulab = list(contexts)
+    ucode = pd.Categorical(long.unit, categories=ulab).codes
+    icode, ilab = pd.factorize(long.item, sort=True)
+    m = sparse.csr_matrix((long.freq.to_numpy(dtype=float), (ucode, icode)), shape=(len(ulab), len(ilab)))
+    m.sum_duplicates()
+    return m, pd.Index(ulab, name='unit'), pd.Index(ilab, name=on)
+
+
+def Hierarchical(D, labels=None, method='average', similarity=False, k=None, t=None, criterion='distance'):
+    """
+    Hierarchical clustering of contexts or DUs from a distance (or similarity) matrix.
+
+    Parameters:
+        * D = a condensed distance vector (eg KAGC_FUN.Gower_Matrix) or a square matrix / dataframe (eg KAGC_FUN.Jaccard_Matrix)
+        * labels = unit labels; taken from the dataframe index when D is a dataframe
+        * method = scipy linkage method, eg 'average', 'complete', 'single', 'ward'
+        * similarity = True when D is a similarity (eg Jaccard), which is converted to 1 - D
+        * k = cut the tree into k groups
+        * t = cut the tree at height t (with criterion) when k is not given
+
+    Returns:
+        a dictionary with
+            - 'order': the unit labels in dendrogram leaf order
+            - 'linkage': the scipy linkage matrix
+            - 'dendrogram': scipy dendrogram data (no plot), for plotting later with matplotlib
+            - 'groups': a dictionary of group name: list of units, as KAGC_Depositional_Units (only when k or t is given)
+
+    Requires:
+        * numpy
+        * scipy
+
+    e.g., KAGC_CLU.Hierarchical(KAGC_FUN.Jaccard_Matrix(df), similarity=True, k=12)
+    """
+
+    import numpy as np
+    from scipy.cluster import hierarchy
+
+    d, dlab = _condensed(D, similarity)
+    labels = list(labels if labels is not None else dlab if dlab is not None else
+                  range(int(np.ceil(np.sqrt(2 * len(d))))))
+
+    Z = hierarchy.linkage(d, method=method)
+    out = {'order': [labels[i] for i in hierarchy.leaves_list(Z)],
+           'linkage': Z,
+           'dendrogram': hierarchy.dendrogram(Z, no_plot=True, labels=labels)}
+
+    if k is not None or t is not None:
+        g = hierarchy.fcluster(Z, k, criterion='maxclust') if k is not None else hierarchy.fcluster(Z, t, criterion=criterion)
+        groups = {}
+        for i in hierarchy.leaves_list(Z):
+            groups.setdefault('G{:02d}'.format(g[i]), []).append(labels[i])
+        out['groups'] = groups
+    return out
+
+
+def CA_Seriation(table, n_components=2, rows=None, cols=None):
+    """
+    Correspondence analysis seriation of a unit x type frequency (or incidence) table.
+    Units and types are ordered by their first CA dimension.
+
+    The standardized residuals are never formed as a dense matrix: a truncated SVD (scipy svds)
+    runs on a linear operator over the sparse table, so thousands of units cost little memory.
+
+    Parameters:
+        * table = a dataframe (units x types), or the (matrix, unit labels, type labels) tuple from
+          KAGC_FUN.Incidence or Type_Table
+        * n_components = number of CA dimensions
+        * rows, cols = labels when table is a bare matrix
+
+    Returns:
+        a dictionary with
+            - 'order': the units in seriation order
+            - 'type order': the types in seriation order
+            - 'rows': a dataframe of unit coordinates (principal) by dimension
+            - 'cols': a dataframe of type coordinates (principal) by dimension
+            - 'inertia': the principal inertia of each dimension
+
+    Requires:
+        * numpy
+        * pandas
+        * scipy
+
+    e.g., KAGC_CLU.CA_Seriation(KAGC_FUN.Incidence(df, 'cxn', 'idn_code', binary=False))
+    """
+
+    import numpy as np
+    import pandas as pd
+    from scipy import sparse
+    from scipy.sparse.linalg import LinearOperator, svds
+
+    if isinstance(table, tuple):
+        table, rows, cols = table
+    if isinstance(table, pd.DataFrame):
+        rows, cols = table.index, table.columns
+        table = table.to_numpy(dtype=float)
+    N = sparse.csr_matrix(table, dtype=float)
+
+    rsum = np.asarray(N.sum(axis=1)).ravel()
+    csum = np.asarray(N.sum(axis=0)).ravel()
+    rk, ck = rsum > 0, csum > 0
+    N = N[rk][:, ck]
+    rows = pd.Index(rows if rows is not None else range(len(rk)))[rk]
+    cols = pd.Index(cols if cols is not None else range(len(ck)))[ck]
+
+    P = N / N.sum()
+    r = np.asarray(P.sum(axis=1)).ravel()
+    c = np.asarray(P.sum(axis=0)).ravel()
+    ir, ic = 1 / np.sqrt(r), 1 / np.sqrt(c)
+    sr, sc = np.sqrt(r), np.sqrt(c)
+
+    # S = Dr^-1/2 (P - r c') Dc^-1/2 = Dr^-1/2 P Dc^-1/2 - sqrt(r) sqrt(c)'
+    def matvec(v):
+        v = np.ravel(v)
+        return ir * (P @ (ic * v)) - sr * (sc @ v)
+
+    def rmatvec(u):
+        u = np.ravel(u)
+        return ic * (P.T @ (ir * u)) - sc * (sr @ u)
+
+    S = LinearOperator(P.shape, matvec=matvec, rmatvec=rmatvec, dtype=float)
+    k = min(n_components, min(P.shape) - 1)
+    U, s, Vt = svds(S, k=k, random_state=0)
+    o = np.argsort(s)[::-1]
+    U, s, Vt = U[:, o], s[o], Vt[o]
+
+    flip = np.sign(U[np.abs(U).argmax(axis=0), range(k)])
+    U, Vt = U * flip, Vt * flip[:, None]
+
+    dims = ['Dim{}'.format(i + 1) for i in range(k)]
+    F = pd.DataFrame(ir[:, None] * U * s, index=rows, columns=dims)
+    G = pd.DataFrame(ic[:, None] * Vt.T * s, index=cols, columns=dims)
+
+    return {'order': list(F.Dim1.sort_values(kind='stable').index),
+            'type order': list(G.Dim1.sort_values(kind='stable').index),
+            'rows': F,
+            'cols': G,
+            'inertia': pd.Series(s ** 2, index=dims)}
+
+
+def Check_Groups(groups, DUS):
+    """
+    Compares clustered groups of contexts with DU groupings, eg from Hierarchical(...)['groups']
+    and KAGC_DUS.DU_Dict(). Contexts listed in several DUs count once in each.
+
+    Parameters:
+        * groups = a dictionary of group name: list of contexts
+        * DUS = a dictionary of DU names and Contributing Context lists
+
+    Returns:
+        a dictionary with
+            - 'Overlap': a group x DU dataframe of shared contexts
+            - 'Best DU': for each group, the DU it shares most contexts with and the share of the group's contexts
+
+    e.g., KAGC_CLU.Check_Groups(KAGC_CLU.Hierarchical(j, similarity=True, k=60)['groups'], KAGC_DUS.DU_Dict())
+    """
+
+    import pandas as pd
+
+    g = pd.DataFrame([(k, c) for k, v in groups.items() for c in v], columns=['group', 'cxn'])
+    d = pd.DataFrame([(k, c) for k, v in DUS.items() for c in dict.fromkeys(v)], columns=['DU', 'cxn'])
+    m = g.merge(d, on='cxn')
+    x = pd.crosstab(m.group, m.DU)
+    x = x.reindex(index=list(groups), fill_value=0)
+
+    size = g.groupby('group').size().reindex(x.index)
+    best = pd.DataFrame({'DU': x.idxmax(axis=1).where(x.max(axis=1) > 0),
+                         'share': (x.max(axis=1) / size).round(2)})
+    return {'Overlap': x,
+            'Best DU': best}
@@ -54,11 +54,32 @@ Provides a mid-level framework for the analysis of a Dataframe comprised of eith
 
 * Other Project Moduels:
     * KAGC_Functions
+    * KAGC_Cache (SourceHash)
     * KAGC_Marker_Artifacts
     * KAGC_Depositional_Units
 """
 
 
+def _memoized(method):
+    """
+    Serves a Context method's result from the instance cache after its first call. 
+    Each call returns a copy of the cached table, so callers can add columns or edit cells 
+    (e.g. plot labels) without altering what later calls return.
+    """
+    import functools
+
+    @functools.wraps(method)
+    def wrapper(self):
+        key = method.__name__
+        if key in self._cache:
+            self.cache_hits += 1
+        else:
+            self.cache_misses += 1
+            self._cache[key] = method(self)
+        return self._cache[key].copy()
+    return wrapper
+
+
 class Context():
     """
     The Context class played a crucial role in the KAGC's analysis framework 
@@ -100,6 +121,22 @@ class Context():
         * MKG3: Returns a subset of the DU's assemblage comprised of items associated 
           with Marker Group 3 artifacts (See, Vol. 1 Chapter 3 Fig. 3.3)          
     
+    The derived tables (MCLS_TPQS, CC_TPQS, UniqueForms, ResidualForms, FCounts, DUCatNos, 
+    and the MKG crosstabs) are computed once per instance and then served from memory. 
+    Assigning a new cdu or res clears them; CacheInfo() reports the hit and miss counts.
+
+    The cached tables are not rebuilt when the cdu's values are edited in place 
+    (ctx.cdu.loc[...] = ...): assign the edited frame (ctx.cdu = edited) or call ClearCache() 
+    afterwards. Adding a column to the cdu does not affect them.
+
+    The cdu is never modified by the methods. The derived variables (Dspan, MPDate, EAAD and idn) 
+    are computed once, when first needed, and kept beside it (Derived); MCLS_Grps and ResidualForms 
+    attach them to shallow copies of the cdu, so each method returns the same columns whatever ran 
+    before it, and a large DU is held in memory about once.
+
+    Span (with its SpanIndex) selects artifacts in production in a year, range, or after a cutoff, 
+    and MCSim simulates TPQ, MMDate and NRF:RF with credible intervals.
+
     The Class requires
         Pandas
         Numpy
@@ -110,96 +147,213 @@ class Context():
 
 
     E.G.,  b503 = co.Context(KAGC_FUN.DU_Select(df, KAGC_DUS.B503, 'B503'), -24) 
+           b503 = co.Context('art_snapshot', -24, KAGC_DUS.B503, 'B503')  # from a KAGC_FUN.DB_Export snapshot
     """
 ## Main Methods
-    import pandas as pd
 
-    def __init__(self, cdu, res):
+    def __init__(self, cdu, res, DU=None, du=None):
+        import pathlib
+        import KAGC_Functions as KAGC_FUN
+
+        if isinstance(cdu, (str, pathlib.Path)):
+            # a DB_Export snapshot: select the DU from it
+            cdu = KAGC_FUN.DU_Select(cdu, DU, du)
+        self._cache = {}
+        self.cache_hits = 0
+        self.cache_misses = 0
         self.cdu = cdu
         self.res = res
 
+    @property
+    def cdu(self):
+        return self._cdu
+
+    @cdu.setter
+    def cdu(self, value):
+        self._cdu = value
+        self._source_cols = list(value.columns)
+        self._source_hash = None
+        self.ClearCache()
+
+    @property
+    def res(self):
+        return self._res
+
+    @res.setter
+    def res(self, value):
+        self._res = value
+        self.ClearCache()
+
+    def _TypeForms(self):
+        # Integer type-form codes and their lookup for cdu (see KAGC_FUN.TypeForms), built once per cdu
+        import KAGC_Functions as KAGC_FUN
+
+        if '_TypeForms' not in self._cache:
+            self._cache['_TypeForms'] = KAGC_FUN.TypeForms(self.cdu)
+        return self._cache['_TypeForms']
+
+    def _idn(self):
+        # idn labels (mcls-diag-date3-date4) decoded from the type-form codes
+        codes, tf = self._TypeForms()
+        return tf.idn.to_numpy()[codes.to_numpy()]
+
+    def Derived(self):
+        """
+        The derived variables of the cdu (Dspan, MPDate, EAAD and idn), aligned with its rows and built once per cdu.
+        e.g., B503.Derived().EAAD.describe()
+        """
+        return self._derived().copy()
+
+    def _derived(self):
+        # the cached derived variables, shared by the methods rather than copied
+        import KAGC_Functions as KAGC_FUN
+
+        if '_Derived' not in self._cache:
+            x = KAGC_FUN.ProdDates(self.cdu)[['Dspan', 'MPDate', 'EAAD']].assign(idn=self._idn())
+            self._cache['_Derived'] = x
+        return self._cache['_Derived']
+
+    def _with_derived(self, rows=None):
+        # the cdu, or the rows at positions rows, with the derived variables attached; 
+        # a shallow copy, so the cdu's own columns are shared rather than copied
+        d = self._derived()
+        if rows is None:
+            x = self.cdu.copy(deep=False)
+        else:
+            x, d = self.cdu.take(rows), d.take(rows)
+        for k in d.columns:
+            x[k] = d[k].to_numpy()
+        return x
+
+    def SpanIndex(self):
+        """
+        Interval index over the cdu's production spans (see KAGC_FUN.SpanIndex), built once per cdu.
+        e.g., B503.SpanIndex().Counts(range(300, 700, 25))
+        """
+        import KAGC_Functions as KAGC_FUN
+
+        if '_SpanIndex' not in self._cache:
+            self._cache['_SpanIndex'] = KAGC_FUN.SpanIndex(self.cdu)
+        return self._cache['_SpanIndex']
+
+    def Span(self, year=None, between=None, after=None, on='date3'):
+        """
+        Artifacts in production during a year, overlapping a (start, end) range, or dated after a cutoff.
+        e.g., B503.Span(between=(400, 500)), or A020.Span(after=400, on='date4') for LateMat
+        """
+        sx = self.SpanIndex()
+        if year is not None:
+            pos = sx.Year(year)
+        elif between is not None:
+            pos = sx.Overlap(*between)
+        else:
+            pos = sx.After(after, on=on)
+        return self.cdu.take(pos)
+
+    def SourceHash(self):
+        """
+        Hash of the cdu rows as they were assigned (see KAGC_CACHE.Data_Hash); columns added to it later are left out.
+        e.g., B503.SourceHash()
+        """
+        import KAGC_Cache as KAGC_CACHE
+
+        if self._source_hash is None:
+            self._source_hash = KAGC_CACHE.Data_Hash(self.cdu, self._source_cols)
+        return self._source_hash
+
+    def ClearCache(self):
+        """
+        e.g., B503.ClearCache()
+        """
+        self._cache.clear()
+
+    def CacheInfo(self):
+        """
+        e.g., B503.CacheInfo()
+        """
+        return {'hits': self.cache_hits,
+                'misses': self.cache_misses,
+                'cached': sorted(k for k in self._cache if not k.startswith('_'))}
+
 
     def MCLS_Grps(self):
         """
         e.g., B503.MCLS_Grps().get_groups("amp")
         """
-        x = self.cdu
-        x['idn'] = x.mcls +'-'+ x.diag.fillna('UnID') +'-'+ x.date3.astype(str) + '-' + x.date4.astype(str)
-        x = self.cdu.groupby(['mcls'])
+        x = self._with_derived().groupby(['mcls'], observed=True)
         return x
 
 
+    @_memoized
     def MCLS_TPQS(self):
         """
         e.g., B503.MCLS_TPQS()
         """
-        import numpy as np
+        import KAGC_Functions as KAGC_FUN
+
         x = self.cdu[['DU','name','cxn', 'mcls', 'Cat','diag','type1', 'type2', 
                       'date1','date3', 'date4']].dropna(subset=['date3'])
-        x1 = x.loc[x.groupby(['mcls'])['date3'].idxmax()].sort_values(by=['date3'])
-        x1['Dspan'] = x1.date4 - x1.date3
-        #x1['TPQ_25%'] = x1.Dspan*.25 + x1.date3
-        x1['MPDate'] = x1.loc[:, 'date3':'date4'].apply(np.median, axis = 1)
-        #x1['TPQ_75%'] = x1.Dspan*.75 + x1.date3
-        x1['EAAD'] = x1.date3.max() - x1.date3
-        x1['EAAD-M'] = x1.MPDate.max() - x1.MPDate
+        x1 = x.loc[x.groupby(['mcls'], observed=True)['date3'].idxmax()].sort_values(by=['date3'])
+        pd_vars = KAGC_FUN.ProdDates(x1)
+        x1[['Dspan', 'MPDate', 'EAAD', 'EAAD-M']] = pd_vars[['Dspan', 'MPDate', 'EAAD', 'EAAD-M']]
         return x1
 
+    @_memoized
     def CC_TPQS(self):
         """
         e.g., B503.CC_TPQS()
         """
-        import numpy as np
+        import KAGC_Functions as KAGC_FUN
 
         x = self.cdu[['DU','name','cxn', 'mcls', 'Cat','number', 
                       'diag', 'type1', 'date3', 'date4']].dropna(subset=['date3'])
-        x1 = x.loc[x.groupby(['cxn'])["date3"].idxmax()].sort_values(by=['date3'])
-        x1['Dspan'] = x1.date4 - x1.date3
-        #x1['TPQ_25%'] = x1.Dspan*.25 + x1.date3
-        x1['MPDate'] = x1.loc[:, 'date3':'date4'].apply(np.median, axis = 1)
-        #x1['TPQ_75%'] = x1.Dspan*.75 + x1.date3
+        x1 = x.loc[x.groupby(['cxn'], observed=True)["date3"].idxmax()].sort_values(by=['date3'])
+        pd_vars = KAGC_FUN.ProdDates(x1)
+        x1[['Dspan', 'MPDate']] = pd_vars[['Dspan', 'MPDate']]
         return x1
 
+    @_memoized
     def UniqueForms(self):
         """
         e.g., B503.UniqueForms()
         """
-        x = self.cdu
-        x['idn'] = x.mcls +'-'+ x.diag.fillna('UnID') +'-'+ x.date3.astype(str) + '-' + x.date4.astype(str)
-        x1 = x.drop_duplicates('idn')
-        x2 = x1.groupby(['mcls']).diag.unique()
+        import numpy as np
+
+        first = np.flatnonzero(~self._TypeForms()[0].duplicated().to_numpy())
+        x1 = self.cdu[['mcls', 'diag']].take(first)
+        x2 = x1.groupby(['mcls'], observed=True).diag.unique()
         return x2
 
+    @_memoized
     def ResidualForms(self):
         """
         e.g., B503.ResidualForms()
         """
-        x = self.cdu
-        x.drop_duplicates('idn')
-        x1 = x.sort_values(['mcls', 'date3'])
-        x1 = x[x.date3 < self.res]
+        import numpy as np
+
+        x1 = self._with_derived(np.flatnonzero((self.cdu.date3 < self.res).to_numpy(dtype=bool, na_value=False)))
         return x1
 
 
+    @_memoized
     def FCounts(self):
         """
         e.g., B503.FCounts()
         """
-        import numpy as np
         import pandas as pd
+        import KAGC_Functions as KAGC_FUN
 
-        x = self.cdu
-        x['Dspan'] = x['date4'] - x['date3']
-        x['MPDate'] = x.loc[:, 'date3':'date4'].apply(np.median, axis = 1)
-        x['EAAD'] = x.date3.max() - x.date3
-        x['idn'] = x.mcls +'-'+ x.diag.fillna('UnID') +'-'+ x.date3.astype(str) + '-' + x.date4.astype(str)
-        x1 = pd.crosstab([x.DU, x.mcls, x.diag, x.date3, x.date4, 
-                          x.Dspan, x.MPDate, x.EAAD, x.idn], [0], 
+        x, d = self.cdu, self._derived()
+        codes, tf = self._TypeForms()
+        keys = ['DU', 'mcls', 'diag', 'date3', 'date4', 'Dspan', 'MPDate', 'EAAD']
+        x1 = pd.crosstab([KAGC_FUN.Decat(x[k]) for k in keys[:5]] + [d[k] for k in keys[5:]] + [codes], [0], 
                           margins= False).reset_index().rename(columns={0:'freq'})
+        x1.insert(len(keys), 'idn', tf.idn.to_numpy()[x1.pop('idn_code').to_numpy()])
         x1 = x1.sort_values(['mcls', 'date3']).reset_index()
         x1["Seq"] = x1.index +1
         return x1
 
+    @_memoized
     def DUCatNos(self):
         """
         e.g., B503.DUCatNos()
@@ -220,56 +374,75 @@ class Context():
 
         dta['DU'] = self.cdu.DU.unique()
         dta['TPQ'] = [self.MCLS_TPQS().date3.max()]
-        dta['MMDate'] = [round(self.cdu.MPDate.mean(),)]
+        dta['MMDate'] = [round(self._derived().MPDate.mean(),)]
         dta['Span'] = [self.cdu.date4.max() - self.cdu.date3.min()]
-        dta['TForms'] = [self.FCounts().idn.count()]
-        dta['RForms'] = [self.FCounts().loc[self.FCounts().date3 < self.res].idn.count()]
-        dta['NRForms'] = [self.FCounts().loc[self.FCounts().date3 > self.res].idn.count()]
+        fc = self.FCounts()
+        dta['TForms'] = [fc.idn.count()]
+        dta['RForms'] = [fc.loc[fc.date3 < self.res].idn.count()]
+        dta['NRForms'] = [fc.loc[fc.date3 > self.res].idn.count()]
         dta['NRF:RF'] = round(dta.NRForms/dta.RForms,2)
-        dta['Dspan > 100'] = [sum(self.FCounts().Dspan > 100)]
+        dta['Dspan > 100'] = [sum(fc.Dspan > 100)]
         #presence - absence
-        dta['Arch'] = [(['architectural']) in self.cdu.type3.values]
-        dta['Display'] = [(['display']) in self.cdu.type3.values]
-        dta['P.items'] = [(['p.item']) in self.cdu.type3.values]
-        dta['P.adorn'] = [(['p.adornment']) in self.cdu.type3.values]
-        dta['Tool'] = [(['tool']) in self.cdu.type3.values]
-        dta['Production'] = [(['production' or 'reduction']) in self.cdu.type3.values]
+        t3 = self.cdu.type3
+        dta['Arch'] = [t3.eq('architectural').any()]
+        dta['Display'] = [t3.eq('display').any()]
+        dta['P.items'] = [t3.eq('p.item').any()]
+        dta['P.adorn'] = [t3.eq('p.adornment').any()]
+        dta['Tool'] = [t3.eq('tool').any()]
+        dta['Production'] = [t3.eq('production' or 'reduction').any()]
 
         return dta
 
+    def MCSim(self, n=1000, dist='uniform', seed=None, n_jobs=1, ci=0.95):
+        """
+        Monte Carlo TPQ, MMDate and NRF:RF with credible intervals, drawing each artifact's date 
+        inside its date3-date4 span (see KAGC_FUN.MC_Dating).
+        e.g., B503.MCSim(n=5000, seed=1)
+        """
+        import KAGC_Functions as KAGC_FUN
+
+        return KAGC_FUN.MC_Dating(self.cdu, self.res, by='DU', n=n, dist=dist, seed=seed, 
+                                  n_jobs=n_jobs, ci=ci).reset_index()
+
 ## Secondary Methods
+    @_memoized
     def MKG1(self):
         """
         e.g., B503.MKG1()
         """
         import pandas as pd
         import KAGC_MarkerArts
+        import KAGC_Functions as KAGC_FUN
 
-        x= pd.crosstab([self.cdu[self.cdu.type3.isin(KAGC_MarkerArts.MG1)].cxn], 
-                       [self.cdu[self.cdu.type3.isin(KAGC_MarkerArts.MG1)].type1], margins= True)
+        x1 = self.cdu[self.cdu.type3.isin(KAGC_MarkerArts.MG1)]
+        x= pd.crosstab([KAGC_FUN.Observed(x1.cxn)], [KAGC_FUN.Observed(x1.type1)], margins= True)
 
         return x
 
+    @_memoized
     def MKG2(self):
         """
         e.g., B503.MKG2()
         """
         import pandas as pd
         import KAGC_MarkerArts
+        import KAGC_Functions as KAGC_FUN
 
-        x= pd.crosstab([self.cdu[self.cdu.type3.isin(KAGC_MarkerArts.MG2)].cxn], 
-                       [self.cdu[self.cdu.type3.isin(KAGC_MarkerArts.MG2)].type1], margins= True)
+        x1 = self.cdu[self.cdu.type3.isin(KAGC_MarkerArts.MG2)]
+        x= pd.crosstab([KAGC_FUN.Observed(x1.cxn)], [KAGC_FUN.Observed(x1.type1)], margins= True)
 
         return x
 
+    @_memoized
     def MKG3(self):
         """
         e.g., B503.MKG3()
         """
         import pandas as pd
         import KAGC_MarkerArts
+        import KAGC_Functions as KAGC_FUN
 
-        x= pd.crosstab([self.cdu[self.cdu.type3.isin(KAGC_MarkerArts.MG3)].cxn], 
-                       [self.cdu[self.cdu.type3.isin(KAGC_MarkerArts.MG3)].type1], margins= True)
+        x1 = self.cdu[self.cdu.type3.isin(KAGC_MarkerArts.MG3)]
+        x= pd.crosstab([KAGC_FUN.Observed(x1.cxn)], [KAGC_FUN.Observed(x1.type1)], margins= True)
 
         return x
@@ -434,3 +434,12 @@ BDS1 =['TRB01-0',
          'TB19-0',
          'TB20-0',
          'TB21-0']
+
+
+def DU_Dict():
+    """
+    Returns a dictionary of every list of Contributing Contexts in this moduel, keyed by its name, 
+    e.g. {'A001': ['TRA03-0', 'TRA04-0'], ...}
+    """
+    return {k: v for k, v in globals().items() 
+            if isinstance(v, list) and not k.startswith('_')}
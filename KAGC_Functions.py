@@ -5,6 +5,7 @@
 This moduel contains a range of helper function for the analysis of the cemetery's stratigraphy.
 The functions are divisible into several groups that deal 
 with conection and selecttion, calculation, and plotting. 
+The plotting functions are kept in KAGC_Plots and only imported when first used.
 
 # File Metadata
 * Associated Publication: Given, Michael, Chris Mavromatis, and R. Smadar Gabrieli, ed. (2024) City and Cemetery: Excavations at Kourion’s Amathous Gate Cemetery, Cyprus. The Excavations of Danielle A. Parks (Annual of the American Society of Overseas Research, Volumes 76 & 77, ASOR).
@@ -56,9 +57,13 @@ with conection and selecttion, calculation, and plotting.
     * re        : 2.2.1
     * numpy     : 1.23.5
     * sqlite3   : 2.6.0
+    * scipy     : 1.10.0 (sparse matrices; UBQ_Site, Incidence, Jaccard_Matrix, CommonSubtypes_Bulk)
+    * json, hashlib, pathlib (standard library; DB_Export, DB_Open)
+    * concurrent.futures (standard library; n_jobs in MC_Dating and Gower_Matrix)
 
 
 * Other Project Moduels:
+    * KAGC_Plots
     * KAGC_Context_Class
     * KAGC_Marker_Artifacts
     * KAGC_Depositional_Units
@@ -67,12 +72,14 @@ with conection and selecttion, calculation, and plotting.
 
 # Connection and Selection Functions
 ## Connect to Sqlite DB
-def DB_Con(DB_path:str):
+def DB_Con(DB_path:str, compact=False, drop_description=False):
     """
     Generates an connection to the project SQlite database and returns all rows as an object called df.
 
     Arguments:
-        * A string or object containing the path to the database
+        * A string or object containing the path to the database, or a DBSession
+        * compact = True returns the compact schema from Compact()
+        * drop_description = True also drops the description text (compact only)
 
     Requires:
         * sqlite3
@@ -80,756 +87,2165 @@ def DB_Con(DB_path:str):
    
      """
     # Connect to project databse and retuns a dataframe
-    import sqlite3 as sql3
     import pandas as pd
 
-    conn = sql3.connect(DB_path)
-    cur = conn.cursor()
+    conn, own = _db_conn(DB_path)
     df = pd.read_sql_query("select * from art", conn)
-    conn.close()
+    if own:
+        conn.close()
+    if compact:
+        df = Compact(df, drop_description)
     return df
 
 
-def data(db, DU, du):
+## Persistent database session
+class DBSession():
+    """
+    Keeps one long-lived read-only connection to the project SQLite database so repeated 
+    DU loads do not reopen the file. Any loader that takes a database path (DB_Con, data, DU_Load) 
+    also takes a DBSession.
+
+    The connection is opened in read-only URI mode with query_only set, which lets it read 
+    alongside a writer in WAL mode; sqlite3 keeps the prepared statements of the repeated DU 
+    queries (cached_statements). When the session opens, DB_Index looks up the indexes it relies 
+    on over a read-only connection, and writes to the file only if one is missing (index = False 
+    never writes).
+
+    Arguments:
+        * db = path to the project SQLite database
+        * cached_statements = number of prepared statements sqlite3 keeps for the connection
+        * mmap_size = bytes of the database file SQLite may memory-map
+        * index = False skips DB_Index
+
+    Requires:
+        * sqlite3
+        * pathlib
+
+    E.g., with KAGC_FUN.DBSession(art_db) as ses:
+              dus = {k: KAGC_FUN.DU_Load(ses, v, k) for k, v in KAGC_DUS.DU_Dict().items()}
+    """
+
+    def __init__(self, db, cached_statements=256, mmap_size=268435456, index=True):
+        self.db = db
+        if index:
+            DB_Index(db)
+
+        self.conn = _ro_connect(db, cached_statements=cached_statements)
+        self.conn.execute('PRAGMA query_only = ON')
+        self.conn.execute('PRAGMA temp_store = MEMORY')
+        self.conn.execute('PRAGMA cache_size = -65536')
+        self.conn.execute('PRAGMA mmap_size = %d' % int(mmap_size))
+
+        self.table_info = self.conn.execute('PRAGMA table_info(art)').fetchall()
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _db_conn(db):
+    # Returns (connection, owned); owned connections are closed by the caller
+    if isinstance(db, DBSession):
+        return db.conn, False
+    return _ro_connect(db), True
+
+
+def _ro_connect(db, **kwargs):
+    # A read-only connection; a mistyped path raises FileNotFoundError instead of creating an empty database
+    import os
+    import pathlib
+    import sqlite3 as sql3
+
+    if not os.path.isfile(db):
+        raise FileNotFoundError('no SQLite database at %s' % db)
+    return sql3.connect(pathlib.Path(db).resolve().as_uri() + '?mode=ro', uri=True, **kwargs)
+
+
+def _decl_dtypes(decl):
+    # The dtype for each column from its declared SQLite type (its column affinity), so a DU is 
+    # typed without reading the rest of the table: text columns as object and real columns as float64 
+    # (as DB_Con gives them even when the DU's own rows are all NULL); integer and untyped columns 
+    # are left as pandas reads the fetched rows (int64, or float64 when they hold NULLs)
+    out = {}
+    for c, t in decl.items():
+        t = t.upper()
+        if 'INT' in t:
+            continue
+        if any(k in t for k in ('CHAR', 'CLOB', 'TEXT')):
+            out[c] = 'object'
+        elif any(k in t for k in ('REAL', 'FLOA', 'DOUB')):
+            out[c] = 'float64'
+    return out
+
+
+def data(db, DU, du, compact=False):
     # Connect to project database and return a filtered dataframe
-        import sqlite3 as sql3
+        return DU_Load(db, DU, du, compact=compact)
+
+
+## Federated specialist databases
+class Federation(DBSession):
+    """
+    A DBSession that also ATTACHes the specialist SQLite databases (eg the faunal and shell 
+    databases) to its read-only connection, so their tables and the art table are filtered by DU 
+    and joined on cxn inside SQLite, in one query plan, rather than read whole and merged in pandas.
+
+    Each attached table with a cxn column gets a temporary view of the same name (alias_table when 
+    the name is taken), and the contexts view lists every cxn with its number of rows in each table. 
+    The DU memberships (Members) are kept in a temporary table, du_members (DU, cxn), which the DU 
+    queries join against. The temporary objects live in memory and go when the session closes.
+
+    Arguments:
+        * db = path to the project SQLite database (the art table)
+        * specialists = dictionary of schema alias: database path, eg {'faun': faunal_db, 'shell': shell_db}
+        * DUS = optional dictionary of DU names and Contributing Context lists, eg KAGC_DUS.DU_Dict()
+        * cached_statements, mmap_size, index = as for DBSession
+
+    Requires:
+        * sqlite3
+        * pandas
+        * pathlib
+
+    E.g., with KAGC_FUN.Federation(art_db, {'faun': faunal_db}, KAGC_DUS.DU_Dict()) as fed:
+              a603 = co.Context(fed.Load('art', 'A603'), -24)
+              a603f = fed.Load('faun', 'A603')
+              fed.Contexts('A603')
+              fed.Query('SELECT m.DU, f.species, SUM(f.freq) AS freq FROM faun f JOIN du_members m USING (cxn) GROUP BY m.DU, f.species')
+    """
+
+    def __init__(self, db, specialists=None, DUS=None, cached_statements=256, mmap_size=268435456, index=True):
+        super().__init__(db, cached_statements, mmap_size, index)
+        self.index = index
+
+        self.tables = {'art': ('main', 'art')}
+        self.decl = {'art': {i[1]: (i[2] or '').upper() for i in self.table_info}}
+        self.DUS = {}
+        self._temp('CREATE TEMP TABLE du_members (DU TEXT NOT NULL, cxn TEXT NOT NULL, PRIMARY KEY (DU, cxn))')
+        self._contexts()
+        for alias, path in (specialists or {}).items():
+            self.Attach(alias, path)
+        if DUS is not None:
+            self.Members(DUS)
+
+    def _temp(self, sql, rows=None):
+        # query_only also covers the temp schema, so it is lifted while temporary objects are written
+        self.conn.execute('PRAGMA query_only = OFF')
+        try:
+            if rows is None:
+                self.conn.execute(sql)
+            else:
+                self.conn.executemany(sql, rows)
+            self.conn.commit()
+        finally:
+            self.conn.execute('PRAGMA query_only = ON')
+
+    def _contexts(self):
+        # the contexts view: one row per cxn with its row count in each federated table
+        parts = ' UNION ALL '.join('SELECT cxn, \'%s\' AS src FROM "%s"."%s"' % (k, *v) for k, v in self.tables.items())
+        counts = ', '.join('SUM(src = \'%s\') AS "%s"' % (k, k) for k in self.tables)
+        self._temp('DROP VIEW IF EXISTS temp.contexts')
+        self._temp('CREATE TEMP VIEW contexts AS SELECT cxn, %s FROM (%s) WHERE cxn IS NOT NULL GROUP BY cxn' % (counts, parts))
+
+    def Attach(self, alias, path):
+        """
+        Attaches a specialist database, read-only, as schema alias and adds a view for each of its tables 
+        with a cxn column. A missing cxn index is created in the database first when the file is 
+        writable (unless the federation was opened with index = False).
+        e.g., fed.Attach('shell', shell_db)
+        """
+        import pathlib
+
+        tables = _cxn_tables(path, self.index)
+        uri = pathlib.Path(path).resolve().as_uri() + '?mode=ro'
+        self.conn.execute('ATTACH DATABASE ? AS "%s"' % alias, (uri,))
+        for t, decl in tables.items():
+            name = t if t not in self.tables else alias + '_' + t
+            self.tables[name] = (alias, t)
+            self.decl[name] = decl
+            self._temp('CREATE TEMP VIEW "%s" AS SELECT * FROM "%s"."%s"' % (name, alias, t))
+        self._contexts()
+
+    def Members(self, DUS):
+        """
+        Replaces the DU memberships used by the DU queries.
+        e.g., fed.Members({'B503': KAGC_DUS.B503, 'BDS-1': KAGC_DUS.BDS1})
+        """
+        self.DUS = dict(DUS)
+        self._temp('DELETE FROM temp.du_members')
+        self._temp('INSERT OR IGNORE INTO temp.du_members (DU, cxn) VALUES (?, ?)', 
+                   [(du, c) for du, cc in self.DUS.items() for c in cc])
+
+    def Load(self, table, du, columns=None, compact=False):
+        """
+        Loads a DU's rows from a federated table, filtered by the du_members table inside SQLite. 
+        For the art table this is the same dataframe as DU_Load (DU and MPDate included); other 
+        tables get the DU variable. The index is rowid - 1.
+        e.g., fed.Load('faun', 'A603')
+        """
         import pandas as pd
-        import numpy as np
 
-        conn = sql3.connect(db)
-        cur = conn.cursor()
-        df = pd.read_sql_query('Select * From art', conn)
-        conn.close()
-        
-        df = df[df.cxn.isin(DU)]
+        if du not in self.DUS:
+            raise KeyError(du + ' is not in the DU memberships (see Members)')
+        schema, t = self.tables[table]
+        decl = self.decl[table]
+        cols = list(decl) if columns is None else [c for c in decl if c in set(columns) | {'cxn', 'date3', 'date4'}]
+
+        sql = ('SELECT t.rowid AS _rowid, ' + ', '.join('t."' + c + '"' for c in cols) + 
+               ' FROM "%s"."%s" t WHERE t.cxn IN (SELECT cxn FROM temp.du_members WHERE DU = ?)' % (schema, t))
+        parts = [pd.read_sql_query(sql, self.conn, params=[du])]
+        dtypes = _decl_dtypes(decl)
+        if table == 'art':
+            return _du_frame(parts, dtypes, du, compact)
+        df = _rows_frame(parts, dtypes)
         df['DU'] = du
-        df["MPDate"] = df.loc[:, 'date3':'date4'].apply(np.median, axis =1)
         return df
 
+    def Contexts(self, du=None):
+        """
+        The Contributing Contexts of a DU (or of every DU) with their number of rows in each federated table, in one query.
+        e.g., fed.Contexts('A603')
+        """
+        import pandas as pd
+
+        counts = ', '.join('(SELECT COUNT(*) FROM "%s"."%s" t WHERE t.cxn = m.cxn) AS "%s"' % (*v, k) 
+                           for k, v in self.tables.items())
+        sql = 'SELECT m.DU, m.cxn, ' + counts + ' FROM temp.du_members m'
+        if du is None:
+            return pd.read_sql_query(sql + ' ORDER BY m.DU, m.cxn', self.conn)
+        return pd.read_sql_query(sql + ' WHERE m.DU = ? ORDER BY m.cxn', self.conn, params=[du])
+
+    def Query(self, sql, params=None):
+        """
+        Runs a query against the federation: the art table, the attached schemas, their views, 
+        contexts and du_members.
+        e.g., fed.Query('SELECT * FROM faun JOIN du_members USING (cxn) WHERE DU = ?', ['A603'])
+        """
+        import pandas as pd
+
+        return pd.read_sql_query(sql, self.conn, params=params)
 
-## DU selection for context object
-def DU_Select(DF, DU, du):
+
+def _cxn_tables(db, index=True):
+    # The tables of a specialist database that have a cxn column, with their declared types, read over 
+    # a read-only connection; a missing cxn index is created only when index is True and the file is writable
+    import sqlite3 as sql3
+
+    conn = _ro_connect(db)
+    try:
+        out = {}
+        for (t,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'").fetchall():
+            decl = {i[1]: (i[2] or '').upper() for i in conn.execute('PRAGMA table_info("%s")' % t)}
+            if 'cxn' in decl:
+                out[t] = decl
+        have = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    finally:
+        conn.close()
+    missing = [t for t in out if t + '_cxn' not in have]
+    if not index or not missing:
+        return out
+
+    conn = sql3.connect(db)
+    try:
+        for t in missing:
+            conn.execute('CREATE INDEX IF NOT EXISTS "%s_cxn" ON "%s"(cxn)' % (t, t))
+        conn.commit()
+    except sql3.OperationalError:
+        pass
+    finally:
+        conn.close()
+    return out
+
+
+## Columnar snapshot of the art table
+_SNAPSHOTS = {}
+
+def _file_hash(path):
+    # sha256 of a file, read in 1 MB blocks
+    import hashlib
+
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def DB_Export(db, path):
     """
-    Selects a specific DU from the project database and append the DU name to the new dataframe. 
-    Also serves as main input for the ContextObject.
+    Writes the art table to a columnar snapshot directory that DB_Open can memory-map.
+    Numeric columns are stored as one .npy block per dtype (a contiguous row per column), and text 
+    columns as integer code arrays, already in the width pandas uses for their number of categories, 
+    with their dictionaries in meta.json. The SQLite file's size, modification time and sha256, and 
+    the size and modification time of its -wal file, are kept for the freshness check.
 
     Arguments:
-        * DF = dataframe you are working with (usually a dataframe for the  entire the project)
-        * DU = the DU value from the KAGC_DUS module - eg KAGC_DUS.A015
-        * du = a string value which servers as the value for the new variable 'DU'
-    
-    Returns: 
-    a data frame if it is not used as input for ContextObject
+        * db = path to the project SQLite database
+        * path = snapshot directory (created if needed)
+
+    Requires:
+        * numpy
+        * pandas
+        * json
+        * pathlib
 
+    e.g., KAGC_FUN.DB_Export(art_db, 'art_snapshot')
     """
 
+    import json
+    import os
+    import pathlib
     import numpy as np
-    x = DF.loc[DF['cxn'].isin(DU)]
-    x['DU'] = du
-    x["MPDate"] = x.loc[:, 'date3':'date4'].apply(np.median, axis =1)
-    return x
+    import pandas as pd
 
-# Calculation Functions
-## CC material class ubiquity
-def UBQ_MCLS(DU, CC):
+    path = pathlib.Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    df = DB_Con(db)
+
+    cols, blocks = [], {}
+    for c in df.columns:
+        s = df[c]
+        if pd.api.types.is_numeric_dtype(s) and not pd.api.types.is_bool_dtype(s):
+            dt = s.dtype.name
+            blocks.setdefault(dt, []).append(c)
+            cols.append({'name': c, 'kind': 'num', 'dtype': dt})
+        else:
+            try:
+                codes, cats = pd.factorize(s, sort=True)
+            except TypeError:
+                # values of types that cannot be compared (SQLite columns are not typed): sort by their text
+                codes, cats = pd.factorize(s)
+                order = np.argsort(cats.astype(str), kind='stable')
+                codes = np.where(codes >= 0, np.argsort(order)[codes], -1)
+                cats = cats[order]
+            np.save(path / ('cat_%d.npy' % len(cols)), codes.astype(_code_dtype(len(cats))))
+            cols.append({'name': c, 'kind': 'cat', 'file': 'cat_%d.npy' % len(cols), 
+                         'categories': [str(v) if not isinstance(v, (int, float)) else v for v in cats]})
+    for dt, names in blocks.items():
+        # (columns x rows), so each column is one contiguous row of the block
+        np.save(path / ('num_%s.npy' % dt), np.ascontiguousarray(df[names].to_numpy(dtype=dt).T))
+
+    st = os.stat(db)
+    meta = {'nrows': len(df), 'columns': cols, 'blocks': blocks,
+            'source': {'path': str(pathlib.Path(db).resolve()), 'size': st.st_size, 
+                       'mtime': st.st_mtime, 'sha256': _file_hash(db), 'wal': _wal_state(db)}}
+    (path / 'meta.json').write_text(json.dumps(meta))
+    return path
+
+
+def _code_dtype(n):
+    # the integer width pandas keeps categorical codes in for n categories, so they load without a copy
+    import numpy as np
+
+    for dt in (np.int8, np.int16, np.int32):
+        if n < np.iinfo(dt).max:
+            return dt
+    return np.int64
+
+
+def _wal_state(db):
+    # size and modification time of the database's write-ahead log, None without one (or an empty one)
+    import os
+
+    wal = str(db) + '-wal'
+    if not os.path.exists(wal) or not os.path.getsize(wal):
+        return None
+    st = os.stat(wal)
+    return [st.st_size, st.st_mtime]
+
+
+def DB_Fresh(path, db=None):
+    """
+    True if the snapshot matches the SQLite file it was made from: the size and modification time 
+    are compared first, and the file hash only if they differ. Changes still in the -wal file 
+    (not yet checkpointed into the database) count as stale too.
     """
-    Calculates ubiquity of material classes for DUs' with contributing contexts.
 
-    Parameters:
-        * DU: ContextObject cdu, eg  b503.cdu
-        * CC: contributing contexts from the KAGC_DUS module. eg KAGC_DUS.B503
+    import json
+    import os
+    import pathlib
+
+    meta = json.loads((pathlib.Path(path) / 'meta.json').read_text())
+    src = meta['source']
+    db = db or src['path']
+    if not os.path.exists(db):
+        return False
+    if _wal_state(db) != src.get('wal'):
+        return False
+    st = os.stat(db)
+    if st.st_size == src['size'] and st.st_mtime == src['mtime']:
+        return True
+    return st.st_size == src['size'] and _file_hash(db) == src['sha256']
+
+
+def DB_Open(path, db=None, decode=False, check=True):
+    """
+    Opens a DB_Export snapshot as the project dataframe. Every column is built straight on a 
+    memory-mapped array (the text columns as categoricals over their memory-mapped codes) and the 
+    blocks are not consolidated, so opening costs little more than reading meta.json and the pages 
+    are shared between processes. A snapshot that is already open in this session is served from 
+    memory, as a new shallow copy each call.
+
+    The mapped arrays are read-only: in-place edits (eg df.loc[0, 'date3'] = 1) raise "assignment 
+    destination is read-only". Assigning whole columns (df['x'] = ...) works, and df.copy() gives 
+    a frame that can be edited freely. decode = True builds its text columns in memory.
+
+    Arguments:
+        * path = snapshot directory
+        * db = the SQLite database; if given, a stale snapshot is rebuilt from it
+        * decode = True returns text columns as plain object columns, as DB_Con
+        * check = False skips the freshness check
+
+    Returns:
+        a dataframe with DB_Con's columns and row order
 
     Requires:
         * numpy
         * pandas
+        * json
+        * pathlib
 
-    returns:
-        a dictionary
-
+    e.g., df = KAGC_FUN.DB_Open('art_snapshot', art_db)
     """
 
+    import json
+    import pathlib
     import numpy as np
     import pandas as pd
 
-    x = pd.crosstab([DU.cxn], [DU.mcls]).reset_index()
+    path = pathlib.Path(path)
+    if check and not (path / 'meta.json').exists() and db is not None:
+        DB_Export(db, path)
+    if check and not DB_Fresh(path, db):
+        if db is None:
+            raise ValueError('snapshot %s is older than its database; rebuild it with DB_Export' % path)
+        DB_Export(db, path)
+
+    key = (str(path.resolve()), decode)
+    mt = (path / 'meta.json').stat().st_mtime_ns
+    if key in _SNAPSHOTS and _SNAPSHOTS[key][0] == mt:
+        return _SNAPSHOTS[key][1].copy(deep=False)
+
+    meta = json.loads((path / 'meta.json').read_text())
+    arrays = {}
+    for dt, names in meta['blocks'].items():
+        block = np.load(path / ('num_%s.npy' % dt), mmap_mode='r')
+        for j, n in enumerate(names):
+            arrays[n] = block[j]
+    for c in meta['columns']:
+        if c['kind'] == 'cat':
+            codes = np.load(path / c['file'], mmap_mode='r')
+            col = pd.Categorical.from_codes(codes, categories=c['categories'])
+            arrays[c['name']] = np.asarray(col, dtype=object) if decode else col
+
+    # copy=False keeps one block per column, so nothing is consolidated (copied) into memory
+    df = pd.DataFrame({c['name']: arrays[c['name']] for c in meta['columns']}, 
+                      index=pd.RangeIndex(meta['nrows']), copy=False)
+
+    _SNAPSHOTS[key] = (mt, df)
+    return df.copy(deep=False)
+
+
+## Indexes for DU loading
+def DB_Index(db):
+    """
+    Creates the indexes DU_Load relies on (art.cxn, and art.mcls with art.date3) if they do not exist yet.
+    The indexes are looked up over a read-only connection first, so the file is only opened for 
+    writing when one is missing. A read-only database is left as it is.
 
-    avgs = round(x.mean(), 2)
-    ConCx = len(CC)
+    Arguments:
+        * db = path to the project SQLite database
 
-    ArtU = []
+    Requires:
+        * sqlite3
 
-    for i,j in x.iteritems():
-        z = (np.count_nonzero(j)) / len(CC)
-        ArtU.append((i, round(z, 2)))
-    return {'DU CC': ConCx,
-        'Artifact Ubiquity':ArtU}
+    """
 
+    import sqlite3 as sql3
 
-def Jaccard_Similarity(L1, L2):
+    wanted = {'art_cxn': 'art(cxn)', 'art_mcls_date3': 'art(mcls, date3)'}
+    conn = _ro_connect(db)
+    try:
+        have = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    finally:
+        conn.close()
+    missing = [k for k in wanted if k not in have]
+    if not missing:
+        return
+
+    conn = sql3.connect(db)
+    try:
+        for k in missing:
+            conn.execute('CREATE INDEX IF NOT EXISTS %s ON %s' % (k, wanted[k]))
+        conn.commit()
+    except sql3.OperationalError:
+        pass
+    finally:
+        conn.close()
+
+
+## Load a single DU from the project database
+def DU_Load(db, DU, du, columns=None, compact=False):
     """
-    Generates the Jaccard similarity for two lists of artifacts from two contexts or DUs.
+    Loads a single DU straight from the project database. The cxn filter and the column 
+    selection run inside SQLite with bound parameters, so only the DU's rows are read.
+    Returns the same rows and columns as DU_Select(DB_Con(db), DU, du), 'DU' and 'MPDate' included. 
+    Text and real columns are cast by their declared types, so they match DB_Con's dtypes however 
+    few values the DU has; an integer column is int64 unless the DU's rows hold NULLs (DB_Con gives 
+    float64 when any row of the table does). The index is rowid - 1, which equals DB_Con's row 
+    numbers only while no row has been deleted from art.
 
-    Parameters:
-        * L1 = a list of artifacts form a context or DU
-        * L2 = a list of artifacts form a context or DU
+    Arguments:
+        * db = path to the project SQLite database, or a DBSession
+        * DU = the DU value from the KAGC_DUS module - eg KAGC_DUS.A015
+        * du = a string value which servers as the value for the new variable 'DU'
+        * columns = optional list of art columns to load; cxn, date3 and date4 are always included
+        * compact = True returns the compact schema from Compact()
+
+    Requires:
+        * sqlite3
+        * pandas
 
+    e.g., b503 = co.Context(KAGC_FUN.DU_Load(art_db, KAGC_DUS.B503, 'B503'), -24)
     """
-    intersection_cardinality = len(set.intersection(*[set(L1), set(L2)]))
-    union_cardinality = len(set.union(*[set(L1), set(L2)]))
-    return intersection_cardinality/float(union_cardinality)
 
+    import pandas as pd
 
-def CommonSubtypes(L1, L2):
+    if isinstance(db, DBSession):
+        info = db.table_info
+    else:
+        DB_Index(db)
+    conn, own = _db_conn(db)
+    if own:
+        info = conn.execute('PRAGMA table_info(art)').fetchall()
+    decl = {i[1]: (i[2] or '').upper() for i in info}
+    dtypes = _decl_dtypes(decl)
+
+    if columns is None:
+        cols = list(decl)
+    else:
+        cols = [c for c in decl if c in set(columns) | {'cxn', 'date3', 'date4'}]
+
+    cxns = list(dict.fromkeys(DU))
+    sel = ', '.join('"' + c + '"' for c in cols)
+    parts = []
+    # Stay below SQLite's bound-parameter limit
+    for i in range(0, max(len(cxns), 1), 900):
+        chunk = cxns[i:i + 900]
+        sql = 'SELECT rowid AS _rowid, ' + sel + ' FROM art WHERE cxn IN (' + ', '.join('?' * len(chunk)) + ')'
+        parts.append(pd.read_sql_query(sql, conn, params=chunk))
+    if own:
+        conn.close()
+
+    return _du_frame(parts, dtypes, du, compact)
+
+
+def _rows_frame(parts, dtypes):
+    # Joins the row blocks read for one DU in rowid order (index rowid - 1) and casts the columns 
+    # to the dtypes of their declared types (see _decl_dtypes), eg an all-NULL REAL column to float64
+    import pandas as pd
+
+    df = pd.concat(parts).sort_values('_rowid')
+    df.index = df.pop('_rowid').to_numpy() - 1
+
+    for c in df.columns:
+        dt = dtypes.get(c)
+        if dt is not None and df[c].dtype != dt:
+            df[c] = pd.to_numeric(df[c]).astype(dt) if dt != 'object' else df[c].astype(object)
+    return df
+
+
+def _du_frame(parts, dtypes, du, compact=False):
+    # _rows_frame, with the DU and MPDate variables appended as DU_Select does
+    df = _rows_frame(parts, dtypes)
+    if compact:
+        df = Compact(df)
+    df['DU'] = du
+    df['MPDate'] = ProdDates(df)['MPDate']
+    return df
+
+
+## Stream the DUs from the project database
+def DU_Stream(db, DUS, res=None, what='context', chunksize=50000, columns=None, compact=False, max_rows=None):
     """
-    Returns the common artifact and the number of common sub-types between two lists of artifacts.
+    Reads the art table once, in cxn order and in chunks of chunksize rows, and yields each DU 
+    as soon as the last of its Contributing Contexts has been read, so the whole site table is 
+    never held in memory. The rows of a context are kept once, however many DUs it belongs to, 
+    and dropped as soon as every DU that uses it has been yielded.
+
+    A DU is open from its first context in cxn order to its last, so the rows held at any time 
+    are those of every open DU together, not of one DU. DUs whose contexts are spread across the 
+    cxn order (eg over several trenches) stay open for most of the scan, and without max_rows 
+    peak memory can approach the rows those DUs share with the site. With max_rows, whenever more 
+    rows than that are held, the open DUs with the most contexts still to come are dropped from 
+    the scan and loaded on their own with DU_Load (over the cxn index) once it ends, so the 
+    buffer stays near max_rows, plus the DU being built.
+
+    DUs are yielded in the order they complete (deferred DUs last), not the order of DUS. DUs 
+    without any rows in the database are left out, as in DUSmry_Batch.
 
-    Parameters:
-        * L1 = a list of artifacts for a context or DU
-        * L2 = a list of artifacts for a context or DU
+    Arguments:
+        * db = path to the project SQLite database, or a DBSession
+        * DUS = a dictionary of DU names and Contributing Context lists, eg KAGC_DUS.DU_Dict()
+        * res = residual cutoff date for the Context objects (what = 'context' or 'summary')
+        * what = 'context' (Context objects), 'summary' (DUSmry rows), 'frame' (DU_Load dataframes), 
+          or a function that takes a Context and returns what to yield, eg lambda c: c.FCounts()
+        * chunksize = rows read from SQLite at a time
+        * columns = optional list of art columns to load; cxn, date3 and date4 are always included
+        * compact = True returns the compact schema from Compact()
+        * max_rows = optional cap on the rows held for open DUs
+
+    Returns:
+        a generator of (DU name, result) tuples
+
+    Requires:
+        * sqlite3
+        * pandas
+        * KAGC_Context_Class
 
+    e.g., smry = pd.concat(s for du, s in KAGC_FUN.DU_Stream(art_db, KAGC_DUS.DU_Dict(), -24, 'summary'))
+          for du, c in KAGC_FUN.DU_Stream(art_db, KAGC_DUS.DU_Dict(), -24): ...
     """
 
-    x = set(L1) & set(L2)
-    x1 = len(x)
-    return{'Common subtypes:': x,
-           'Number of common subtypes:': x1}
+    import pandas as pd
+    import KAGC_Context_Class as co
 
-def MMDate(x):
-   """
-   Returns the unweighted median date from a context class.
-   
-   """
+    if isinstance(db, DBSession):
+        info = db.table_info
+    else:
+        DB_Index(db)
+    conn, own = _db_conn(db)
+    try:
+        if own:
+            info = conn.execute('PRAGMA table_info(art)').fetchall()
+        decl = {i[1]: (i[2] or '').upper() for i in info}
+        cols = list(decl) if columns is None else [c for c in decl if c in set(columns) | {'cxn', 'date3', 'date4'}]
+        dtypes = _decl_dtypes(decl)
+
+        # Contexts still to be read for each DU, and the open DUs that use each context
+        present = {r[0] for r in conn.execute('SELECT DISTINCT cxn FROM art')}
+        need = {du: set(cc) & present for du, cc in DUS.items()}
+        need = {du: cc for du, cc in need.items() if cc}
+        users = {}
+        for du, cc in need.items():
+            for c in cc:
+                users[c] = users.get(c, 0) + 1
+
+        sql = ('SELECT rowid AS _rowid, ' + ', '.join('"' + c + '"' for c in cols) +
+               ' FROM art WHERE cxn IS NOT NULL ORDER BY cxn, rowid')
+
+        rows = {}
+        held = [0]
+        deferred = []
+
+        def emit(du, x):
+            if what == 'frame':
+                return du, x
+            if what == 'summary':
+                return du, co.Context(x, res).DUSmry()
+            if what == 'context':
+                return du, co.Context(x, res)
+            return du, what(co.Context(x, res))
+
+        def release(du):
+            # the DU no longer needs its contexts' rows; rows no open DU uses are dropped
+            for c in dict.fromkeys(DUS[du]):
+                if c not in users:
+                    continue
+                users[c] -= 1
+                if not users[c]:
+                    held[0] -= sum(len(p) for p in rows.pop(c, []))
+                    del users[c]
+
+        def finish(done):
+            # DUs whose contexts have all been read are yielded; their contexts' rows are released
+            for du in [du for du, cc in need.items() if not cc.isdisjoint(done)]:
+                need[du] -= done
+                if need[du]:
+                    continue
+                del need[du]
+                cc = [c for c in dict.fromkeys(DUS[du]) if c in rows]
+                x = _du_frame([p for c in cc for p in rows[c]], dtypes, du, compact)
+                release(du)
+                yield emit(du, x)
+
+        def shed():
+            # over max_rows: defer the open DUs with the most contexts still to come
+            while held[0] > max_rows and need:
+                du = max(need, key=lambda k: len(need[k]))
+                del need[du]
+                release(du)
+                deferred.append(du)
+
+        last = None
+        for chunk in pd.read_sql_query(sql, conn, chunksize=chunksize):
+            cxn = chunk['cxn']
+            # a context is complete once a later one starts; the chunk's last context may continue
+            done = set(cxn.unique()) - {cxn.iloc[-1]}
+            if last is not None and last != cxn.iloc[0]:
+                done.add(last)
+            last = cxn.iloc[-1]
+            keep = chunk[cxn.isin(users).to_numpy()]
+            for c, g in keep.groupby('cxn', sort=False):
+                rows.setdefault(c, []).append(g)
+                held[0] += len(g)
+            yield from finish(done)
+            if max_rows is not None:
+                shed()
+        if last is not None:
+            yield from finish({c for cc in need.values() for c in cc})
+        for du in deferred:
+            yield emit(du, DU_Load(db, DUS[du], du, columns, compact))
+    finally:
+        if own:
+            conn.close()
 
-   import pandas as pd
-   import numpy as np
-    
-   z=  x.MCLS_Grps().MPDate.mean().reset_index().sort_values(by= 'mcls')
-   return z
 
-# Conversion functions
-## convert counts to present absence for wide data
-def to_binary():
+## DU selection for context object
+def DU_Select(DF, DU, du, index=None, compact=False):
     """
-    Converts count data in tabular form to presence - absence (0,1) via .applymap().
+    Selects a specific DU from the project database and append the DU name to the new dataframe. 
+    Also serves as main input for the ContextObject.
 
-    eg: x1.iloc[:, 3:7].applymap(to_binary)
+    Arguments:
+        * DF = dataframe you are working with (usually a dataframe for the  entire the project)
+        * DU = the DU value from the KAGC_DUS module - eg KAGC_DUS.A015
+        * du = a string value which servers as the value for the new variable 'DU'
+        * index = optional CxnIndex built over DF; selection then takes the DU's stored row positions
+          instead of scanning DF
+        * compact = True converts the selection to the compact schema from Compact()
+
+    DF may also be the path of a DB_Export snapshot, which is opened (memory-mapped) with DB_Open.
+    
+    Returns: 
+    a data frame if it is not used as input for ContextObject
 
     """
 
-    return lambda x: 0 if x<1 else 1 
+    import pathlib
+
+    if isinstance(DF, (str, pathlib.Path)):
+        DF = DB_Open(DF)
+    if index is None:
+        x = DF.loc[DF['cxn'].isin(DU)]
+    else:
+        x = DF.take(index.DU_Positions(DU, DF))
+    if compact:
+        x = Compact(x)
+    # the selection already holds its own rows: a shallow copy drops its link back to DF, 
+    # so the new columns are added without the SettingWithCopy check or another copy of the rows
+    x = x.copy(deep=False)
+    x['DU'] = du
+    x["MPDate"] = ProdDates(x)['MPDate']
+    return x
 
-# Plot Functions
 
-## Date Span Plots
-## Single context, DU CC TPQ, DU FCount, DU MCLS TPQ, Generic
+## Context-to-row index
+def _buffers(s):
+    # Addresses of the arrays behind a column, read without converting it: the codes of a categorical, 
+    # the values and mask of a nullable (eg compact Int16) column, otherwise the numpy values
+    import numpy as np
+    import pandas as pd
+
+    a = s.array
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        bufs = [a.codes]
+    elif hasattr(a, '_data') and hasattr(a, '_mask'):
+        bufs = [a._data, a._mask]
+    else:
+        bufs = [np.asarray(a)]
+    return tuple(b.__array_interface__['data'][0] for b in bufs)
 
-# Single context
-def SC_DSpanPlt(df, save_plot, out_ti, fext, start, stop):
+
+class CxnIndex():
     """
-    Plots the date spans of unique items from a single context or material class;
-    also context or DU TPQs items. 
-    Dates must be numbers and B.C. dates must be expressed as a negative number e.g.  100 B.C. -> -100 
+    Maps each cxn, name and area value of a dataframe to its row positions, and each DU to a 
+    precomputed position array, so selecting a DU is a take over its own rows rather than an 
+    isin over the whole site table.
 
-    Parameters:
-        * df = dataframe of DU material class
-        * TITLE = text plot title
-        * out_ti = figure title
-        * save _plot = save the plot 'Y' or 'N'
-        * fext = output file extension (eg '.png')
-        * start = earliest opening date depicted on  x axis
-        * stop = latest closing date  on x axis
+    The index rebuilds itself when it is handed a different frame, or one whose shape or key 
+    columns have been replaced. Edits made in place (e.g. df.loc[i, 'cxn'] = ...) cannot be seen; 
+    call Rebuild() after them.
+
+    Arguments:
+        * DF = dataframe for the entire project
+        * DUS = optional dictionary of DU names and Contributing Context lists, eg KAGC_DUS.DU_Dict()
 
     Requires:
-        seaborn, matplotlib.pyplot and numpy
+        * numpy
+        * pandas
 
+    E.g., ix = KAGC_FUN.CxnIndex(df, KAGC_DUS.DU_Dict())
+          b503 = co.Context(KAGC_FUN.DU_Select(df, KAGC_DUS.B503, 'B503', index=ix), -24)
+          ix.Select(area='A')
     """
 
-    import  matplotlib.pyplot as plt
-    import seaborn as sns
-    import numpy as np
+    levels = ['cxn', 'name', 'area']
 
-    df['idn'] = df.mcls +'-'+ df.diag +'-'+ df.date3.astype(str) + '-' + df.date4.astype(str)
+    def __init__(self, DF, DUS=None):
+        self.DF = DF
+        self.DUS = dict(DUS or {})
+        self.Rebuild()
 
-    df['lbl'] = df.mcls + '-' + df.Cat.fillna(df.mcls)
+    def _token(self, DF):
+        return (id(DF), DF.shape, tuple(_buffers(DF[c]) for c in self.levels if c in DF.columns))
 
-    x1 = df.dropna(subset = ['diag', 'date3', 'date4'])
+    def Rebuild(self, DF=None):
+        """
+        Rebuilds the position maps, optionally over a new frame.
+        """
+        import numpy as np
+        import pandas as pd
 
-    x1 = x1.drop_duplicates(['idn'])
+        if DF is not None:
+            self.DF = DF
+        self.maps = {}
+        for c in self.levels:
+            if c not in self.DF.columns:
+                continue
+            codes, uniques = pd.factorize(self.DF[c])
+            order = np.argsort(codes, kind='stable')
+            bounds = np.searchsorted(codes[order], np.arange(len(uniques) + 1))
+            self.maps[c] = ({v: i for i, v in enumerate(uniques)}, order, bounds)
+        self.du_pos = {tuple(v): self._lookup('cxn', v) for v in self.DUS.values()}
+        self.token = self._token(self.DF)
+
+    def _check(self, DF=None):
+        if DF is not None and DF is not self.DF:
+            self.Rebuild(DF)
+        elif self._token(self.DF) != self.token:
+            self.Rebuild()
+
+    def _lookup(self, level, values):
+        import numpy as np
 
-    x1['PDMedian'] = x1.loc[:, 'date3':'date4'].apply(np.median, axis =1)
+        lut, order, bounds = self.maps[level]
+        codes = [lut[v] for v in dict.fromkeys(values) if v in lut]
+        if not codes:
+            return np.array([], dtype=np.intp)
+        return np.sort(np.concatenate([order[bounds[i]:bounds[i + 1]] for i in codes]))
+
+    def Positions(self, level, values, DF=None):
+        """
+        Row positions in frame order for the given cxn, name or area values.
+        """
+        self._check(DF)
+        if isinstance(values, str):
+            values = [values]
+        return self._lookup(level, values)
+
+    def DU_Positions(self, DU, DF=None):
+        """
+        Row positions for a list of Contributing Contexts; lists seen before are served from memory.
+        """
+        self._check(DF)
+        key = tuple(DU)
+        if key not in self.du_pos:
+            self.du_pos[key] = self._lookup('cxn', DU)
+        return self.du_pos[key]
+
+    def Select(self, DU=None, name=None, area=None):
+        """
+        Returns the rows of the indexed frame for a DU list, or for name or area values.
+        """
+        if DU is not None:
+            if isinstance(DU, str):
+                DU = self.DUS[DU]
+            return self.DF.take(self.DU_Positions(DU))
+        if name is not None:
+            return self.DF.take(self.Positions('name', name))
+        return self.DF.take(self.Positions('area', area))
+
+
+class SpanIndex():
+    """
+    An interval index over the production spans (date3, date4) of a dataframe, so time-slice 
+    questions are answered in logarithmic time instead of scanning the whole assemblage:
+        * Year(y): items in production during year y (date3 <= y <= date4)
+        * Overlap(a, b): items whose span overlaps [a, b]
+        * After(cutoff): items opening after cutoff (date3 > cutoff), or with on='date4' items still 
+          in production after it, as Chapter 7's LateMat
+    
+    Year uses a centered interval tree; Overlap and After add binary searches over the sorted 
+    endpoints. Every query returns row positions in frame order (use DF.take), and accepts a list 
+    of years or cutoffs to run a batch, returning a dictionary of value: positions. Counts() gives 
+    the number of items in production for many years at once from the sorted endpoints alone.
+    Rows missing either date are left out. Like CxnIndex, the index rebuilds when its frame's 
+    date columns are replaced; call Rebuild() after in-place edits. builds counts the rebuilds.
 
-    x2 = x1.sort_values(by=['date3', 'date4'])
+    Arguments:
+        * DF = a project dataframe, eg the entire site, a Context's cdu, or FCounts()
 
-    my_range = range(1, len(x1.index)+1)
+    Requires:
+        * numpy
+        * pandas
 
-    x_ticks = []
-    for i in range(start, stop, 100):
-        x_ticks.append(i)
+    E.g., sx = KAGC_FUN.SpanIndex(df)
+          df.take(sx.Year(450))
+          sx.After([300, 400, 500], on='date4')
+    """
 
-    # Plot variables
-    sns.set_style("white", rc= {"xtick.bottom": True, "ytick.left": True,})
-    sns.set_context("paper", font_scale = 0.9)
-    plt.hlines(y=my_range, xmin=x2['date3'], xmax=x2['date4'], color='black', alpha= 1)
-    plt.scatter(x2['date3'], my_range, color='black', alpha= 1, label='date3', s = 10)
+    def __init__(self, DF):
+        self.DF = DF
+        self.builds = 0
+        self.Rebuild()
 
-    # PLot lables
-    plt.yticks(my_range, x2.lbl, fontname = "Sans Serif", fontsize=10)
-    plt.xticks(x_ticks, fontname = "Sans Serif", fontsize=10)
-    plt.tick_params(axis = 'x', rotation = 0)    
-    plt.tick_params(axis = 'y', rotation = 0, labelsize = 10)
+    def _token(self, DF):
+        return (id(DF), DF.shape, tuple(_buffers(DF[c]) for c in ['date3', 'date4']))
 
-    if len(str(stop)) > 4 or len(str(start)) >4:
-        plt.xticks(rotation=45)
-    else: pass 
+    def Rebuild(self, DF=None):
+        """
+        Rebuilds the endpoint arrays and the interval tree, optionally over a new frame.
+        """
+        import numpy as np
 
-    #plt.title("Times New Roman 18", fontname = "Times New Roman", fontsize=18)
-    plt.xlabel('Production Spans', fontname = "Sans Serif", fontsize=12)
-    plt.ylabel('Type-Form', fontname = "Carlito", fontsize=12)
-    plt.tight_layout()
+        if DF is not None:
+            self.DF = DF
+        d3 = self.DF['date3'].to_numpy(dtype=float, na_value=np.nan)
+        d4 = self.DF['date4'].to_numpy(dtype=float, na_value=np.nan)
+        pos = np.flatnonzero(~(np.isnan(d3) | np.isnan(d4)))
+        d3, d4 = d3[pos], d4[pos]
+        lo, hi = np.minimum(d3, d4), np.maximum(d3, d4)
+
+        o3, olo, ohi = [np.argsort(v, kind='stable') for v in (d3, lo, hi)]
+        self.starts = (d3[o3], pos[o3])
+        self.los = (lo[olo], pos[olo])
+        self.his = (hi[ohi], pos[ohi])
+
+        # centered interval tree: each node keeps the spans that cross its center, sorted by 
+        # start and by end, and the spans wholly left or right of it go to its children
+        self.nodes = []
+        stack = [(np.arange(len(pos)), None, 0)]
+        while stack:
+            idx, parent, side = stack.pop()
+            if not len(idx):
+                continue
+            center = np.median(np.concatenate([lo[idx], hi[idx]]))
+            cross = (lo[idx] <= center) & (hi[idx] >= center)
+            c = idx[cross]
+            bs, be = c[np.argsort(lo[c], kind='stable')], c[np.argsort(hi[c], kind='stable')]
+            self.nodes.append([center, lo[bs], pos[bs], hi[be], pos[be], -1, -1])
+            me = len(self.nodes) - 1
+            if parent is not None:
+                self.nodes[parent][5 + side] = me
+            stack.append((idx[hi[idx] < center], me, 0))
+            stack.append((idx[lo[idx] > center], me, 1))
+        self.token = self._token(self.DF)
+        self.builds += 1
+
+    def _check(self):
+        if self._token(self.DF) != self.token:
+            self.Rebuild()
+
+    def _stab(self, y):
+        import numpy as np
 
+        out = []
+        n = 0 if self.nodes else -1
+        while n >= 0:
+            center, lo, ls, hi, hs, left, right = self.nodes[n]
+            if y < center:
+                out.append(ls[:np.searchsorted(lo, y, 'right')])
+                n = left
+            elif y > center:
+                out.append(hs[np.searchsorted(hi, y, 'left'):])
+                n = right
+            else:
+                out.append(ls)
+                n = -1
+        return self._ordered(np.concatenate(out)) if out else np.array([], dtype=np.intp)
+
+    def _ordered(self, p):
+        # frame order: a sort for small results, a boolean mask over the frame for large ones
+        import numpy as np
 
+        if len(p) * 64 < len(self.DF):
+            return np.sort(p)
+        mask = np.zeros(len(self.DF), dtype=bool)
+        mask[p] = True
+        return np.flatnonzero(mask)
 
-    # save options
-    if save_plot == 'Y':
-         plt.savefig(out_ti + fext, dpi = 1200)
-    else:
-        pass
+    def _batch(self, fn, values):
+        import numpy as np
 
+        self._check()
+        if np.ndim(values) == 0:
+            return fn(values)
+        return {v: fn(v) for v in values}
+
+    def Year(self, y):
+        """
+        Row positions of items in production during year y, or a dictionary of them for a list of years.
+        """
+        return self._batch(self._stab, y)
+
+    def Overlap(self, a, b=None):
+        """
+        Row positions of items whose span overlaps [a, b]; a may be a list of (a, b) pairs.
+        """
+        import numpy as np
+
+        def fn(ab):
+            a, b = ab
+            s, p = self.los
+            later = p[np.searchsorted(s, a, 'right'):np.searchsorted(s, b, 'right')]
+            return self._ordered(np.concatenate([self._stab(a), later]))
+
+        self._check()
+        if b is not None:
+            return fn((a, b))
+        return {tuple(ab): fn(ab) for ab in a}
+
+    def After(self, cutoff, on='date3'):
+        """
+        Row positions of items with date3 (on='date3') or either date (on='date4') after cutoff; 
+        cutoff may be a list.
+        """
+        import numpy as np
 
-# Contributing Context 
-def CC_DSpanPlt(df, save_plot, out_ti,  fext, start, stop):
+        s, p = self.starts if on == 'date3' else self.his
+        return self._batch(lambda c: self._ordered(p[np.searchsorted(s, c, 'right'):]), cutoff)
 
+    def Counts(self, years):
+        """
+        Number of items in production in each year, as a pandas Series.
+        """
+        import numpy as np
+        import pandas as pd
+
+        self._check()
+        years = np.atleast_1d(years)
+        n = np.searchsorted(self.los[0], years, 'right') - np.searchsorted(self.his[0], years, 'left')
+        return pd.Series(n, index=pd.Index(years, name='year'), name='n')
+
+
+## Compact schema
+CODE_COLS = ['area', 'name', 'tb.tr', 'cxn', 'mcls', 'diag', 'date1', 'type1', 'type2', 'type3', 
+             'type4', 'type5', 'type6', 'cond', 'burnt', 'join']
+
+def Compact(df, drop_description=False):
     """
-    Plots the date spans of unique material classes or Contributing Context. 
-    Dates must be numbers and B.C. dates must be expressed as a negative number e.g.  100 B.C. -> -100. 
+    Converts a project dataframe to a compact schema: the low-cardinality code columns 
+    (CODE_COLS) become categoricals and date3/date4 become nullable Int16. Dates that are 
+    not whole years or fall outside the Int16 range are left as float. 
+    The project functions and Context methods group and crosstab these columns on observed values only.
 
     Parameters:
-        * df = DU class object
-        * TITLE = text plot title
-        * out_ti = figure title
-        * save _plot = save the plot 'Y' or 'N'
-        * fext = output file extension (eg '.png')
-        * start = earliest opening date depicted on  x axis
-        * stop = latest closing date  on x axis
+        * df: a project dataframe, eg KAGC_FUN.DB_Con(art_db)
+        * drop_description: True drops the free-text description column
+
+    Returns:
+        a new dataframe
 
-    Requires: seaborn, matplotlib.pyplot and numpy
+    Requires:
+        * numpy
+        * pandas
 
+    e.g., df = KAGC_FUN.DB_Con(art_db, compact=True)
     """
 
-    import matplotlib.pyplot as plt
-    import seaborn as sns
     import numpy as np
+    import pandas as pd
 
+    x = df.drop(columns=['description']) if drop_description and 'description' in df else df.copy()
 
-    x1 = df.CC_TPQS()
-    x2 = x1.sort_values(by=['date3', 'date4'])
+    for c in CODE_COLS:
+        if c in x.columns and x[c].dtype == object:
+            x[c] = x[c].astype('category')
 
-    x1['lbl'] = x1.name +'-'+ x1.Cat.fillna(x1.mcls)
+    for c in ['date3', 'date4']:
+        if c in x.columns and x[c].dtype.kind == 'f':
+            v = x[c].to_numpy()
+            v = v[~np.isnan(v)]
+            if (v == np.round(v)).all() and (np.abs(v) <= np.iinfo(np.int16).max).all():
+                x[c] = x[c].astype('Int16')
+    return x
 
-    x1['lbl'] = x1.lbl.replace('(TR)','Tr', regex=True, inplace=False)
 
-    my_range = range(1, len(x1.index)+1)
+def Observed(s):
+    """
+    Drops unused categories from a categorical column so crosstabs only show observed values; 
+    other columns are returned unchanged.
+    """
 
-    x_ticks = []
-    for i in range(start, stop, 100):
-        x_ticks.append(i)
+    import pandas as pd
 
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        return s.cat.remove_unused_categories()
+    return s
 
-    # Plot style
-    sns.set_style("white", rc= {"xtick.bottom": True, "ytick.left": True,})
-    sns.set_context("paper", font_scale = 0.9)
-    plt.hlines(y=my_range, xmin=x2['date3'], xmax=x2['date4'], color='black', alpha= 1)
-    plt.scatter(x2['date3'], my_range, color='black', alpha= 1, label='date3', s = 10)
 
+def Decat(s):
+    """
+    Returns a categorical column as plain object values, e.g. for building string labels; 
+    other columns are returned unchanged.
+    """
 
-    # PLot lables
-    plt.yticks(my_range, x1.lbl, fontname = "Sans Serif", fontsize=10)
-    plt.xticks(x_ticks, fontname = "Sans Serif", fontsize=10)
-    plt.tick_params(axis = 'x', rotation = 0)
-    plt.tick_params(axis = 'y', rotation = 0, labelsize = 10)
+    import pandas as pd
 
-    if len(str(stop)) > 4 or len(str(start)) >4:
-        plt.xticks(rotation=45)
-    else: pass 
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        return s.astype(object)
+    return s
 
-    #plt.title("Times New Roman 18", fontname = "Times New Roman", fontsize=18)
-    plt.xlabel('Production Spans', fontname = "Sans Serif", fontsize=12)
-    plt.ylabel('Type-Form', fontname = "Sans Serif", fontsize=12)
-    plt.tight_layout()
 
+## Type-form dictionary
+_TF_SITE = {}
 
+def _tf_keys(df):
+    # the type-form key columns of df: mcls, diag (missing as 'UnID') and the dates as float64, 
+    # so the compact (Int16) and full schemas give the same keys and labels
+    import numpy as np
+    import pandas as pd
+
+    return pd.DataFrame({'mcls': Decat(df.mcls).to_numpy(),
+                         'diag': Decat(df.diag).fillna('UnID').to_numpy(),
+                         'date3': df.date3.to_numpy(dtype='float64', na_value=np.nan),
+                         'date4': df.date4.to_numpy(dtype='float64', na_value=np.nan)})
 
-    #save options
-    if save_plot == 'Y':
-         plt.savefig(out_ti + fext, dpi = 1200)
-    else:
-        pass
 
+def _tf_empty():
+    # a lookup without type-forms
+    import pandas as pd
 
-# FCounts Filtered
-def FC_DatePlt_Filtered(df, save_plot, out_ti,  fext, start, stop):
+    return pd.DataFrame({'mcls': pd.Series([], dtype=object), 'diag': pd.Series([], dtype=object), 
+                         'date3': pd.Series([], dtype='float64'), 'date4': pd.Series([], dtype='float64'), 
+                         'idn': pd.Series([], dtype=object)}, index=pd.RangeIndex(0, name='idn_code'))
 
-    """
-    Plots the date spans of the FCounts method from the DU class.
-    Dates must be numbers and B.C. dates must be expressed as a negative number e.g.  100 B.C. -> -100. 
 
-    Parameters:
-        * df =  DU class object
-        * Vlines = add mean and TPQ lines 'Y' or 'N'
-        * out_ti = figure title
-        * save _plot = save the plot 'Y' or 'N'
-        * fext = output file extension (eg '.png')
-        * start = earliest opening date depicted on  x axis
-        * stop = latest closing date  on x axis
+def _tf_map(k, lookup):
+    # idn_code of each key row in lookup, -1 when the type-form is not in it
+    import numpy as np
+
+    keys = ['mcls', 'diag', 'date3', 'date4']
+    lk = lookup[keys].assign(idn_code=lookup.index.to_numpy())
+    m = k.merge(lk, how='left', on=keys)
+    return m.idn_code.fillna(-1).to_numpy(dtype=np.int64)
+
+
+def _tf_extend(k, lookup):
+    # codes of the key rows in lookup, with the type-forms it lacks appended (in sorted order) after its last id
+    import pandas as pd
 
-    Requires: seaborn, matplotlib.pyplot and numpy
+    codes = _tf_map(k, lookup)
+    miss = codes < 0
+    if miss.any():
+        new = k[miss].drop_duplicates().sort_values(['mcls', 'diag', 'date3', 'date4'], na_position='last')
+        start = int(lookup.index.max()) + 1 if len(lookup) else 0
+        new.index = pd.RangeIndex(start, start + len(new), name='idn_code')
+        new['idn'] = (new.mcls + '-' + new.diag + '-' + new.date3.astype(str) + '-' + new.date4.astype(str))
+        lookup = pd.concat([lookup, new])
+        codes[miss] = _tf_map(k[miss], new)
+    return codes, lookup
 
+
+def TF_Dict(db, save=True, use=True):
     """
+    Builds the site-wide type-form dictionary from the art table and keeps it next to the database 
+    (db + '.typeforms.pkl'). The dictionary is append-only: ids already in the file never change, 
+    and type-forms new to the database are added after the last id, so idn_codes stay the same 
+    across sessions, DUs and later additions to the data. With use = True it also becomes the 
+    dictionary TypeForms maps every frame through for the rest of the session (Context included).
 
-    import matplotlib.pyplot as plt
-    import seaborn as sns
-    import numpy as np
+    Parameters:
+        * db = path to the project SQLite database, or a DBSession
+        * save = False leaves the file as it is (the new type-forms are only added in memory)
+        * use = False only returns the dictionary
 
+    Returns:
+        the lookup dataframe, indexed by idn_code, as TypeForms
 
-    x = df.sort_values(by=['date3', 'date4'])
+    Requires:
+        * pandas
+        * sqlite3
 
-    my_range = range(1, len(x.index)+1)
+    e.g., tf = KAGC_FUN.TF_Dict(art_db)
+          b503 = co.Context(KAGC_FUN.DU_Load(art_db, KAGC_DUS.B503, 'B503'), -24)
+    """
 
-    x_ticks = []
-    for i in range(start, stop, 100):
-        x_ticks.append(i)
+    import os
+    import pandas as pd
 
-    # Plot style
-    sns.set_style("white", rc= {"xtick.bottom": True, "ytick.left": True,})
-    sns.set_context("paper", font_scale = 0.9)
+    conn, own = _db_conn(db)
+    forms = pd.read_sql_query('SELECT DISTINCT mcls, diag, date3, date4 FROM art', conn)
+    if own:
+        conn.close()
 
-    if len(x) > 20:
-        plt.figure(figsize=(10,6))
+    path = str(db.db if isinstance(db, DBSession) else db) + '.typeforms.pkl'
+    if os.path.exists(path):
+        lookup = pd.read_pickle(path)
     else:
-        pass
+        lookup = _tf_empty()
+    n = len(lookup)
+    lookup = _tf_extend(_tf_keys(forms).drop_duplicates(), lookup)[1]
+    if save and len(lookup) > n:
+        try:
+            lookup.to_pickle(path)
+        except OSError:
+            pass
+    if use:
+        _TF_SITE['lookup'] = lookup
+    return lookup
+
+
+def TypeForms(df, lookup=None):
+    """
+    Assigns an integer id (idn_code) to each distinct type-form, i.e. each (mcls, diag, date3, date4) 
+    combination, with a missing diag counted as 'UnID' as in the idn key. Dedup, unique-form counts 
+    and crosstabs can then run on integers instead of idn strings.
 
+    The ids come from the site-wide dictionary (TF_Dict) when one is given or in use, so they are 
+    the same in every frame; type-forms missing from it are appended to the returned lookup. Without 
+    one, the ids follow the sorted order of df's own combinations, and are only comparable within df.
+    The idn labels write the dates as floats (eg 'amp-x--175.0--100.0') in both schemas.
 
-    plt.hlines(y=my_range, xmin=x['date3'], xmax=x['date4'], color='black', alpha= 1)
-    plt.scatter(x['date3'], my_range, color='black', alpha= 1, label='date3', s = 11)
+    Parameters:
+        * df: a project dataframe, usually the entire site, eg KAGC_FUN.DB_Con(art_db)
+        * lookup: optional dictionary from TF_Dict (defaults to the one in use)
 
-    # Plot lables
-    if len(x) > 20:
-        plt.yticks(my_range, x.Seq, fontname = "Sans Serif", fontsize=12)
-    else:
-        plt.yticks(my_range, x.mcls +"-"+ x.Seq.astype(str), fontname = "Sans Serif", fontsize=12)
-        plt.tick_params(axis = 'y', rotation = 0, labelsize = 11)
-        
+    Returns:
+        a tuple of
+            - codes: a series of idn_code values aligned with df's index
+            - lookup: a dataframe indexed by idn_code with mcls, diag, date3, date4 and the idn label 
+              (mcls-diag-date3-date4) for decoding
 
-    plt.xticks(x_ticks, fontname = "Sans Serif", fontsize=10)
-    plt.tick_params(axis = 'x', rotation = 0)
-    plt.tick_params(axis = 'y', rotation = 0, labelsize = 8)
+    Requires:
+        * numpy
+        * pandas
 
-    if len(str(stop)) > 4 or len(str(start)) >4:
-        plt.xticks(rotation=45)
-    else: pass 
-   
-    #plt.title("Times New Roman 18", fontname = "Times New Roman", fontsize=18)
-    plt.xlabel('Production Spans', fontname = "Sans Serif", fontsize=12)
-    plt.ylabel('Type-Form', fontname = "Sans Serif", fontsize=12)
-    plt.tight_layout()
-
-    # Additinal 
-
-    #if Vlines == 'Y':
-        # Mean Median
-        #plt.vlines(x = df.cdu.MPDate.mean(), ymin= 0, ymax = len(x.diag), color='blue', alpha= 1, linestyles=['--'])
-        #plt.text(df.cdu.MPDate.mean() + 1, len(x.diag)+1, "MD", rotation= 0, color = 'blue')
-
-        # TPQ
-        #plt.vlines(x = x.date3.max(), ymin= 0, ymax = len(x.diag), color='red', alpha= 1, linestyles=['--'])
-        #plt.text(x.date3.max() + 1, len(x.diag)+1, "TPQ", rotation= 0, color ='red')
-    #else:
-        #pass
-
-    if len(str(stop)) > 4 or len(str(start)) >4:
-        plt.xticks(rotation=45)
-    else: pass 
-    
-    # Save
-    if save_plot == 'Y':
-         plt.savefig(out_ti + fext, dpi = 1200)
-    else:
-        pass
+    e.g., df['idn_code'], tf = KAGC_FUN.TypeForms(df)
+          tf.idn[b503.cdu.idn_code]
+    """
+
+    import pandas as pd
 
+    if lookup is None:
+        lookup = _TF_SITE.get('lookup')
+    if lookup is None:
+        lookup = _tf_empty()
+    codes, lookup = _tf_extend(_tf_keys(df), lookup)
+    return pd.Series(codes, index=df.index, name='idn_code'), lookup
 
 
-# FCounts 
-def FC_DatePlt(df, Vlines, save_plot, out_ti,  fext, start, stop):
+def IDN_Codes(df, lookup):
     """
-    Plots the date spans of the FCounts method from the DU class.
-    Dates must be numbers and B.C. dates must be expressed as a negative number e.g.  100 B.C. -> -100. 
-    
-    Parameters:
-        * df = = DU class object
-        * Vlines = add mean and TPQ lines 'Y' or 'N'
-        * out_ti = figure title
-        * save _plot = save the plot 'Y' or 'N'
-        * fext = output file extension (eg '.png')
-        * start = earliest opening date depicted on  x axis
-        * stop = latest closing date  on x axis
+    Returns the idn_code of each row of df in an existing TypeForms or TF_Dict lookup, 
+    e.g. for rows loaded after the site dictionary was built. Type-forms missing from the lookup get -1.
 
-    Requires: seaborn, matplotlib.pyplot and numpy
+    Parameters:
+        * df: a project dataframe
+        * lookup: the lookup returned by TypeForms or TF_Dict
 
+    Requires:
+        * numpy
+        * pandas
     """
-    import matplotlib.pyplot as plt
-    import seaborn as sns
-    import numpy as np
 
+    import pandas as pd
 
-    x = df.FCounts().sort_values(by=['date3', 'date4'])
+    return pd.Series(_tf_map(_tf_keys(df), lookup), index=df.index, name='idn_code')
 
-    my_range = range(1, len(x.index)+1)
 
-    x_ticks = []
-    for i in range(start, stop, 100):
-        x_ticks.append(i)
+## Site-wide DU membership
+def DU_Explode(DF, DUS):
+    """
+    Selects every DU in DUS from DF in one join and stacks them. Rows from contexts 
+    that belong to more than one DU (e.g. TRA12-52.2 in A002 and A005) appear once per DU.
+    Each DU's block matches DU_Select(DF, DUS[du], du).
 
-    # Plot style
-    sns.set_style("white", rc= {"xtick.bottom": True, "ytick.left": True,})
-    sns.set_context("paper", font_scale = 0.9)
+    Arguments:
+        * DF = dataframe you are working with (usually a dataframe for the  entire the project)
+        * DUS = a dictionary of DU names and Contributing Context lists, eg KAGC_DUS.DU_Dict()
 
-    if len(x) > 20:
-        plt.figure(figsize=(10,6))
-    else:
-        pass
-    
-    #if Vlines == "Y":
-        #plt.figure(figsize=(10,6))
+    Returns:
+        a dataframe with the 'DU' and 'MPDate' variables appended
 
-    plt.hlines(y=my_range, xmin=x['date3'], xmax=x['date4'], color='black', alpha= 1)
-    plt.scatter(x['date3'], my_range, color='black', alpha= 1, label='date3', s = 11)
+    Requires:
+        * numpy
+        * pandas
+    """
 
-    # Plot lables
-    if len(x) > 20:
-        plt.yticks(my_range, x.Seq, fontname = "Sans Serif", fontsize=12)
-    else:
-        plt.yticks(my_range, x.mcls +"-"+ x.Seq.astype(str), fontname = "Sans Serif", fontsize=12)
-        plt.tick_params(axis = 'y', rotation = 0, labelsize = 11)
-        
+    import numpy as np
+    import pandas as pd
 
+    mem = pd.DataFrame([(du, c) for du, cc in DUS.items() for c in cc], 
+                       columns=['DU', 'cxn']).drop_duplicates()
+    mem['_du'] = pd.factorize(mem.DU)[0]
+    rows = pd.DataFrame({'cxn': DF['cxn'].to_numpy(), '_pos': np.arange(len(DF))})
+    hit = rows.merge(mem, on='cxn').sort_values(['_du', '_pos'])
 
+    x = DF.take(hit._pos.to_numpy())
+    x['DU'] = hit.DU.to_numpy()
+    x['MPDate'] = ProdDates(x)['MPDate']
+    return x
 
-    plt.xticks(x_ticks, fontname = "Sans Serif", fontsize=10)
-    plt.tick_params(axis = 'x', rotation = 0)
-    plt.tick_params(axis = 'y', rotation = 0, labelsize = 8)
 
-    if len(str(stop)) > 4 or len(str(start)) >4:
-        plt.xticks(rotation=45)
-    else: pass 
+# Calculation Functions
+## Production date variables
+def ProdDates(df):
+    """
+    Derives the production date variables from the date3 and date4 columns in a single pass.
+    Rows missing either date return NaN. The columns are selected by name, so their order in df does not matter.
 
+    Parameters:
+        * df: a dataframe with date3 and date4 columns, e.g. b503.cdu
 
-    #plt.title("Times New Roman 18", fontname = "Times New Roman", fontsize=18)
-    plt.xlabel('Production Spans', fontname = "Sans Serif", fontsize=12)
-    plt.ylabel('Type-Form', fontname = "Sans Serif", fontsize=12)
-    
+    Returns:
+        a dataframe aligned with df's index containing
+            - Dspan: production span (date4 - date3)
+            - MPDate: median production date
+            - TPQ_25%: first quartile of the production span
+            - TPQ_75%: third quartile of the production span
+            - EAAD: years between the item's opening date and the latest opening date in df
+            - EAAD-M: years between the item's MPDate and the latest MPDate in df
 
-    # Additinal 
+    Requires:
+        * numpy
+        * pandas
 
-    if Vlines == 'Y':
-        # Mean Median
-        MMD = plt.vlines(x = df.cdu.MPDate.mean(), ymin= 0, ymax = len(x.diag), color='blue', alpha= 1, linestyles=['--'], label="Mean Median Date")
-        #plt.text(df.cdu.MPDate.mean() + 1, len(x.diag)+1, "MD", rotation= 0, color = 'blue')
+    e.g., b503.cdu.join(KAGC_FUN.ProdDates(b503.cdu))
+    """
 
-        # TPQ
-        TPQ = plt.vlines(x = x.date3.max(), ymin= 0, ymax = len(x.diag), color='red', alpha= 1, linestyles=['--'], label="Terminus Post Quem")
-        #plt.text(x.date3.max() + 1, len(x.diag)+1, "TPQ", rotation= 0, color ='red')
+    import numpy as np
+    import pandas as pd
+
+    d3 = df['date3'].to_numpy(dtype='float64', na_value=np.nan)
+    d4 = df['date4'].to_numpy(dtype='float64', na_value=np.nan)
 
-        plt.legend(loc ="lower center", bbox_to_anchor= (0.5, -0.3), ncol = 2, handles = [MMD, TPQ], fontsize = 10)
+    dspan = d4 - d3
+    mpdate = d3 + dspan*.5
 
-        
+    if np.isnan(d3).all():
+        eaad = np.full(len(d3), np.nan)
     else:
-        pass
+        eaad = np.nanmax(d3) - d3
 
-    
-    # Save
-    if save_plot == 'Y':
-         plt.tight_layout()
-         plt.savefig(out_ti + fext, dpi = 1200)
+    if np.isnan(mpdate).all():
+        eaadm = np.full(len(d3), np.nan)
     else:
-        pass
+        eaadm = np.nanmax(mpdate) - mpdate
+
+    return pd.DataFrame({'Dspan': dspan,
+                         'MPDate': mpdate,
+                         'TPQ_25%': d3 + dspan*.25,
+                         'TPQ_75%': d3 + dspan*.75,
+                         'EAAD': eaad,
+                         'EAAD-M': eaadm}, index=df.index)
 
 
-# DU Material Class TPQ
-def DU_MCLS_TPQ_Plt(df, save_plot, out_ti,  fext, start, stop):
+## Whole-site DU summaries
+def DUSmry_Batch(DF, DUS, res):
     """
-    Plots the date spans of unique material classes or Contributing Context using the DU class's .MCS_TPQS method.
-    Dates must be numbers and B.C. dates must be expressed as a negative number e.g.  100 B.C. -> -100. 
+    Computes the Context DUSmry variables for every DU in DUS at once, using one exploded 
+    DU membership join (DU_Explode) and grouped aggregations instead of a Context per DU. 
+    DUs without any rows in DF are left out, as DUSmry cannot summarise them either. MMDate is 
+    an integer, as in DUSmry (nullable Int64 when a DU has no production dates at all).
 
     Parameters:
-        * df = DU class object
-        * TITLE = text plot title
-        * out_ti = figure title
-        * save_plot = save the plot 'Y' or 'N'
-        * fext = output file extension (eg '.png')
-        * start = earliest opening date depicted on  x axis
-        * stop = latest closing date  on x axis
-
-    Requires: seaborn, matplotlib.pyplot and numpy
-    
+        * DF: dataframe for the entire project, eg KAGC_FUN.DB_Con(art_db)
+        * DUS: a dictionary of DU names and Contributing Context lists, eg KAGC_DUS.DU_Dict()
+        * res: residual cutoff date, as for the Context class
+
+    Returns:
+        a dataframe with one row per DU and the same columns as Context.DUSmry()
+
+    Requires:
+        * pandas
+
+    e.g., KAGC_FUN.DUSmry_Batch(df, {'B503': KAGC_DUS.B503, 'BDS-1': KAGC_DUS.BDS1}, -24)
+    """
+
+    import pandas as pd
+
+    x = DU_Explode(DF, DUS)
+    g = x.groupby('DU', sort=False)
+
+    # Type-forms as counted by Context.FCounts
+    keys = ['DU', 'mcls', 'diag', 'date3', 'date4']
+    fc = x[keys].dropna().drop_duplicates()
+    fg = fc.groupby('DU', sort=False)
+
+    dta = pd.DataFrame(index=pd.Index(g.size().index, name=None))
+    dta['DU'] = dta.index
+    # TPQ over the rows with a material class, as Context.DUSmry takes it from MCLS_TPQS
+    dta['TPQ'] = x.date3.where(x.mcls.notna()).groupby(x.DU, sort=False).max()
+    mm = g.MPDate.mean().round()
+    dta['MMDate'] = mm.astype('int64') if mm.notna().all() else mm.astype('Int64')
+    dta['Span'] = g.date4.max() - g.date3.min()
+    dta['TForms'] = fg.size()
+    dta['RForms'] = (fc.date3 < res).groupby(fc.DU).sum()
+    dta['NRForms'] = (fc.date3 > res).groupby(fc.DU).sum()
+    dta[['TForms', 'RForms', 'NRForms']] = dta[['TForms', 'RForms', 'NRForms']].fillna(0).astype(int)
+    dta['NRF:RF'] = round(dta.NRForms/dta.RForms, 2)
+    dta['Dspan > 100'] = ((fc.date4 - fc.date3) > 100).groupby(fc.DU).sum()
+    dta['Dspan > 100'] = dta['Dspan > 100'].fillna(0).astype(int)
+    #presence - absence
+    for col, t3 in [('Arch', 'architectural'), ('Display', 'display'), ('P.items', 'p.item'),
+                    ('P.adorn', 'p.adornment'), ('Tool', 'tool'), ('Production', 'production')]:
+        dta[col] = x.type3.eq(t3).groupby(x.DU, sort=False).any()
+
+    return dta.reset_index(drop=True)
+
+
+## Monte Carlo dating
+def _mc_fraction(dist, rng, shape):
+    # positions within each span (0 = date3, 1 = date4) drawn from dist
+    if callable(dist):
+        return dist(rng, shape)
+    if isinstance(dist, tuple) and dist[0] == 'beta':
+        return rng.beta(dist[1], dist[2], shape)
+    if dist == 'triangular':
+        return rng.triangular(0.0, 0.5, 1.0, shape)
+    if dist == 'uniform':
+        return rng.random(shape)
+    raise ValueError("dist must be 'uniform', 'triangular', ('beta', a, b) or a function of (rng, shape)")
+
+
+def _mc_shard(arrays, reps, dist, seed, batch=None):
+    """
+    One shard of MC_Dating replicates. Returns (reps x groups) arrays of TPQ, MMDate and NRF:RF.
+    The replicates are drawn batch at a time, so the (replicates x rows) arrays stay under MC_Dating's 
+    max_memory; the artifact and type-form dates come from two streams of the shard's seed, so the 
+    results do not depend on the batch size.
     """
 
-    import  matplotlib.pyplot as plt
-    import seaborn as sns
     import numpy as np
 
+    rng_d, rng_f = [np.random.default_rng(s) for s in seed.spawn(2)]
+    batch = reps if batch is None else max(1, batch)
+    parts = [_mc_batch(arrays, min(batch, reps - i), dist, rng_d, rng_f) for i in range(0, reps, batch)]
+    return tuple(np.vstack([p[k] for p in parts]) for k in range(3))
 
-    x1 = df.MCLS_TPQS()
-    x2 = x1.sort_values(by=['date3', 'date4'])
 
-    x2['lbl'] = x2.name +'-'+ x2.Cat.fillna(x2.mcls)
-    x2['lbl'] = x2.lbl.replace('(TR)','Tr', regex=True, inplace=False)
+def _mc_batch(arrays, reps, dist, rng_d, rng_f):
+    # TPQ, MMDate and NRF:RF for reps replicates
+    import numpy as np
 
-    my_range = range(1, len(x1.index)+1)
+    lo, hi, both, start, gcode, flo, fhi, fcode, ngrp, res = arrays
 
-    x_ticks = []
-    for i in range(start, stop, 100):
-        x_ticks.append(i)
+    d = lo + (hi - lo) * _mc_fraction(dist, rng_d, (reps, len(lo)))
+    tpq = np.maximum.reduceat(np.where(np.isnan(lo), -np.inf, d), start, axis=1)
+    tpq[np.isinf(tpq)] = np.nan
 
-    # Plot style
-    sns.set_style("white", rc= {"xtick.bottom": True, "ytick.left": True,})
-    sns.set_context("paper", font_scale = 0.9)
-    plt.hlines(y=my_range, xmin=x2['date3'], xmax=x2['date4'], color='black', alpha= 1)
-    plt.scatter(x2['date3'], my_range, color='black', alpha= 1, label='date3', s = 10)
+    row = np.arange(reps)[:, None] * ngrp
+    flat = (row + gcode).ravel()
+    dsum = np.bincount(flat, np.where(both, d, 0.0).ravel(), reps * ngrp).reshape(reps, ngrp)
+    dcnt = np.bincount(gcode[both], minlength=ngrp)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mmdate = dsum / dcnt
 
-    if len(str(stop)) > 3 or len(str(start)) >3:
-        plt.xticks(rotation=45)
-    else: pass 
+    f = flo + (fhi - flo) * _mc_fraction(dist, rng_f, (reps, len(flo)))
+    flat = (row + fcode).ravel()
+    nrf = np.bincount(flat, (f > res).ravel(), reps * ngrp).reshape(reps, ngrp)
+    rf = np.bincount(flat, (f < res).ravel(), reps * ngrp).reshape(reps, ngrp)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        ratio = np.where(rf > 0, nrf / rf, np.nan)
+    return tpq, mmdate, ratio
 
-    # PLot lables
-    plt.yticks(my_range, x2.lbl, fontname = "Sans Serif", fontsize=10)
-    plt.xticks(x_ticks, fontname = "Sans Serif", fontsize=10)
-    plt.tick_params(axis = 'x', rotation = 0)
-    plt.tick_params(axis = 'y', rotation = 0, labelsize = 10)
 
-    if len(str(stop)) > 3 or len(str(start)) >3:
-        plt.xticks(rotation=45)
-    else: pass
+def MC_Dating(DF, res, DUS=None, by='DU', n=1000, dist='uniform', seed=None, n_jobs=1, ci=0.95, 
+              shard_size=250, draws=False, max_memory=2**28):
+    """
+    Monte Carlo simulation of the DUSmry dates. In each replicate every artifact gets a date drawn 
+    inside its date3-date4 span, and every DU (or other group) gets
+        * TPQ: the latest drawn date
+        * MMDate: the mean drawn date (artifacts with both dates, as MPDate)
+        * NRF:RF: type-forms (as FCounts) drawn after res over those drawn before it
+
+    Replicates are computed as NumPy arrays in fixed-size shards. Each shard has its own seed 
+    spawned from one SeedSequence, so a given seed, n and shard_size give the same results 
+    with any number of worker processes. Within a shard the replicates are drawn in batches 
+    that keep the (replicates x artifacts) arrays of each process under max_memory bytes, so a 
+    site-wide run needs about n_jobs x max_memory; the batch size does not change the results.
+
+    The intervals are not error bars around the DUSmry point values, which take each artifact 
+    at its opening date (date3):
+        * TPQ is the latest drawn date, and no draw is earlier than its date3, so every simulated 
+          TPQ is at or after the DUSmry TPQ (the latest date3); the interval usually lies above it.
+        * NRF:RF counts a type-form as residual only when its drawn date falls before res, where 
+          DUSmry uses date3, so forms spanning res move to the non-residual side and the simulated 
+          ratio is usually higher.
+        * MMDate draws around MPDate and, for the uniform and triangular dist, centres on the DUSmry MMDate.
+    Compare the intervals between DUs, or with one another under different dist, rather than 
+    against the point values.
 
-    #plt.title("Times New Roman 18", fontname = "Times New Roman", fontsize=18)
-    plt.xlabel('Production Spans', fontname = "Sans Serif", fontsize=12)
-    plt.ylabel('Type-Form', fontname = "Sans Serif", fontsize=12)
-    plt.tight_layout()
+    Parameters:
+        * DF = dataframe for the entire project, or a Context's cdu
+        * res = residual cutoff date, as for the Context class
+        * DUS = optional dictionary of DU names and Contributing Context lists, eg KAGC_DUS.DU_Dict()
+        * by = the grouping column when DUS is not given
+        * n = number of replicates
+        * dist = 'uniform', 'triangular' (peaking at MPDate), ('beta', a, b), or a function (rng, shape) 
+          returning positions between 0 (date3) and 1 (date4); a function must be importable for n_jobs > 1
+        * seed = integer seed for reproducible results
+        * n_jobs = number of worker processes for the shards
+        * ci = width of the credible interval
+        * shard_size = replicates per shard
+        * draws = True also returns the replicate arrays
+        * max_memory = bytes allowed for the working arrays of one batch of replicates
+
+    Returns:
+        a dataframe with one row per group and the median, lower and upper bounds of TPQ, MMDate and NRF:RF
+        (and a dictionary of replicates x groups arrays when draws = True)
 
+    Requires:
+        * numpy
+        * pandas
+        * warnings
 
-    #save options
-    if save_plot == 'Y':
-         plt.savefig(out_ti + fext, dpi = 1200)
+    e.g., KAGC_FUN.MC_Dating(df, -24, DUS=KAGC_DUS.DU_Dict(), n=5000, seed=1, n_jobs=4)
+    """
+
+    import warnings
+    import numpy as np
+    import pandas as pd
+
+    if DUS is not None:
+        DF = DU_Explode(DF, DUS)
+        by = 'DU'
+
+    gcode, labels = pd.factorize(DF[by], sort=True)
+    keep = gcode >= 0
+    order = np.argsort(gcode[keep], kind='stable')
+    x = DF[keep].iloc[order]
+    gcode = gcode[keep][order]
+    ngrp = len(labels)
+
+    lo = x['date3'].to_numpy(dtype='float64', na_value=np.nan)
+    hi = x['date4'].to_numpy(dtype='float64', na_value=np.nan)
+    both = ~(np.isnan(lo) | np.isnan(hi))
+    hi = np.where(np.isnan(hi), lo, hi)
+    start = np.searchsorted(gcode, np.arange(ngrp))
+
+    # type-forms, as counted by Context.FCounts
+    fc = x[['mcls', 'diag', 'date3', 'date4']].assign(_g=gcode).dropna().drop_duplicates()
+    arrays = (lo, hi, both, start, gcode, 
+              fc.date3.to_numpy(dtype='float64'), fc.date4.to_numpy(dtype='float64'), 
+              fc._g.to_numpy(), ngrp, res)
+
+    sizes = [min(shard_size, n - i) for i in range(0, n, shard_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    # about six float64 / int64 (replicates x rows) working arrays per batch
+    batch = int(max_memory // (48 * max(len(lo), len(fc), 1)))
+    if n_jobs > 1 and len(sizes) > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=n_jobs) as ex:
+            parts = list(ex.map(_mc_shard, [arrays] * len(sizes), sizes, [dist] * len(sizes), seeds, 
+                                [batch] * len(sizes)))
     else:
-        pass
+        parts = [_mc_shard(arrays, r, dist, s, batch) for r, s in zip(sizes, seeds)]
+
+    sims = {k: np.vstack([p[i] for p in parts]) for i, k in enumerate(['TPQ', 'MMDate', 'NRF:RF'])}
+    q = [(1 - ci) / 2, 0.5, (1 + ci) / 2]
+    out = pd.DataFrame(index=pd.Index(labels, name=by))
+    for k, v in sims.items():
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            lo_q, med, hi_q = np.nanquantile(v, q, axis=0) if len(v) else np.full((3, ngrp), np.nan)
+        out[k] = med
+        out[k + ' lo'] = lo_q
+        out[k + ' hi'] = hi_q
+
+    if draws:
+        return out, sims
+    return out
+
+
+## Aoristic production-span density
+def Aoristic(df, by='DU', start=None, stop=None, width=1, weight=None, DUS=None, normalize=False):
+    """
+    Aoristic density curves: each artifact's weight is spread evenly over the years of its 
+    date3-date4 production span, and the years are summed into bins of the given width. 
+    All groups are computed together from one difference array (a +w/years entry at each 
+    span's first year and a -w/years entry after its last) and a cumulative sum along the years, 
+    so there is no loop over artifacts or groups. 
+    Rows missing either date are left out; years outside start-stop are dropped, not moved into the end bins.
 
+    Parameters:
+        * df = a project dataframe, eg the entire site, a Context's cdu, or FCounts()
+        * by = the grouping column or columns, eg 'DU', 'cxn', or ['DU', 'mcls']
+        * start, stop = first and last year of the curve (default: the earliest date3 and latest date4)
+        * width = bin width in years
+        * weight = None (each row counts 1), a column name such as 'freq' for FCounts(), or an array of weights 
+          aligned with df's rows (with DUS it is exploded with them)
+        * DUS = optional dictionary of DU names and Contributing Context lists, eg KAGC_DUS.DU_Dict(); 
+          df is then expanded with DU_Explode so every DU is computed in the same pass
+        * normalize = True scales each curve to sum to 1
+
+    Returns:
+        a dataframe with one row per group and one column per bin, labelled by the bin's first year
+        (df.to_numpy() gives the 2-D array)
 
-# Generic 
-def dateplot(df, save_plot, out_ti,  fext, start, stop):
+    Requires:
+        * numpy
+        * pandas
+
+    e.g., KAGC_FUN.Aoristic(df, by=['DU', 'mcls'], start=-100, stop=700, width=25, DUS=KAGC_DUS.DU_Dict())
     """
-    Generic base for KAGC plots.
-    Dates must be numbers and B.C. dates must be expressed as a negative number e.g.  100 B.C. -> -100. 
 
+    import numpy as np
+    import pandas as pd
+
+    if DUS is not None:
+        if weight is not None and not isinstance(weight, str):
+            # carry an array of weights as a column, so it is exploded with its rows
+            df = df.assign(_weight=np.asarray(weight, dtype='float64'))
+            weight = '_weight'
+        df = DU_Explode(df, DUS)
+    by = [by] if isinstance(by, str) else list(by)
+
+    d3 = df['date3'].to_numpy(dtype='float64', na_value=np.nan)
+    d4 = df['date4'].to_numpy(dtype='float64', na_value=np.nan)
+    if weight is None:
+        w = np.ones(len(df))
+    elif isinstance(weight, str):
+        w = df[weight].to_numpy(dtype='float64')
+    else:
+        w = np.asarray(weight, dtype='float64')
+
+    g = df.groupby(by, observed=True, sort=True, dropna=False)
+    gcode = g.ngroup().to_numpy()
+    labels = list(g.groups)
+    ok = ~(np.isnan(d3) | np.isnan(d4)) & (gcode >= 0)
+    lo = np.floor(np.fmin(d3, d4)[ok]).astype(np.int64)
+    hi = np.floor(np.fmax(d3, d4)[ok]).astype(np.int64)
+    w, gcode = w[ok], gcode[ok]
+
+    start = int(np.floor(start if start is not None else (lo.min() if len(lo) else 0)))
+    stop = int(np.floor(stop if stop is not None else (hi.max() if len(hi) else start)))
+    nbin = -(-(stop - start + 1) // width)
+    years = nbin * width
+    ngrp = len(labels)
+
+    rate = w / (hi - lo + 1)
+    keep = (hi >= start) & (lo <= stop)
+    a = np.clip(lo[keep] - start, 0, years)
+    b = np.clip(hi[keep] - start + 1, 0, years)
+    base = gcode[keep] * (years + 1)
+    diff = (np.bincount(base + a, rate[keep], ngrp * (years + 1)) 
+            - np.bincount(base + b, rate[keep], ngrp * (years + 1)))
+    dens = np.cumsum(diff.reshape(ngrp, years + 1)[:, :years], axis=1)
+
+    # years past stop in the last bin are empty
+    dens[:, stop - start + 1:] = 0
+    out = dens.reshape(ngrp, nbin, width).sum(axis=2)
+    if normalize:
+        tot = out.sum(axis=1, keepdims=True)
+        out = np.divide(out, tot, out=np.zeros_like(out), where=tot > 0)
+
+    index = pd.MultiIndex.from_tuples(labels, names=by) if len(by) > 1 else pd.Index(labels, name=by[0])
+    return pd.DataFrame(out, index=index, columns=pd.Index(start + width * np.arange(nbin), name='year'))
+
+
+## CC material class ubiquity
+def UBQ_MCLS(DU, CC):
+    """
+    Calculates ubiquity of material classes for DUs' with contributing contexts.
 
     Parameters:
-        * df = dataframe of DU material class
-        * TITLE = text plot title
-        * out_ti = figure title
-        * save_plot = save the plot 'Y' or 'N'
-        * fext = output file extension (eg '.png')
-        * start = earliest opening date depicted on  x axis
-        * stop = latest closing date  on x axis
+        * DU: ContextObject cdu, eg  b503.cdu
+        * CC: contributing contexts from the KAGC_DUS module. eg KAGC_DUS.B503
+
+    Requires:
+        * numpy
+        * pandas
 
-    Requires: seaborn, matplotlib.pyplot and numpy
+    returns:
+        a dictionary
 
     """
 
-    import  matplotlib.pyplot as plt
-    import seaborn as sns
     import numpy as np
+    import pandas as pd
 
-    df['idn'] = df.name +'-'+df.mcls +'-'+ df.diag +'-'+ df.date3.astype(str) + '-' + df.date4.astype(str)
+    x = pd.crosstab([Observed(DU.cxn)], [Observed(DU.mcls)]).reset_index()
 
-    df['lbl'] = df.name +'-'+ df.Cat.fillna(df.mcls)
+    avgs = round(x.mean(), 2)
+    ConCx = len(CC)
 
-    
-    x1 = df.dropna(subset = ['diag', 'date3', 'date4'])
+    ArtU = []
+
+    for i,j in x.items():
+        z = (np.count_nonzero(j)) / len(CC)
+        ArtU.append((i, round(z, 2)))
+    return {'DU CC': ConCx,
+        'Artifact Ubiquity':ArtU}
 
-    x1 = x1.drop_duplicates(['idn'])
 
-    x1['PDMedian'] = x1.loc[:, 'date3':'date4'].apply(np.median, axis =1)
+def UBQ_Site(DF, DUS, diag=False, denominator='finds'):
+    """
+    Calculates material class ubiquity, and optionally diag ubiquity, for every DU at once from 
+    a single context x mcls presence matrix. The ubiquity of a class in a DU is the share of its 
+    contributing contexts that produced that class.
 
-    x2 = x1.sort_values(by=['date3', 'date4'])
+    Unlike UBQ_MCLS, the default denominator only counts contributing contexts with finds; 
+    denominator = 'all' divides by every listed context, as UBQ_MCLS does.
 
-    my_range = range(1, len(x1.index)+1)
+    Parameters:
+        * DF: dataframe for the entire project
+        * DUS: a dictionary of DU names and Contributing Context lists, eg KAGC_DUS.DU_Dict()
+        * diag: True also returns the ubiquity of each mcls-diag sub-type
+        * denominator: 'finds' or 'all'
 
-    x_ticks = []
-    for i in range(start, stop, 100):
-        x_ticks.append(i)
-    # Plot style
-    sns.set_style("white", rc= {"xtick.bottom": True, "ytick.left": True,})
-    sns.set_context("paper", font_scale = 0.9)
-    plt.hlines(y=my_range, xmin=x2['date3'], xmax=x2['date4'], color='black', alpha= 1)
-    plt.scatter(x2['date3'], my_range, color='black', alpha= 1, label='date3', s = 11)
+    Requires:
+        * numpy
+        * pandas
+        * scipy
 
+    returns:
+        a dictionary with 
+            - 'DU CC': a dataframe of the number of listed contributing contexts (CC) and of those with finds (CC finds)
+            - 'Artifact Ubiquity': a DU x mcls dataframe
+            - 'Diag Ubiquity': a DU x (mcls, diag) dataframe (only when diag = True)
 
-    # PLot lables
-    plt.yticks(my_range, x2.lbl, fontname = "Sans Serif", fontsize=10)
-    plt.xticks(x_ticks, fontname = "Sans Serif", fontsize=10)
-    plt.tick_params(axis = 'x', rotation = 0)
-    plt.tick_params(axis = 'y', rotation = 0, labelsize = 10)
+    e.g., KAGC_FUN.UBQ_Site(df, KAGC_DUS.DU_Dict())['Artifact Ubiquity'].loc['B503']
+    """
 
-    if len(str(stop)) > 4 or len(str(start)) >4:
-        plt.xticks(rotation=45)
-    else: pass 
+    import numpy as np
+    import pandas as pd
+    from scipy import sparse
+
+    B, cxns, mcls = Incidence(DF, 'cxn', 'mcls')
+
+    dus = list(DUS)
+    lut = {c: i for i, c in enumerate(cxns)}
+    rows, cols = [], []
+    for r, du in enumerate(dus):
+        for c in dict.fromkeys(DUS[du]):
+            if c in lut:
+                rows.append(r)
+                cols.append(lut[c])
+    M = sparse.csr_matrix((np.ones(len(rows), dtype=np.int32), (rows, cols)), shape=(len(dus), len(cxns)))
+
+    cc = pd.DataFrame({'CC': [len(set(DUS[du])) for du in dus],
+                       'CC finds': np.asarray(M.sum(axis=1)).ravel()}, index=pd.Index(dus, name='DU'))
+    denom = (cc['CC finds'] if denominator == 'finds' else cc['CC']).to_numpy().astype(float)
+    denom[denom == 0] = np.nan
+
+    ubq = pd.DataFrame((M @ B).toarray() / denom[:, None], index=cc.index, 
+                       columns=pd.Index(mcls, name='mcls'))
+    out = {'DU CC': cc, 
+           'Artifact Ubiquity': ubq.round(2)}
+
+    if diag:
+        md = DF[['cxn', 'mcls', 'diag']].dropna()
+        g = md.groupby(['mcls', 'diag'], observed=True, sort=True)
+        code = g.ngroup().to_numpy()
+        keys = pd.MultiIndex.from_tuples(list(g.groups), names=['mcls', 'diag'])
+        ccode = pd.Index(cxns).get_indexer(md.cxn)
+        D = sparse.csr_matrix((np.ones(len(md), dtype=np.int32), (ccode, code)), shape=(len(cxns), len(keys)))
+        D.sum_duplicates()
+        D.data[:] = 1
+        out['Diag Ubiquity'] = pd.DataFrame((M @ D).toarray() / denom[:, None], 
+                                            index=cc.index, columns=keys).round(2)
+    return out
 
-    #plt.title("Times New Roman 18", fontname = "Times New Roman", fontsize=18)
-    plt.xlabel('Production Spans', fontname = "Sans Serif", fontsize=12)
-    plt.ylabel('Type-Form', fontname = "Sans Serif", fontsize=12)
-    plt.tight_layout()
 
-    #save options
-    if save_plot == 'Y':
-         plt.savefig(out_ti + fext, dpi = 1200)
-    else:
-        pass
+def Jaccard_Similarity(L1, L2):
+    """
+    Generates the Jaccard similarity for two lists of artifacts from two contexts or DUs.
+
+    Parameters:
+        * L1 = a list of artifacts form a context or DU
+        * L2 = a list of artifacts form a context or DU
 
-## Heat Maps
-def HeatMapUF(df, save_plot, out_ti, fext):
     """
-    Plots a heatmap of the number of unique forms by mcls. Designed to work with a Context object's .ResidualForms and Fcounts methods.
-    and assumes "idn" variable is present in the data frame.
+    intersection_cardinality = len(set.intersection(*[set(L1), set(L2)]))
+    union_cardinality = len(set.union(*[set(L1), set(L2)]))
+    return intersection_cardinality/float(union_cardinality)
+
+
+def Incidence(df, unit='cxn', on='diag', binary=True):
+    """
+    Builds a sparse unit x item incidence matrix, e.g. contexts x diag or DUs x type-forms.
+    Rows with a missing unit or item are skipped.
 
     Parameters:
-        * df: DU class .ResidualForms method
-        * TITLE: DU's name eg "B503" (string)
-        * out_ti: figure title (string)
-        * save_plot: "Y" or "N"  (string)
-        *fext: file extension, eg ".pdf" (string)
+        * df: a project dataframe; for DUs use KAGC_FUN.DU_Explode(df, KAGC_DUS.DU_Dict()) with unit = 'DU'
+        * unit: the column whose values become rows, eg 'cxn', 'name' or 'DU'
+        * on: the column whose values become columns, eg 'diag', 'type1' or 'idn_code' 
+          (idn_code is computed with TypeForms if df does not have it)
+        * binary: True gives presence-absence (0,1); False gives counts
+
+    Returns:
+        a tuple of (scipy.sparse csr matrix, unit labels, item labels)
 
     Requires:
+        * numpy
         * pandas
-        * seaborn
+        * scipy
+    """
+
+    import numpy as np
+    import pandas as pd
+    from scipy import sparse
+
+    items = TypeForms(df)[0] if on == 'idn_code' and on not in df else df[on]
+    ucode, ulab = pd.factorize(df[unit], sort=True)
+    icode, ilab = pd.factorize(items, sort=True)
+    keep = (ucode >= 0) & (icode >= 0)
+
+    m = sparse.csr_matrix((np.ones(keep.sum(), dtype=np.int32), (ucode[keep], icode[keep])),
+                          shape=(len(ulab), len(ilab)))
+    m.sum_duplicates()
+    if binary:
+        m.data[:] = 1
+    return m, pd.Index(ulab, name=unit), pd.Index(ilab, name=on)
+
+
+def Jaccard_Matrix(df, unit='cxn', on='diag', DUS=None, cutoff=0.0, by_mcls=False, sparse=None):
+    """
+    Generates the Jaccard similarity between every pair of units (contexts, trenches or DUs) 
+    from a sparse incidence matrix, rather than calling Jaccard_Similarity pair by pair.
+    The intersections for all pairs come from one sparse product of the incidence matrix with itself.
+
+    Parameters:
+        * df = a project dataframe, eg the entire site or a DU's cdu
+        * unit = 'cxn', 'name', or 'DU' (DU needs DUS)
+        * on = the artifact variable compared, eg 'diag' or 'idn_code' for type-forms
+        * DUS = optional dictionary of DU names and Contributing Context lists, eg KAGC_DUS.DU_Dict()
+        * cutoff = similarities below this value are dropped (left as 0)
+        * by_mcls = True returns one matrix per material class
+        * sparse = True returns pandas sparse columns, which keeps large matrices with a cutoff small; 
+          the default is sparse when a cutoff is set and dense otherwise. A dense matrix holds 
+          8 x units^2 bytes (about 800 MB for 10,000 contexts) whatever the cutoff
+
+    Returns:
+        a labelled unit x unit dataframe, or a dictionary of them by mcls
+
+    Requires:
         * numpy
+        * pandas
+        * scipy
 
+    e.g., KAGC_FUN.Jaccard_Matrix(df, unit='DU', DUS=KAGC_DUS.DU_Dict(), cutoff=0.2)
     """
 
-    import pandas as pd
-    import matplotlib.pyplot as plt
-    import seaborn as sns
     import numpy as np
+    import pandas as pd
+    from scipy import sparse as sp
+
+    if DUS is not None:
+        df = DU_Explode(df, DUS)
+        unit = 'DU'
 
-    x = df.groupby(['mcls', 'date3'])['idn'].nunique().reset_index()
-    x1 = pd.pivot_table(x, values = 'idn', index=['mcls'], columns='date3',  aggfunc = np.sum)
+    if by_mcls:
+        return {m: Jaccard_Matrix(g, unit, on, cutoff=cutoff, sparse=sparse) 
+                for m, g in df.groupby('mcls', observed=True)}
 
-    #bw = sns.palplot(sns.cubehelix_palette(50, hue=0.05, rot=0, light=0.9, dark=0))
+    if sparse is None:
+        sparse = cutoff > 0
 
-    sns.heatmap(x1, annot= True, linewidth = 0.5)
+    B, ulab, _ = Incidence(df, unit, on)
+    size = np.asarray(B.sum(axis=1)).ravel()
+    inter = (B @ B.T).tocoo()
 
-    #plot lables and style
-    sns.set_style("white", rc= {"xtick.bottom": True, "ytick.left": True,})
-    sns.set_context("paper", font_scale = 0.9)
-    plt.xticks(rotation=45, fontname = "Sans Serif", fontsize=10)
-    plt.yticks(rotation=0, fontname = "Sans Serif", fontsize=10)
-    plt.xlabel("Opening Production Dates", fontname = "Sans Serif", fontsize=12)
-    plt.ylabel('Material Class', fontname = "Sans Serif", fontsize=12)
-    plt.tight_layout()
+    sim = inter.data / (size[inter.row] + size[inter.col] - inter.data)
+    keep = sim >= cutoff
+    J = sp.csr_matrix((sim[keep], (inter.row[keep], inter.col[keep])), shape=inter.shape)
 
-    #save options
-    if save_plot == 'Y':
-         plt.savefig(out_ti + fext, dpi = 1200)
+    if sparse:
+        out = pd.DataFrame.sparse.from_spmatrix(J, index=ulab, columns=ulab)
     else:
-        pass
+        out = pd.DataFrame(J.toarray(), index=ulab, columns=ulab)
+    return out
 
 
-def DU_UniqueItemPlot(cdu, save_plot, out_ti, fext):
+def CommonSubtypes(L1, L2):
     """
-    Returns a custom barplot depicting the number of unique items from the CCs for a given DU. Also includes a mean value
-    line. Also returns a PNG of the graph.
+    Returns the common artifact and the number of common sub-types between two lists of artifacts.
 
-    Arguments:
-        * cdu = DU context class .cdu method
-        * save_plot = "Y" or "N" (string)
-        * out_ti = output file name; eg "du503_unique_items" (string)
-        * fext = file extention; eg ".png" (string)
+    Parameters:
+        * L1 = a list of artifacts for a context or DU
+        * L2 = a list of artifacts for a context or DU
+
+    """
+
+    x = set(L1) & set(L2)
+    x1 = len(x)
+    return{'Common subtypes:': x,
+           'Number of common subtypes:': x1}
+
+def CommonSubtypes_Bulk(assemblages, mcls=None, on='diag', k=2, sets=False, df=None, DUS=None):
+    """
+    Compares any number of assemblages at once from one incidence matrix. Returns the number of 
+    common sub-types for every pair, and optionally the common sub-types themselves, plus the 
+    sub-types shared by at least k assemblages.
+
+    Parameters:
+        * assemblages = a dictionary of names and assemblages, or a list of DU names. An assemblage can be
+            - a list of artifacts, as for CommonSubtypes
+            - a Context object; its FCounts() sub-types are used, as in Chapter 7
+            - a DU name; its FCounts()-equivalent sub-types are taken from df (needs df and DUS)
+        * mcls = optional material class filter for Context and DU assemblages, eg 'amp'
+        * on = the artifact variable compared for Context and DU assemblages
+        * k = minimum number of assemblages a sub-type must appear in for the k-way report
+        * sets = True also returns the common sub-types for each pair
+        * df = dataframe for the entire project (DU names only)
+        * DUS = dictionary of DU names and Contributing Context lists (DU names only), eg KAGC_DUS.DU_Dict()
+
+    Returns:
+        a dictionary with
+            - 'Number of common subtypes:' an assemblage x assemblage dataframe (the diagonal is each assemblage's total)
+            - 'Shared by at least k:' a dataframe of sub-types, their number of assemblages, and the assemblages
+            - 'Common subtypes:' a dictionary of pair: set (only when sets = True)
 
     Requires:
-        * seaborn
-        * matplotlib.pyplot
+        * numpy
         * pandas
+        * scipy
 
+    e.g., KAGC_FUN.CommonSubtypes_Bulk({'A603': a603, 'A009': a009}, mcls='amp')
     """
 
-    import seaborn as sns
-    import matplotlib.pyplot as plt
+    import numpy as np
     import pandas as pd
+    from scipy import sparse
+
+    if not isinstance(assemblages, dict):
+        assemblages = {a: a for a in assemblages}
+
+    parts = []
+    # DU names are selected together in one DU_Explode pass
+    dus = {name: a for name, a in assemblages.items() if isinstance(a, str)}
+    if dus:
+        x = DU_Explode(df, {a: DUS[a] for a in set(dus.values())})
+        x = x.dropna(subset=['mcls', 'diag', 'date3', 'date4'])
+        if mcls is not None:
+            x = x[x.mcls == mcls]
+        du_items = pd.DataFrame({'DU': x.DU.to_numpy(), 'item': Decat(x[on]).to_numpy()})
+        du_items = du_items.dropna().drop_duplicates()
+        units = pd.DataFrame({'unit': list(dus), 'DU': list(dus.values())})
+        parts.append(units.merge(du_items, on='DU')[['unit', 'item']])
+
+    for name, a in assemblages.items():
+        if isinstance(a, str):
+            continue
+        elif hasattr(a, 'FCounts'):
+            x = a.FCounts()
+        else:
+            parts.append(pd.DataFrame({'unit': name, 'item': pd.unique(np.asarray(a, dtype=object))}))
+            continue
+        if mcls is not None:
+            x = x[x.mcls == mcls]
+        parts.append(pd.DataFrame({'unit': name, 'item': Decat(x[on]).dropna().unique()}))
+
+    long = pd.concat(parts, ignore_index=True)
+    ulab = list(assemblages)
+    ucode = pd.Categorical(long.unit, categories=ulab).codes
+    icode, ilab = pd.factorize(long.item, sort=True)
+    B = sparse.csr_matrix((np.ones(len(long), dtype=np.int32), (ucode, icode)), 
+                          shape=(len(ulab), len(ilab)))
+
+    counts = pd.DataFrame((B @ B.T).toarray(), index=ulab, columns=ulab)
+
+    n = np.asarray(B.sum(axis=0)).ravel()
+    Bc = B.tocsc()
+    shared = pd.DataFrame({'subtype': ilab, 'assemblages': n, 
+                           'in': [[ulab[u] for u in Bc.indices[Bc.indptr[i]:Bc.indptr[i + 1]]] 
+                                  for i in range(len(ilab))]})
+    shared = shared[shared.assemblages >= k].sort_values(['assemblages', 'subtype'], 
+                                                        ascending=[False, True]).reset_index(drop=True)
+
+    out = {'Number of common subtypes:': counts,
+           'Shared by at least k:': shared}
+    if sets:
+        out['Common subtypes:'] = {(ulab[i], ulab[j]): set(ilab[B[i].multiply(B[j]).indices]) 
+                                   for i in range(len(ulab)) for j in range(i + 1, len(ulab))}
+    return out
+
+_GOWER = {}
+
+def _gower_prep(df, weights=None):
+    """
+    Splits a profile dataframe into numeric (range-scaled) and categorical (integer coded) arrays for Gower_Matrix.
+    Bool, object and category columns are treated as categorical; missing values are NaN / -1.
+    Infinite numeric values (eg NRF:RF when RForms is 0) are treated as missing, so they neither 
+    set the column's range nor flatten its finite values to 0.
+    """
 
-    x = cdu.groupby('name').diag.nunique().reset_index()
-    z = sum(x.diag)/len(x)
-    z1 = x.diag.mean()
-
-    # Plot variables and custom seaborn stype
-    sns.set_style("white", rc= {"xtick.bottom": True})
-    sns.set_context("paper", font_scale = 0.9)
-
-    x1 = sns_plot = sns.barplot(x = "name", data= x, y = x.diag, color = "gray")
-    x1.axhline(x.diag.mean(), ls='--', color = 'black')
-    #x1.text(0.5, x.diag.mean(), round(x.diag.mean(),1))
-    x1.set_ylabel("Number of Unique Items")
-    x1.set_xlabel("")
-    #x1.set_title(du)
-    x1.set_xticklabels(x1.get_xticklabels(),rotation=90)
-
-    # Save
-    if save_plot == 'Y':
-         plt.savefig(out_ti + fext, dpi = 1200)
-    else:
-        pass
+    import numpy as np
+    import pandas as pd
 
-    return x, z1
-    
+    num, cat, wn, wc = [], [], [], []
+    for col in df.columns:
+        s = df[col]
+        w = 1.0 if weights is None else float(weights.get(col, 0.0))
+        if w == 0:
+            continue
+        if pd.api.types.is_numeric_dtype(s) and not pd.api.types.is_bool_dtype(s):
+            v = s.to_numpy(dtype=float, na_value=np.nan)
+            v = np.where(np.isfinite(v), v, np.nan)
+            rng = np.nanmax(v) - np.nanmin(v) if np.isfinite(v).any() else 0.0
+            num.append(v / rng if rng > 0 else np.where(np.isnan(v), np.nan, 0.0))
+            wn.append(w)
+        else:
+            cat.append(pd.factorize(s)[0])
+            wc.append(w)
+
+    n = len(df)
+    return {'num': np.column_stack(num) if num else np.empty((n, 0)),
+            'cat': np.column_stack(cat).astype(np.int32) if cat else np.empty((n, 0), dtype=np.int32),
+            'wn': np.asarray(wn, dtype=float),
+            'wc': np.asarray(wc, dtype=float)}
+
+
+def _gower_init(arrays):
+    _GOWER.clear()
+    _GOWER.update(arrays)
+
+
+def _gower_block(start, stop, lo=0):
+    """
+    Gower distances between rows start:stop and rows lo: of the arrays held in _GOWER.
+    """
+
+    import numpy as np
+
+    num, cat, wn, wc = _GOWER['num'], _GOWER['cat'], _GOWER['wn'], _GOWER['wc']
+    n = num.shape[0] - lo
+    dist = np.zeros((stop - start, n))
+    wsum = np.zeros((stop - start, n))
+
+    for k in range(num.shape[1]):
+        d = np.abs(num[start:stop, k, None] - num[None, lo:, k])
+        ok = ~np.isnan(d)
+        dist += wn[k] * np.where(ok, d, 0.0)
+        wsum += wn[k] * ok
+    for k in range(cat.shape[1]):
+        a, b = cat[start:stop, k, None], cat[None, lo:, k]
+        ok = (a >= 0) & (b >= 0)
+        dist += wc[k] * (ok & (a != b))
+        wsum += wc[k] * ok
 
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return dist / wsum
 
 
-def HeatMapFC(df, save_plot, out_ti, fext):
+def _gower_rows(start, stop, top_k=None):
     """
-    Plots a heatmap of the number fragments-items by mcls. Designed to work with a Context object's FCounts method.
-    It assumes "freq" variable is present in the data frame.
+    One row block for Gower_Matrix: the condensed upper triangle, or the top_k nearest neighbours.
+    """
+
+    import numpy as np
+
+    if top_k is None:
+        d = _gower_block(start, stop, lo=start)
+        return np.concatenate([d[i, i + 1:] for i in range(stop - start)])
+
+    d = _gower_block(start, stop)
+    d[np.arange(stop - start), np.arange(start, stop)] = np.inf
+    d = np.where(np.isnan(d), np.inf, d)
+    k = min(top_k, d.shape[1] - 1)
+    nn = np.argpartition(d, k - 1, axis=1)[:, :k] if k > 0 else np.empty((stop - start, 0), dtype=int)
+    nd = np.take_along_axis(d, nn, axis=1)
+    o = np.argsort(nd, axis=1, kind='stable')
+    return np.take_along_axis(nn, o, axis=1), np.take_along_axis(nd, o, axis=1)
+
+
+def Gower_Matrix(df, weights=None, max_memory=2**26, n_jobs=1, top_k=None):
+    """
+    Gower distance between every pair of rows of a mixed-type profile dataframe, eg DUSmry rows
+    joined to marker-group proportions, or context-level attributes across the site.
+    Numeric columns contribute |xi - xj| / range, and bool, text and category columns a 0/1 mismatch.
+    A missing value removes that column from the pair's weighted mean, as in the gower package; 
+    infinite values (eg NRF:RF with no residual forms) count as missing.
+
+    The matrix is computed in row blocks sized so that each block's working arrays stay within
+    max_memory bytes, so the full n x n float matrix is never held in memory.
 
     Parameters:
-        * df: DU context class .ResidualForms dataframe
-        * TITLE: DU's name eg "B503" (string)
-        * out_ti: figure title (string)
-        * save_plot: "Y" or "N"  (string)
-        *fext: file extension, eg ".pdf" (string)
+        * df = dataframe of profiles, one row per unit (index = unit labels)
+        * weights = optional dictionary of column: weight; columns left out get 0
+        * max_memory = approximate bytes per row block
+        * n_jobs = number of worker processes for the row blocks
+        * top_k = None returns the condensed matrix; an integer returns each row's k nearest neighbours
+
+    Returns:
+        * top_k = None: a condensed distance vector (as scipy.spatial.distance.pdist, for linkage or squareform)
+        * top_k = k: a dataframe with the unit, its neighbour, rank and distance
 
     Requires:
-        * pandas
-        * seaborn
         * numpy
+        * pandas
+
+    e.g., KAGC_FUN.Gower_Matrix(profiles, top_k=5, n_jobs=4)
     """
 
-    import pandas as pd
-    import matplotlib.pyplot as plt
-    import seaborn as sns
     import numpy as np
+    import pandas as pd
 
-    x1 = pd.pivot_table(df, values = 'freq', index=['mcls'], columns='date3',  aggfunc = np.sum)
+    arrays = _gower_prep(df, weights)
+    n = len(df)
+    per_row = 8 * 4 * max(n, 1)
+    step = int(max(1, min(n, max_memory // per_row)))
+    blocks = [(a, min(a + step, n)) for a in range(0, n, step)]
 
-    #bw = sns.palplot(sns.cubehelix_palette(50, hue=0.05, rot=0, light=0.9, dark=0))
+    if n_jobs > 1 and len(blocks) > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=n_jobs, initializer=_gower_init, initargs=(arrays,)) as ex:
+            parts = list(ex.map(_gower_rows, *zip(*blocks), [top_k] * len(blocks)))
+    else:
+        saved = dict(_GOWER)
+        _gower_init(arrays)
+        try:
+            parts = [_gower_rows(a, b, top_k) for a, b in blocks]
+        finally:
+            _gower_init(saved)
+
+    if top_k is None:
+        return np.concatenate(parts) if parts else np.empty(0)
+
+    nn = np.vstack([p[0] for p in parts])
+    nd = np.vstack([p[1] for p in parts])
+    k = nn.shape[1]
+    lab = df.index.to_numpy()
+    out = pd.DataFrame({'unit': np.repeat(lab, k),
+                        'neighbour': lab[nn.ravel()],
+                        'rank': np.tile(np.arange(1, k + 1), n),
+                        'distance': nd.ravel()})
+    return out[np.isfinite(out.distance)].reset_index(drop=True)
 
-    sns.heatmap(x1, annot= True, linewidth = 0.5)
+def MMDate(x):
+   """
+   Returns the unweighted median date from a context class.
+   
+   """
 
-    #plot lables and style
-    sns.set_style("white", rc= {"xtick.bottom": True, "ytick.left": True,})
-    sns.set_context("paper", font_scale = 0.9)
-    plt.xticks(rotation=45, fontname = "Sans Serif", fontsize=10)
-    plt.yticks(rotation=0, fontname = "Carlito", fontsize=10)
-    plt.xlabel("Opening Production Dates", fontname = "Sans Serif", fontsize=12)
-    plt.ylabel('Material Class', fontname = "Sans Serif", fontsize=12)
-    plt.tight_layout()
+   import pandas as pd
+   import numpy as np
+    
+   z=  x.MCLS_Grps().MPDate.mean().reset_index().sort_values(by= 'mcls')
+   return z
 
-    #save options
-    if save_plot == 'Y':
-         plt.savefig(out_ti + fext, dpi = 1200)
-    else:
-        pass
+# Conversion functions
+## convert counts to present absence for wide data
+def to_binary():
+    """
+    Converts count data in tabular form to presence - absence (0,1) via .applymap().
+
+    eg: x1.iloc[:, 3:7].applymap(to_binary)
+
+    """
+
+    return lambda x: 0 if x<1 else 1 
+
+# Plot Functions
+## The plotting functions live in KAGC_Plots, which is only imported when one of them is used
+_PLOTS = ['SC_DSpanPlt', 'CC_DSpanPlt', 'FC_DatePlt_Filtered', 'FC_DatePlt', 'DU_MCLS_TPQ_Plt', 'dateplot', 'HeatMapUF', 'DU_UniqueItemPlot', 'HeatMapFC']
+
+
+def __getattr__(name):
+    if name in _PLOTS:
+        import KAGC_Plots
+        return getattr(KAGC_Plots, name)
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
+
+
+def __dir__():
+    return sorted(list(globals()) + _PLOTS)
@@ -0,0 +1,680 @@
+# KAGC Plotting Functions
+
+"""
+This moduel contains the plotting functions for the analysis of the cemetery's stratigraphy: 
+the date span plots and the heat maps. They were split from KAGC_Functions so that the analysis 
+functions can be imported and run without matplotlib or seaborn; they are still available as 
+KAGC_Functions attributes (e.g. KAGC_FUN.FC_DatePlt), which import this moduel on first use.
+
+# File Metadata
+* Associated Publication: Given, Michael, Chris Mavromatis, and R. Smadar Gabrieli, ed. (2024) City and Cemetery: Excavations at Kourion’s Amathous Gate Cemetery, Cyprus. The Excavations of Danielle A. Parks (Annual of the American Society of Overseas Research, Volumes 76 & 77, ASOR).
+
+    * Main Publication Chapter(s) that use or mention these functions: 
+
+    Mavromatis, Christopher _et al_ (2024). Chapter 7 Deposition and Dumping in Area A. Pp: 97-126. In  Given, Michael, Chris Mavromatis, and R. Smadar Gabrieli, ed. (2024) City and Cemetery: Excavations at Kourion’s Amathous Gate Cemetery, Cyprus. The Excavations of Danielle A. Parks (Annual of the American Society of Overseas Research, Volume 76 ASOR).
+
+    Mavromatis, Christopher _et al_. (2024) Chapter 9 The cist Tombs. Pp: 147-200. In  Given, Michael, Chris Mavromatis, and R. Smadar Gabrieli, ed. City and Cemetery: Excavations at Kourion’s Amathous Gate Cemetery, Cyprus. The Excavations of Danielle A. Parks (Annual of the American Society of Overseas Research, Volumes 76 ASOR).
+
+* File Name: KAGC_Plots.py
+
+* File Format: text
+
+* Software: 
+    * Python (3.10.10), Ipython (8.12.0), 
+        * Python Distibution: Anaconda 3
+    * Visual Studio Code (1.79.2) 
+
+* Hardware: 
+    * MacBook Air 10, M1
+        * 8 GIG RAM
+        * CPU: Apple M1
+        * GPU: Apple M1
+    * Lennovo IdeaPad 3
+        * 12 GIG RAM
+        * CPU: 11th Gen Intel i5
+        * GPU: Intel TigerLake-LP G2
+
+* Operating System Used to Create File: 
+    * Ubuntu Linux 22.04.02 LTS (Kernal 6.8.0-31)
+        * 64 bit, X86
+    * MacOS 14.5 (Kernel Darwin 23.5.0)
+        * 64 bit,  Arm64
+
+* Processing History: 
+    * Analysis of cleaned artifact datasets by Depositional Unit (DU). 
+
+* Required Python Packages:
+    * matplotlib: 3.7.1 
+    * pandas    : 1.5.3
+    * seaborn   : 0.12.2
+    * numpy     : 1.23.5
+
+* Other Project Moduels:
+    * KAGC_Functions
+"""
+
+
+# Plot Functions
+
+## Date Span Plots
+## Single context, DU CC TPQ, DU FCount, DU MCLS TPQ, Generic
+
+# Single context
+def SC_DSpanPlt(df, save_plot, out_ti, fext, start, stop):
+    """
+    Plots the date spans of unique items from a single context or material class;
+    also context or DU TPQs items. 
+    Dates must be numbers and B.C. dates must be expressed as a negative number e.g.  100 B.C. -> -100 
+
+    Parameters:
+        * df = dataframe of DU material class
+        * TITLE = text plot title
+        * out_ti = figure title
+        * save _plot = save the plot 'Y' or 'N'
+        * fext = output file extension (eg '.png')
+        * start = earliest opening date depicted on  x axis
+        * stop = latest closing date  on x axis
+
+    Requires:
+        seaborn, matplotlib.pyplot and numpy
+
+    """
+
+    import  matplotlib.pyplot as plt
+    import seaborn as sns
+    import numpy as np
+    import KAGC_Functions as KAGC_FUN
+
+    df = df.copy(deep=False)
+    df['idn_code'] = KAGC_FUN.TypeForms(df)[0]
+
+    df['lbl'] = KAGC_FUN.Decat(df.mcls) + '-' + KAGC_FUN.Decat(df.Cat).fillna(KAGC_FUN.Decat(df.mcls))
+
+    x1 = df.dropna(subset = ['diag', 'date3', 'date4'])
+
+    x1 = x1.drop_duplicates(['idn_code'])
+
+    x1['PDMedian'] = KAGC_FUN.ProdDates(x1)['MPDate']
+
+    x2 = x1.sort_values(by=['date3', 'date4'])
+
+    my_range = range(1, len(x1.index)+1)
+
+    x_ticks = []
+    for i in range(start, stop, 100):
+        x_ticks.append(i)
+
+    # Plot variables
+    sns.set_style("white", rc= {"xtick.bottom": True, "ytick.left": True,})
+    sns.set_context("paper", font_scale = 0.9)
+    plt.hlines(y=my_range, xmin=x2['date3'], xmax=x2['date4'], color='black', alpha= 1)
+    plt.scatter(x2['date3'], my_range, color='black', alpha= 1, label='date3', s = 10)
+
+    # PLot lables
+    plt.yticks(my_range, x2.lbl, fontname = "Sans Serif", fontsize=10)
+    plt.xticks(x_ticks, fontname = "Sans Serif", fontsize=10)
+    plt.tick_params(axis = 'x', rotation = 0)    
+    plt.tick_params(axis = 'y', rotation = 0, labelsize = 10)
+
+    if len(str(stop)) > 4 or len(str(start)) >4:
+        plt.xticks(rotation=45)
+    else: pass 
+
+    #plt.title("Times New Roman 18", fontname = "Times New Roman", fontsize=18)
+    plt.xlabel('Production Spans', fontname = "Sans Serif", fontsize=12)
+    plt.ylabel('Type-Form', fontname = "Carlito", fontsize=12)
+    plt.tight_layout()
+
+
+
+    # save options
+    if save_plot == 'Y':
+         plt.savefig(out_ti + fext, dpi = 1200)
+    else:
+        pass
+
+
+# Contributing Context 
+def CC_DSpanPlt(df, save_plot, out_ti,  fext, start, stop):
+
+    """
+    Plots the date spans of unique material classes or Contributing Context. 
+    Dates must be numbers and B.C. dates must be expressed as a negative number e.g.  100 B.C. -> -100. 
+
+    Parameters:
+        * df = DU class object
+        * TITLE = text plot title
+        * out_ti = figure title
+        * save _plot = save the plot 'Y' or 'N'
+        * fext = output file extension (eg '.png')
+        * start = earliest opening date depicted on  x axis
+        * stop = latest closing date  on x axis
+
+    Requires: seaborn, matplotlib.pyplot and numpy
+
+    """
+
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    import numpy as np
+    import KAGC_Functions as KAGC_FUN
+
+
+    x1 = df.CC_TPQS()
+    x2 = x1.sort_values(by=['date3', 'date4'])
+
+    x1['lbl'] = KAGC_FUN.Decat(x1.name) +'-'+ KAGC_FUN.Decat(x1.Cat).fillna(KAGC_FUN.Decat(x1.mcls))
+
+    x1['lbl'] = x1.lbl.replace('(TR)','Tr', regex=True, inplace=False)
+
+    my_range = range(1, len(x1.index)+1)
+
+    x_ticks = []
+    for i in range(start, stop, 100):
+        x_ticks.append(i)
+
+
+    # Plot style
+    sns.set_style("white", rc= {"xtick.bottom": True, "ytick.left": True,})
+    sns.set_context("paper", font_scale = 0.9)
+    plt.hlines(y=my_range, xmin=x2['date3'], xmax=x2['date4'], color='black', alpha= 1)
+    plt.scatter(x2['date3'], my_range, color='black', alpha= 1, label='date3', s = 10)
+
+
+    # PLot lables
+    plt.yticks(my_range, x1.lbl, fontname = "Sans Serif", fontsize=10)
+    plt.xticks(x_ticks, fontname = "Sans Serif", fontsize=10)
+    plt.tick_params(axis = 'x', rotation = 0)
+    plt.tick_params(axis = 'y', rotation = 0, labelsize = 10)
+
+    if len(str(stop)) > 4 or len(str(start)) >4:
+        plt.xticks(rotation=45)
+    else: pass 
+
+    #plt.title("Times New Roman 18", fontname = "Times New Roman", fontsize=18)
+    plt.xlabel('Production Spans', fontname = "Sans Serif", fontsize=12)
+    plt.ylabel('Type-Form', fontname = "Sans Serif", fontsize=12)
+    plt.tight_layout()
+
+
+
+    #save options
+    if save_plot == 'Y':
+         plt.savefig(out_ti + fext, dpi = 1200)
+    else:
+        pass
+
+
+# FCounts Filtered
+def FC_DatePlt_Filtered(df, save_plot, out_ti,  fext, start, stop):
+
+    """
+    Plots the date spans of the FCounts method from the DU class.
+    Dates must be numbers and B.C. dates must be expressed as a negative number e.g.  100 B.C. -> -100. 
+
+    Parameters:
+        * df =  DU class object
+        * Vlines = add mean and TPQ lines 'Y' or 'N'
+        * out_ti = figure title
+        * save _plot = save the plot 'Y' or 'N'
+        * fext = output file extension (eg '.png')
+        * start = earliest opening date depicted on  x axis
+        * stop = latest closing date  on x axis
+
+    Requires: seaborn, matplotlib.pyplot and numpy
+
+    """
+
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    import numpy as np
+    import KAGC_Functions as KAGC_FUN
+
+
+    x = df.sort_values(by=['date3', 'date4'])
+
+    my_range = range(1, len(x.index)+1)
+
+    x_ticks = []
+    for i in range(start, stop, 100):
+        x_ticks.append(i)
+
+    # Plot style
+    sns.set_style("white", rc= {"xtick.bottom": True, "ytick.left": True,})
+    sns.set_context("paper", font_scale = 0.9)
+
+    if len(x) > 20:
+        plt.figure(figsize=(10,6))
+    else:
+        pass
+
+
+    plt.hlines(y=my_range, xmin=x['date3'], xmax=x['date4'], color='black', alpha= 1)
+    plt.scatter(x['date3'], my_range, color='black', alpha= 1, label='date3', s = 11)
+
+    # Plot lables
+    if len(x) > 20:
+        plt.yticks(my_range, x.Seq, fontname = "Sans Serif", fontsize=12)
+    else:
+        plt.yticks(my_range, KAGC_FUN.Decat(x.mcls) +"-"+ x.Seq.astype(str), fontname = "Sans Serif", fontsize=12)
+        plt.tick_params(axis = 'y', rotation = 0, labelsize = 11)
+        
+
+    plt.xticks(x_ticks, fontname = "Sans Serif", fontsize=10)
+    plt.tick_params(axis = 'x', rotation = 0)
+    plt.tick_params(axis = 'y', rotation = 0, labelsize = 8)
+
+    if len(str(stop)) > 4 or len(str(start)) >4:
+        plt.xticks(rotation=45)
+    else: pass 
+   
+    #plt.title("Times New Roman 18", fontname = "Times New Roman", fontsize=18)
+    plt.xlabel('Production Spans', fontname = "Sans Serif", fontsize=12)
+    plt.ylabel('Type-Form', fontname = "Sans Serif", fontsize=12)
+    plt.tight_layout()
+
+    # Additinal 
+
+    #if Vlines == 'Y':
+        # Mean Median
+        #plt.vlines(x = df.cdu.MPDate.mean(), ymin= 0, ymax = len(x.diag), color='blue', alpha= 1, linestyles=['--'])
+        #plt.text(df.cdu.MPDate.mean() + 1, len(x.diag)+1, "MD", rotation= 0, color = 'blue')
+
+        # TPQ
+        #plt.vlines(x = x.date3.max(), ymin= 0, ymax = len(x.diag), color='red', alpha= 1, linestyles=['--'])
+        #plt.text(x.date3.max() + 1, len(x.diag)+1, "TPQ", rotation= 0, color ='red')
+    #else:
+        #pass
+
+    if len(str(stop)) > 4 or len(str(start)) >4:
+        plt.xticks(rotation=45)
+    else: pass 
+    
+    # Save
+    if save_plot == 'Y':
+         plt.savefig(out_ti + fext, dpi = 1200)
+    else:
+        pass
+
+
+
+# FCounts 
+def FC_DatePlt(df, Vlines, save_plot, out_ti,  fext, start, stop):
+    """
+    Plots the date spans of the FCounts method from the DU class.
+    Dates must be numbers and B.C. dates must be expressed as a negative number e.g.  100 B.C. -> -100. 
+    
+    Parameters:
+        * df = = DU class object
+        * Vlines = add mean and TPQ lines 'Y' or 'N'
+        * out_ti = figure title
+        * save _plot = save the plot 'Y' or 'N'
+        * fext = output file extension (eg '.png')
+        * start = earliest opening date depicted on  x axis
+        * stop = latest closing date  on x axis
+
+    Requires: seaborn, matplotlib.pyplot and numpy
+
+    """
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    import numpy as np
+    import KAGC_Functions as KAGC_FUN
+
+
+    x = df.FCounts().sort_values(by=['date3', 'date4'])
+
+    my_range = range(1, len(x.index)+1)
+
+    x_ticks = []
+    for i in range(start, stop, 100):
+        x_ticks.append(i)
+
+    # Plot style
+    sns.set_style("white", rc= {"xtick.bottom": True, "ytick.left": True,})
+    sns.set_context("paper", font_scale = 0.9)
+
+    if len(x) > 20:
+        plt.figure(figsize=(10,6))
+    else:
+        pass
+    
+    #if Vlines == "Y":
+        #plt.figure(figsize=(10,6))
+
+    plt.hlines(y=my_range, xmin=x['date3'], xmax=x['date4'], color='black', alpha= 1)
+    plt.scatter(x['date3'], my_range, color='black', alpha= 1, label='date3', s = 11)
+
+    # Plot lables
+    if len(x) > 20:
+        plt.yticks(my_range, x.Seq, fontname = "Sans Serif", fontsize=12)
+    else:
+        plt.yticks(my_range, KAGC_FUN.Decat(x.mcls) +"-"+ x.Seq.astype(str), fontname = "Sans Serif", fontsize=12)
+        plt.tick_params(axis = 'y', rotation = 0, labelsize = 11)
+        
+
+
+
+    plt.xticks(x_ticks, fontname = "Sans Serif", fontsize=10)
+    plt.tick_params(axis = 'x', rotation = 0)
+    plt.tick_params(axis = 'y', rotation = 0, labelsize = 8)
+
+    if len(str(stop)) > 4 or len(str(start)) >4:
+        plt.xticks(rotation=45)
+    else: pass 
+
+
+    #plt.title("Times New Roman 18", fontname = "Times New Roman", fontsize=18)
+    plt.xlabel('Production Spans', fontname = "Sans Serif", fontsize=12)
+    plt.ylabel('Type-Form', fontname = "Sans Serif", fontsize=12)
+    
+
+    # Additinal 
+
+    if Vlines == 'Y':
+        # Mean Median
+        MMD = plt.vlines(x = df.cdu.MPDate.mean(), ymin= 0, ymax = len(x.diag), color='blue', alpha= 1, linestyles=['--'], label="Mean Median Date")
+        #plt.text(df.cdu.MPDate.mean() + 1, len(x.diag)+1, "MD", rotation= 0, color = 'blue')
+
+        # TPQ
+        TPQ = plt.vlines(x = x.date3.max(), ymin= 0, ymax = len(x.diag), color='red', alpha= 1, linestyles=['--'], label="Terminus Post Quem")
+        #plt.text(x.date3.max() + 1, len(x.diag)+1, "TPQ", rotation= 0, color ='red')
+
+        plt.legend(loc ="lower center", bbox_to_anchor= (0.5, -0.3), ncol = 2, handles = [MMD, TPQ], fontsize = 10)
+
+        
+    else:
+        pass
+
+    
+    # Save
+    if save_plot == 'Y':
+         plt.tight_layout()
+         plt.savefig(out_ti + fext, dpi = 1200)
+    else:
+        pass
+
+
+# DU Material Class TPQ
+def DU_MCLS_TPQ_Plt(df, save_plot, out_ti,  fext, start, stop):
+    """
+    Plots the date spans of unique material classes or Contributing Context using the DU class's .MCS_TPQS method.
+    Dates must be numbers and B.C. dates must be expressed as a negative number e.g.  100 B.C. -> -100. 
+
+    Parameters:
+        * df = DU class object
+        * TITLE = text plot title
+        * out_ti = figure title
+        * save_plot = save the plot 'Y' or 'N'
+        * fext = output file extension (eg '.png')
+        * start = earliest opening date depicted on  x axis
+        * stop = latest closing date  on x axis
+
+    Requires: seaborn, matplotlib.pyplot and numpy
+    
+    """
+
+    import  matplotlib.pyplot as plt
+    import seaborn as sns
+    import numpy as np
+    import KAGC_Functions as KAGC_FUN
+
+
+    x1 = df.MCLS_TPQS()
+    x2 = x1.sort_values(by=['date3', 'date4'])
+
+    x2['lbl'] = KAGC_FUN.Decat(x2.name) +'-'+ KAGC_FUN.Decat(x2.Cat).fillna(KAGC_FUN.Decat(x2.mcls))
+    x2['lbl'] = x2.lbl.replace('(TR)','Tr', regex=True, inplace=False)
+
+    my_range = range(1, len(x1.index)+1)
+
+    x_ticks = []
+    for i in range(start, stop, 100):
+        x_ticks.append(i)
+
+    # Plot style
+    sns.set_style("white", rc= {"xtick.bottom": True, "ytick.left": True,})
+    sns.set_context("paper", font_scale = 0.9)
+    plt.hlines(y=my_range, xmin=x2['date3'], xmax=x2['date4'], color='black', alpha= 1)
+    plt.scatter(x2['date3'], my_range, color='black', alpha= 1, label='date3', s = 10)
+
+    if len(str(stop)) > 3 or len(str(start)) >3:
+        plt.xticks(rotation=45)
+    else: pass 
+
+    # PLot lables
+    plt.yticks(my_range, x2.lbl, fontname = "Sans Serif", fontsize=10)
+    plt.xticks(x_ticks, fontname = "Sans Serif", fontsize=10)
+    plt.tick_params(axis = 'x', rotation = 0)
+    plt.tick_params(axis = 'y', rotation = 0, labelsize = 10)
+
+    if len(str(stop)) > 3 or len(str(start)) >3:
+        plt.xticks(rotation=45)
+    else: pass
+
+    #plt.title("Times New Roman 18", fontname = "Times New Roman", fontsize=18)
+    plt.xlabel('Production Spans', fontname = "Sans Serif", fontsize=12)
+    plt.ylabel('Type-Form', fontname = "Sans Serif", fontsize=12)
+    plt.tight_layout()
+
+
+    #save options
+    if save_plot == 'Y':
+         plt.savefig(out_ti + fext, dpi = 1200)
+    else:
+        pass
+
+
+# Generic 
+def dateplot(df, save_plot, out_ti,  fext, start, stop):
+    """
+    Generic base for KAGC plots.
+    Dates must be numbers and B.C. dates must be expressed as a negative number e.g.  100 B.C. -> -100. 
+
+
+    Parameters:
+        * df = dataframe of DU material class
+        * TITLE = text plot title
+        * out_ti = figure title
+        * save_plot = save the plot 'Y' or 'N'
+        * fext = output file extension (eg '.png')
+        * start = earliest opening date depicted on  x axis
+        * stop = latest closing date  on x axis
+
+    Requires: seaborn, matplotlib.pyplot and numpy
+
+    """
+
+    import  matplotlib.pyplot as plt
+    import seaborn as sns
+    import numpy as np
+    import KAGC_Functions as KAGC_FUN
+
+    df = df.copy(deep=False)
+    df['idn_code'] = KAGC_FUN.TypeForms(df)[0]
+
+    df['lbl'] = KAGC_FUN.Decat(df.name) +'-'+ KAGC_FUN.Decat(df.Cat).fillna(KAGC_FUN.Decat(df.mcls))
+
+    
+    x1 = df.dropna(subset = ['diag', 'date3', 'date4'])
+
+    x1 = x1.drop_duplicates(['name', 'idn_code'])
+
+    x1['PDMedian'] = KAGC_FUN.ProdDates(x1)['MPDate']
+
+    x2 = x1.sort_values(by=['date3', 'date4'])
+
+    my_range = range(1, len(x1.index)+1)
+
+    x_ticks = []
+    for i in range(start, stop, 100):
+        x_ticks.append(i)
+    # Plot style
+    sns.set_style("white", rc= {"xtick.bottom": True, "ytick.left": True,})
+    sns.set_context("paper", font_scale = 0.9)
+    plt.hlines(y=my_range, xmin=x2['date3'], xmax=x2['date4'], color='black', alpha= 1)
+    plt.scatter(x2['date3'], my_range, color='black', alpha= 1, label='date3', s = 11)
+
+
+    # PLot lables
+    plt.yticks(my_range, x2.lbl, fontname = "Sans Serif", fontsize=10)
+    plt.xticks(x_ticks, fontname = "Sans Serif", fontsize=10)
+    plt.tick_params(axis = 'x', rotation = 0)
+    plt.tick_params(axis = 'y', rotation = 0, labelsize = 10)
+
+    if len(str(stop)) > 4 or len(str(start)) >4:
+        plt.xticks(rotation=45)
+    else: pass 
+
+    #plt.title("Times New Roman 18", fontname = "Times New Roman", fontsize=18)
+    plt.xlabel('Production Spans', fontname = "Sans Serif", fontsize=12)
+    plt.ylabel('Type-Form', fontname = "Sans Serif", fontsize=12)
+    plt.tight_layout()
+
+    #save options
+    if save_plot == 'Y':
+         plt.savefig(out_ti + fext, dpi = 1200)
+    else:
+        pass
+
+## Heat Maps
+def HeatMapUF(df, save_plot, out_ti, fext):
+    """
+    Plots a heatmap of the number of unique forms by mcls. Designed to work with a Context object's .ResidualForms and Fcounts methods.
+    and assumes "idn" or "idn_code" variable is present in the data frame.
+
+    Parameters:
+        * df: DU class .ResidualForms method
+        * TITLE: DU's name eg "B503" (string)
+        * out_ti: figure title (string)
+        * save_plot: "Y" or "N"  (string)
+        *fext: file extension, eg ".pdf" (string)
+
+    Requires:
+        * pandas
+        * seaborn
+        * numpy
+
+    """
+
+    import pandas as pd
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    import numpy as np
+
+    key = 'idn_code' if 'idn_code' in df else 'idn'
+    x = df.groupby(['mcls', 'date3'], observed=True)[key].nunique().reset_index(name='idn')
+    x1 = pd.pivot_table(x, values = 'idn', index=['mcls'], columns='date3',  aggfunc = np.sum)
+
+    #bw = sns.palplot(sns.cubehelix_palette(50, hue=0.05, rot=0, light=0.9, dark=0))
+
+    sns.heatmap(x1, annot= True, linewidth = 0.5)
+
+    #plot lables and style
+    sns.set_style("white", rc= {"xtick.bottom": True, "ytick.left": True,})
+    sns.set_context("paper", font_scale = 0.9)
+    plt.xticks(rotation=45, fontname = "Sans Serif", fontsize=10)
+    plt.yticks(rotation=0, fontname = "Sans Serif", fontsize=10)
+    plt.xlabel("Opening Production Dates", fontname = "Sans Serif", fontsize=12)
+    plt.ylabel('Material Class', fontname = "Sans Serif", fontsize=12)
+    plt.tight_layout()
+
+    #save options
+    if save_plot == 'Y':
+         plt.savefig(out_ti + fext, dpi = 1200)
+    else:
+        pass
+
+
+def DU_UniqueItemPlot(cdu, save_plot, out_ti, fext):
+    """
+    Returns a custom barplot depicting the number of unique items from the CCs for a given DU. Also includes a mean value
+    line. Also returns a PNG of the graph.
+
+    Arguments:
+        * cdu = DU context class .cdu method
+        * save_plot = "Y" or "N" (string)
+        * out_ti = output file name; eg "du503_unique_items" (string)
+        * fext = file extention; eg ".png" (string)
+
+    Requires:
+        * seaborn
+        * matplotlib.pyplot
+        * pandas
+
+    """
+
+    import seaborn as sns
+    import matplotlib.pyplot as plt
+    import pandas as pd
+
+    x = cdu.groupby('name', observed=True).diag.nunique().reset_index()
+    z = sum(x.diag)/len(x)
+    z1 = x.diag.mean()
+
+    # Plot variables and custom seaborn stype
+    sns.set_style("white", rc= {"xtick.bottom": True})
+    sns.set_context("paper", font_scale = 0.9)
+
+    x1 = sns_plot = sns.barplot(x = "name", data= x, y = x.diag, color = "gray")
+    x1.axhline(x.diag.mean(), ls='--', color = 'black')
+    #x1.text(0.5, x.diag.mean(), round(x.diag.mean(),1))
+    x1.set_ylabel("Number of Unique Items")
+    x1.set_xlabel("")
+    #x1.set_title(du)
+    x1.set_xticklabels(x1.get_xticklabels(),rotation=90)
+
+    # Save
+    if save_plot == 'Y':
+         plt.savefig(out_ti + fext, dpi = 1200)
+    else:
+        pass
+
+    return x, z1
+    
+
+
+
+def HeatMapFC(df, save_plot, out_ti, fext):
+    """
+    Plots a heatmap of the number fragments-items by mcls. Designed to work with a Context object's FCounts method.
+    It assumes "freq" variable is present in the data frame.
+
+    Parameters:
+        * df: DU context class .ResidualForms dataframe
+        * TITLE: DU's name eg "B503" (string)
+        * out_ti: figure title (string)
+        * save_plot: "Y" or "N"  (string)
+        *fext: file extension, eg ".pdf" (string)
+
+    Requires:
+        * pandas
+        * seaborn
+        * numpy
+    """
+
+    import pandas as pd
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    import numpy as np
+
+    x1 = pd.pivot_table(df, values = 'freq', index=['mcls'], columns='date3',  aggfunc = np.sum)
+
+    #bw = sns.palplot(sns.cubehelix_palette(50, hue=0.05, rot=0, light=0.9, dark=0))
+
+    sns.heatmap(x1, annot= True, linewidth = 0.5)
+
+    #plot lables and style
+    sns.set_style("white", rc= {"xtick.bottom": True, "ytick.left": True,})
+    sns.set_context("paper", font_scale = 0.9)
+    plt.xticks(rotation=45, fontname = "Sans Serif", fontsize=10)
+    plt.yticks(rotation=0, fontname = "Carlito", fontsize=10)
+    plt.xlabel("Opening Production Dates", fontname = "Sans Serif", fontsize=12)
+    plt.ylabel('Material Class', fontname = "Sans Serif", fontsize=12)
+    plt.tight_layout()
+
+    #save options
+    if save_plot == 'Y':
+         plt.savefig(out_ti + fext, dpi = 1200)
+    else:
+        pass
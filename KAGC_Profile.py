@@ -0,0 +1,290 @@
+# KAGC Profiling Hooks
+
+"""
+This moduel provides opt-in instrumentation of the KAGC loaders, the Context class and the plotting
+functions, to find where the time goes in a slow chapter notebook: the SQLite read, the crosstabs,
+or saving a figure at 1200 dpi.
+
+Enable() wraps the functions in place and Disable() puts the originals back, so nothing is
+measured, and nothing costs anything, unless profiling is switched on. Each call records its wall
+time, the rows going in and coming out, and, when trace_memory is on, its peak Python memory
+(tracemalloc). The records can be summarised per function (Report), or exported as a Chrome /
+Perfetto JSON trace (Export_Trace) or as folded stacks for flame graphs (Export_Folded).
+
+# File Metadata
+* Associated Publication: Given, Michael, Chris Mavromatis, and R. Smadar Gabrieli, ed. (2024) City and Cemetery: Excavations at Kourion’s Amathous Gate Cemetery, Cyprus. The Excavations of Danielle A. Parks (Annual of the American Society of Overseas Research, Volumes 76 & 77, ASOR).
+
+* File Name: KAGC_Profile.py
+
+* File Format: text
+
+* Software:
+    * Python (3.10.10), Ipython (8.12.0),
+        * Python Distibution: Anaconda 3
+    * Visual Studio Code (1.79.2)
+
+* Processing History:
+    * Profiling of the analysis of cleaned artifact datasets by Depositional Unit (DU).
+
+* Required Python Packages:
+    * pandas    : 1.5.3
+    * tracemalloc, json (standard library)
+
+* Other Project Moduels:
+    * KAGC_Functions
+    * KAGC_Context_Class
+    * KAGC_Plots
+
+e.g., import KAGC_Profile as KAGC_PRF
+      KAGC_PRF.Enable(trace_memory=True)
+      a603 = co.Context(KAGC_FUN.DU_Select(df, KAGC_DUS.A603, 'A603'), -24)
+      KAGC_FUN.FC_DatePlt(a603, 'Y', 'Y', 'Fig_7_12', '.pdf', -300, 800)
+      KAGC_PRF.Disable()
+      KAGC_PRF.Report()
+      KAGC_PRF.Export_Trace('chapter7_trace.json')
+"""
+
+# Functions wrapped by Enable: module name -> attribute names (None: every public function)
+TARGETS = {
+    'KAGC_Functions': ['DB_Con', 'data', 'DU_Load', 'DU_Select', 'DB_Open', 'DU_Explode', 'DUSmry_Batch',
+                       'UBQ_MCLS', 'UBQ_Site', 'Jaccard_Matrix', 'MC_Dating', 'Aoristic', 'TypeForms',
+                       'ProdDates'],
+    'KAGC_Plots': None,
+}
+LIBRARIES = {
+    'pandas': ['read_sql_query', 'crosstab'],
+    'matplotlib.pyplot': ['savefig'],
+}
+
+_STATE = {'on': False, 'patched': [], 'records': [], 'stack': [], 'memory': False}
+
+
+def _rows(x):
+    # number of rows of a dataframe, series or Context (its cdu), else None
+    import pandas as pd
+
+    if isinstance(x, (pd.DataFrame, pd.Series)):
+        return len(x)
+    cdu = getattr(x, '__dict__', {}).get('_cdu')
+    if isinstance(cdu, pd.DataFrame):
+        return len(cdu)
+    return None
+
+
+def _wrap(name, fn):
+    import functools
+    import threading
+    import time
+    import tracemalloc
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        stack = _STATE['stack']
+        mem = _STATE['memory'] and tracemalloc.is_tracing()
+        if mem:
+            cur, peak = tracemalloc.get_traced_memory()
+            if stack:
+                stack[-1]['seen'] = max(stack[-1]['seen'], peak)
+            tracemalloc.reset_peak()
+        rec = {'name': name, 'depth': len(stack), 'parent': stack[-1]['id'] if stack else None,
+               'id': len(_STATE['records']), 'thread': threading.get_ident(),
+               'rows_in': _rows(args[0]) if args else None, 'seen': 0, 'mem0': cur if mem else 0}
+        _STATE['records'].append(rec)
+        stack.append(rec)
+        rec['start'] = time.perf_counter_ns()
+        try:
+            out = fn(*args, **kwargs)
+        finally:
+            rec['dur'] = time.perf_counter_ns() - rec['start']
+            stack.pop()
+            if mem:
+                peak = max(rec['seen'], tracemalloc.get_traced_memory()[1])
+                rec['peak_bytes'] = peak - rec['mem0']
+                if stack:
+                    stack[-1]['seen'] = max(stack[-1]['seen'], peak)
+        rec['rows_out'] = _rows(out)
+        return out
+
+    wrapper._kagc_original = fn
+    return wrapper
+
+
+def _patch(owner, attr, label):
+    fn = owner.__dict__.get(attr) if isinstance(owner, type) else getattr(owner, attr, None)
+    if fn is None or not callable(fn) or hasattr(fn, '_kagc_original') or isinstance(fn, property):
+        return
+    setattr(owner, attr, _wrap(label, fn))
+    _STATE['patched'].append((owner, attr, fn))
+
+
+def Enable(trace_memory=False, libraries=True, targets=None):
+    """
+    Starts recording. Wraps the KAGC_Functions loaders and summaries, every public Context method,
+    every KAGC_Plots function and, with libraries = True, pandas read_sql_query and crosstab and
+    matplotlib savefig (when matplotlib is installed).
+
+    Arguments:
+        * trace_memory = True also records each call's peak memory with tracemalloc (slower)
+        * libraries = False leaves pandas and matplotlib alone
+        * targets = optional dictionary of module name: list of function names to wrap as well
+    """
+
+    import importlib
+    import inspect
+    import tracemalloc
+
+    if _STATE['on']:
+        Disable()
+
+    mods = dict(TARGETS, **(targets or {}))
+    if libraries:
+        mods.update({k: v for k, v in LIBRARIES.items() if k not in mods})
+    for mod, names in mods.items():
+        try:
+            m = importlib.import_module(mod)
+        except ImportError:
+            continue
+        if names is None:
+            names = [n for n, f in vars(m).items() if inspect.isfunction(f) and not n.startswith('_')
+                     and f.__module__ == m.__name__]
+        short = mod.split('.')[-1]
+        for n in names:
+            _patch(m, n, short + '.' + n)
+
+    import KAGC_Context_Class as co
+    for n, f in list(vars(co.Context).items()):
+        if inspect.isfunction(f) and not n.startswith('_'):
+            _patch(co.Context, n, 'Context.' + n)
+
+    _STATE['memory'] = trace_memory
+    if trace_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+        _STATE['started_tracemalloc'] = True
+    _STATE['on'] = True
+
+
+def Disable():
+    """
+    Stops recording and restores the original functions. The records are kept for Report and the exports.
+    """
+
+    import tracemalloc
+
+    for owner, attr, fn in reversed(_STATE['patched']):
+        setattr(owner, attr, fn)
+    _STATE['patched'] = []
+    if _STATE.pop('started_tracemalloc', False):
+        tracemalloc.stop()
+    _STATE['on'] = False
+
+
+def Reset():
+    """
+    Clears the records.
+    """
+    _STATE['records'] = []
+    _STATE['stack'] = []
+
+
+class Profile():
+    """
+    Records the calls made inside a with-block.
+
+    E.g., with KAGC_PRF.Profile(trace_memory=True):
+              b503.DUSmry()
+          KAGC_PRF.Report()
+    """
+
+    def __init__(self, **kwargs):
+        self.kwargs = kwargs
+
+    def __enter__(self):
+        Enable(**self.kwargs)
+        return self
+
+    def __exit__(self, *exc):
+        Disable()
+
+
+def Records():
+    """
+    Every recorded call as a dataframe: name, depth, parent, start and duration (seconds), rows in and out, peak memory.
+    """
+
+    import pandas as pd
+
+    r = pd.DataFrame([{k: v for k, v in x.items() if k not in ('seen', 'mem0')}
+                      for x in _STATE['records'] if 'dur' in x])
+    if r.empty:
+        return r
+    t0 = r.start.min()
+    r['start_s'] = (r.pop('start') - t0) / 1e9
+    r['wall_s'] = r.pop('dur') / 1e9
+    return r
+
+
+def Report():
+    """
+    The session summary per function: calls, total, mean and max wall time, self time (total minus
+    the wrapped calls it made), rows in and out, and peak memory in MB, slowest first.
+    """
+
+    import pandas as pd
+
+    r = Records()
+    if r.empty:
+        return r
+    child = r.groupby('parent').wall_s.sum()
+    r['self_s'] = r.wall_s - r.id.map(child).fillna(0)
+    if 'peak_bytes' not in r:
+        r['peak_bytes'] = float('nan')
+    out = r.groupby('name').agg(calls=('wall_s', 'size'), total_s=('wall_s', 'sum'), mean_s=('wall_s', 'mean'),
+                                max_s=('wall_s', 'max'), self_s=('self_s', 'sum'), rows_in=('rows_in', 'sum'),
+                                rows_out=('rows_out', 'sum'), peak_mb=('peak_bytes', 'max'))
+    out['peak_mb'] = out.peak_mb / 2**20
+    return out.sort_values('total_s', ascending=False)
+
+
+def Export_Trace(path):
+    """
+    Writes the records as a Chrome trace (JSON), which chrome://tracing, Perfetto and speedscope open
+    as a timeline / flame chart.
+    """
+
+    import json
+    import os
+
+    r = Records()
+    pid = os.getpid()
+    ev = [{'name': x.name, 'ph': 'X', 'ts': x.start_s * 1e6, 'dur': x.wall_s * 1e6, 'pid': pid, 'tid': int(x.thread),
+           'args': {k: (None if v != v else v) for k, v in
+                    (('rows_in', x.rows_in), ('rows_out', x.rows_out), ('peak_bytes', getattr(x, 'peak_bytes', None)))
+                    if v is not None}}
+          for x in r.itertuples()] if not r.empty else []
+    with open(path, 'w') as f:
+        json.dump({'traceEvents': ev, 'displayTimeUnit': 'ms'}, f)
+    return path
+
+
+def Export_Folded(path):
+    """
+    Writes folded stacks ('outer;inner microseconds' per line, self time) for flamegraph.pl or speedscope.
+    """
+
+    r = Records()
+    lines = {}
+    if not r.empty:
+        name = dict(zip(r.id, r.name))
+        parent = dict(zip(r.id, r.parent))
+        child = r.groupby('parent').wall_s.sum()
+        for x in r.itertuples():
+            chain, p = [x.name], parent[x.id]
+            while p is not None and p == p:
+                chain.append(name[p])
+                p = parent.get(p)
+            key = ';'.join(reversed(chain))
+            lines[key] = lines.get(key, 0) + max(0.0, x.wall_s - child.get(x.id, 0.0))
+    with open(path, 'w') as f:
+        for k, v in lines.items():
+            f.write('%s %d\n' % (k, round(v * 1e6)))
+    return path
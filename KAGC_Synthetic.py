@@ -0,0 +1,267 @@
+# KAGC Synthetic Data Generator
+
+"""
+This moduel generates synthetic artifact tables that follow the project database schema (see README),
+so the functions and the Context class can be tested and benchmarked as a site grows, from 10k to 10M rows
+and from hundreds to tens of thousands of contexts and Depositional Units (DU).
+
+The tables imitate the structure of the KAGC data rather than its content:
+    * contexts are grouped into trenches and tombs in areas A, B and E, and hold very unequal numbers of finds
+    * each material class (mcls) has its own share of the finds, gross functional classes (type3), and a
+      catalogue of type-forms (diag) with fixed production spans (date3, date4)
+    * each context has a deposition date; its finds are drawn from the type-forms already in production,
+      with older, residual forms becoming less likely
+    * about a quarter of the finds are undiagnostic and undated
+    * DUs are runs of contexts from the same trench or tomb, and a few contexts belong to two DUs
+
+# File Metadata
+* Associated Publication: Given, Michael, Chris Mavromatis, and R. Smadar Gabrieli, ed. (2024) City and Cemetery: Excavations at Kourion’s Amathous Gate Cemetery, Cyprus. The Excavations of Danielle A. Parks (Annual of the American Society of Overseas Research, Volumes 76 & 77, ASOR).
+
+* File Name: KAGC_Synthetic.py
+
+* File Format: text
+
+* Software:
+    * Python (3.10.10), Ipython (8.12.0),
+        * Python Distibution: Anaconda 3
+    * Visual Studio Code (1.79.2)
+
+* Processing History:
+    * Synthetic data for testing and benchmarking; not project data.
+
+* Required Python Packages:
+    * pandas    : 1.5.3
+    * numpy     : 1.23.5
+    * sqlite3   : 2.6.0
+
+* Other Project Moduels:
+    * None (the tables are made for KAGC_Functions and KAGC_Context_Class)
+"""
+
+# Share of finds, type3 classes, and type1 objects for each material class
+MCLS = {
+    'cer':  (0.26, ['storage-processing', 'domestic', 'utensil'], ['jug', 'cooking pot', 'bowl', 'basin']),
+    'amp':  (0.22, ['transport-storage'], ['amphora', 'amphora stopper']),
+    'fw':   (0.12, ['tableware'], ['plate', 'bowl', 'cup', 'dish']),
+    'gls':  (0.10, ['tableware', 'ung', 'architectural'], ['stemmed goblet', 'unguentarium', 'windowpane', 'bottle']),
+    'lmp':  (0.07, ['illumination'], ['lamp']),
+    'num':  (0.06, ['p.item'], ['coin']),
+    'mtl':  (0.06, ['tool', 'p.item', 'architectural', 'production'], ['nail', 'fitting', 'needle', 'slag']),
+    'jwl':  (0.04, ['p.adornment'], ['bead', 'hairpin', 'earring', 'ring', 'bracelet']),
+    'stn':  (0.03, ['architectural', 'tool', 'reduction'], ['revetment', 'moulding', 'whetstone', 'debitage']),
+    'plst': (0.02, ['architectural', 'display'], ['plaster', 'stucco']),
+    'trc':  (0.02, ['display', 'special purpose', 'commemoration'], ['figurine', 'plaque'])
+}
+
+COND = ['fragment', 'intact', 'weathered', 'abraded', 'pitted', None]
+PARTS = ['rim', 'base', 'handle', 'body', 'shaft', 'intact', None]
+
+
+def _contexts(n_contexts, rng):
+    """
+    Context names (cxn) with their area, name and tb.tr, grouped into trenches and tombs of 1 to 30 contexts.
+    """
+
+    import numpy as np
+    import pandas as pd
+
+    rows, t = [], 0
+    while len(rows) < n_contexts:
+        t += 1
+        area = rng.choice(['A', 'B', 'E'], p=[0.5, 0.4, 0.1])
+        tomb = area != 'A' and rng.random() < 0.6
+        name = ('TB%02d' % t if area == 'B' else 'T%s%02d' % (area, t)) if tomb else 'TR%s%02d' % (area, t)
+        for j in range(int(rng.integers(1, 31))):
+            rows.append((area, name, 'T' if tomb else 'TR', '%s-%d' % (name, j)))
+    return pd.DataFrame(rows[:n_contexts], columns=['area', 'name', 'tb.tr', 'cxn'])
+
+
+def _forms(rng, n_forms=80):
+    """
+    A catalogue of type-forms for each material class with fixed production spans, sorted by date3.
+    """
+
+    import numpy as np
+
+    out = {}
+    for m in MCLS:
+        d3 = np.sort(rng.choice(np.arange(-700, 701, 25), n_forms)).astype(float)
+        d4 = d3 + rng.choice([0, 25, 50, 75, 100, 150, 200, 300, 400, 600], n_forms,
+                             p=[.04, .1, .16, .12, .2, .12, .12, .08, .04, .02])
+        out[m] = (['%s form %d' % (m, i) for i in range(n_forms)], d3, d4)
+    return out
+
+
+def Synthetic_DUS(cx, n_dus=None, seed=0, shared=0.05):
+    """
+    Groups contexts into DUs, each a run of contexts from one trench or tomb;
+    a share of the contexts also joins the next DU.
+
+    Arguments:
+        * cx = dataframe of contexts from Synthetic_Site (or any frame with name and cxn)
+        * n_dus = number of DUs (default: a DU for about every 8 contexts)
+        * seed = random seed
+        * shared = share of contexts that belong to two DUs
+
+    Returns:
+        a dictionary of DU names and Contributing Context lists, as KAGC_DUS.DU_Dict()
+    """
+
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    cx = cx.drop_duplicates('cxn')
+    n_dus = max(1, n_dus or len(cx) // 8)
+    # DU boundaries: every trench/tomb change, plus random cuts inside until there are n_dus
+    names = cx['name'].to_numpy()
+    cuts = set(np.flatnonzero(names[1:] != names[:-1]) + 1)
+    extra = rng.permutation(np.setdiff1d(np.arange(1, len(cx)), list(cuts)))
+    if len(cuts) + 1 > n_dus:
+        cuts = set(rng.choice(sorted(cuts), n_dus - 1, replace=False)) if n_dus > 1 else set()
+    else:
+        cuts |= set(extra[:n_dus - 1 - len(cuts)])
+    bounds = [0] + sorted(cuts) + [len(cx)]
+
+    c = cx['cxn'].tolist()
+    DUS = {}
+    for i in range(len(bounds) - 1):
+        cc = c[bounds[i]:bounds[i + 1]]
+        if i + 1 < len(bounds) - 1 and rng.random() < shared * len(cc):
+            cc = cc + [c[bounds[i + 1]]]
+        DUS['SD%05d' % (i + 1)] = cc
+    return DUS
+
+
+def _site(n_contexts, seed):
+    # contexts with unequal find weights and deposition dates, and the type-form catalogue
+    import numpy as np
+
+    rng = np.random.default_rng([seed, 0])
+    cx = _contexts(n_contexts, rng)
+    cx['_w'] = rng.lognormal(0, 1.2, len(cx))
+    cx['_dep'] = rng.uniform(-300, 750, len(cx))
+    return cx, _forms(rng)
+
+
+def _rows(n, cx, forms, rng, start=0):
+    """
+    n synthetic artifacts from the contexts and type-form catalogue of _site.
+    """
+
+    import numpy as np
+    import pandas as pd
+
+    ci = rng.choice(len(cx), n, p=(cx._w / cx._w.sum()).to_numpy())
+    dep = cx._dep.to_numpy()[ci]
+
+    shares = np.array([v[0] for v in MCLS.values()])
+    mcls = np.array(list(MCLS))[rng.choice(len(MCLS), n, p=shares / shares.sum())]
+
+    diag = np.full(n, None, dtype=object)
+    type3 = np.full(n, None, dtype=object)
+    type1 = np.full(n, None, dtype=object)
+    d3 = np.full(n, np.nan)
+    d4 = np.full(n, np.nan)
+    dated = rng.random(n) > 0.25
+    for m, (share, t3, t1) in MCLS.items():
+        sel = np.flatnonzero(mcls == m)
+        type3[sel] = np.array(t3, dtype=object)[rng.integers(0, len(t3), len(sel))]
+        type1[sel] = np.array(t1, dtype=object)[rng.integers(0, len(t1), len(sel))]
+        names, f3, f4 = forms[m]
+        # forms already in production at deposition; recent ones are the most likely
+        k = np.maximum(np.searchsorted(f3, dep[sel], 'right'), 1)
+        fi = np.minimum((k * np.sqrt(rng.random(len(sel)))).astype(int), k - 1)
+        ok = sel[dated[sel]]
+        fi = fi[dated[sel]]
+        diag[ok] = np.array(names, dtype=object)[fi]
+        d3[ok], d4[ok] = f3[fi], f4[fi]
+    diag[~dated] = np.where(rng.random((~dated).sum()) < 0.5, 'UnID', None)
+
+    date1 = np.where(np.isnan(d3), 'UnID', np.where(d4 < 0, 'BC', np.where(d3 < 0, 'BC-AD', 'AD')))
+    num = np.arange(start, start + n).astype(str)
+    c = cx.iloc[ci]
+    return pd.DataFrame({
+        'area': c['area'].to_numpy(), 'name': c['name'].to_numpy(), 'tb.tr': c['tb.tr'].to_numpy(),
+        'context': [x.split('-', 1)[1] for x in c['cxn']], 'cxn': c['cxn'].to_numpy(), 'mcls': mcls,
+        'number': np.char.add('SYN', num).astype(object),
+        'diag': diag,
+        'Cat': np.where(rng.random(n) < 0.15, np.char.add('C', num).astype(object), None),
+        'date1': date1,
+        'date2': [f'{a} {b:.0f}-{e:.0f}' if b == b else 'UnID nan-nan' for a, b, e in zip(date1, d3, d4)],
+        'date3': d3, 'date4': d4,
+        'type1': type1,
+        'type2': np.array(PARTS, dtype=object)[rng.integers(0, len(PARTS), n)],
+        'type3': type3,
+        'type4': np.where(rng.random(n) < 0.3, 'wheel-made', None),
+        'type5': None, 'type6': None,
+        'cond': np.array(COND, dtype=object)[rng.integers(0, len(COND), n)],
+        'burnt': np.where(rng.random(n) < 0.05, 'Y', None),
+        'join': np.where(rng.random(n) < 0.03, 'Y', None),
+        'PL': np.round(rng.gamma(2.0, 2.0, n), 2),
+        'PW': np.where(rng.random(n) < 0.5, np.round(rng.gamma(2.0, 1.5, n), 2), np.nan),
+        'date5': None,
+        'description': 'synthetic record'})
+
+
+def Synthetic_Site(n_rows=10000, n_contexts=500, n_dus=None, seed=0, chunk_rows=500000):
+    """
+    Generates a synthetic art table and its DU lists.
+
+    Arguments:
+        * n_rows = number of artifacts
+        * n_contexts = number of contexts
+        * n_dus = number of DUs (default: a DU for about every 8 contexts)
+        * seed = random seed; the same arguments give the same table, in memory or from Synthetic_DB
+        * chunk_rows = rows generated per step
+
+    Returns:
+        a tuple of (dataframe with the art table columns, dictionary of DU names and Contributing Context lists)
+
+    Requires:
+        * numpy
+        * pandas
+
+    e.g., df, DUS = KAGC_SYN.Synthetic_Site(100000, 2000)
+    """
+
+    import numpy as np
+    import pandas as pd
+
+    cx, forms = _site(n_contexts, seed)
+    parts = [_rows(min(chunk_rows, n_rows - i), cx, forms, np.random.default_rng([seed, 1, i]), i)
+             for i in range(0, n_rows, chunk_rows)]
+    return pd.concat(parts, ignore_index=True), Synthetic_DUS(cx, n_dus, seed)
+
+
+def Synthetic_DB(db, n_rows=10000, n_contexts=500, n_dus=None, seed=0, chunk_rows=500000):
+    """
+    Writes a synthetic art table to a SQLite database (replacing any art table there) in chunks,
+    so tables of millions of rows are never held in memory at once.
+
+    Arguments:
+        * db = path of the SQLite database to write
+        * n_rows, n_contexts, n_dus, seed, chunk_rows = as Synthetic_Site
+
+    Returns:
+        the dictionary of DU names and Contributing Context lists
+
+    Requires:
+        * numpy
+        * pandas
+        * sqlite3
+
+    e.g., DUS = KAGC_SYN.Synthetic_DB('syn_1M.db', 1000000, 20000)
+    """
+
+    import sqlite3 as sql3
+    import numpy as np
+
+    cx, forms = _site(n_contexts, seed)
+    conn = sql3.connect(db)
+    conn.execute('DROP TABLE IF EXISTS art')
+    for i in range(0, n_rows, chunk_rows):
+        part = _rows(min(chunk_rows, n_rows - i), cx, forms, np.random.default_rng([seed, 1, i]), i)
+        part.to_sql('art', conn, if_exists='append', index=False)
+    conn.commit()
+    conn.close()
+    return Synthetic_DUS(cx, n_dus, seed)
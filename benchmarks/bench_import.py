@@ -0,0 +1,65 @@
+# KAGC import-time benchmark
+
+"""
+Measures how long a fresh interpreter takes to import the KAGC analysis moduels and run a 
+headless summary job, and checks that matplotlib and seaborn are not loaded along the way. 
+Each case runs in its own subprocess so nothing is already imported.
+
+Usage (from the repository folder):
+    python benchmarks/bench_import.py [--db art.db] [--repeat 5]
+
+Without --db only the imports are timed. With --db a DUSmry_Batch over every DU is run as well.
+
+Requires:
+    * Python standard library only (the moduels under test need pandas and numpy)
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+JOB = r'''
+import sys, time, json
+t0 = time.perf_counter()
+import KAGC_Functions as KAGC_FUN
+import KAGC_Context_Class as co
+import KAGC_Depositional_Units as KAGC_DUS
+t1 = time.perf_counter()
+if len(sys.argv) > 1:
+    df = KAGC_FUN.DB_Con(sys.argv[1])
+    KAGC_FUN.DUSmry_Batch(df, KAGC_DUS.DU_Dict(), -24)
+t2 = time.perf_counter()
+print(json.dumps({'import_s': t1 - t0, 'job_s': t2 - t1,
+                  'matplotlib': 'matplotlib' in sys.modules, 'seaborn': 'seaborn' in sys.modules}))
+'''
+
+
+def run(db=None):
+    cmd = [sys.executable, '-c', JOB] + ([db] if db else [])
+    out = subprocess.run(cmd, cwd=ROOT, capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    ap.add_argument('--db', default=None, help='project SQLite database for the headless summary job')
+    ap.add_argument('--repeat', type=int, default=5)
+    args = ap.parse_args(argv)
+
+    runs = [run(args.db) for _ in range(args.repeat)]
+    res = {'repeat': args.repeat,
+           'import_s_median': statistics.median(r['import_s'] for r in runs),
+           'job_s_median': statistics.median(r['job_s'] for r in runs),
+           'matplotlib_loaded': any(r['matplotlib'] for r in runs),
+           'seaborn_loaded': any(r['seaborn'] for r in runs)}
+    print(json.dumps(res, indent=1))
+    return res
+
+
+if __name__ == '__main__':
+    main()
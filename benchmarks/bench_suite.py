@@ -0,0 +1,257 @@
+# KAGC benchmark suite
+
+"""
+Times the KAGC functions and the Context class on synthetic sites (KAGC_Synthetic) of a chosen size,
+and saves the results as JSON so runs on different code versions or machines can be compared.
+A case that raises is reported as a failure (and the run exits with status 1), not as a timing.
+The synthetic database and snapshot are written to a temporary folder that is removed afterwards.
+
+Groups of cases:
+    * load: DB_Con, DB_Open of a columnar snapshot, DU_Load of one DU, DBSession DU loads
+    * select: DU_Select with and without a CxnIndex, DU_Explode of every DU
+    * context: every Context method, first (computed) and second (cached) call, filters on the cached 
+      tables, and FCounts, ResidualForms and DUSmry on the compact schema (MKG1-3 are skipped when 
+      KAGC_MarkerArts cannot be imported)
+    * batch: DUSmry_Batch, a DUSmry loop over Contexts, UBQ_MCLS and UBQ_Site, Jaccard_Matrix
+    * plots: every plotting function with the Agg backend (skipped when matplotlib is missing)
+
+Usage (from the repository folder):
+    python benchmarks/bench_suite.py --rows 100000 --contexts 2000 --out results.json
+    python benchmarks/bench_suite.py --compare old.json new.json
+
+Requires:
+    * numpy
+    * pandas
+    * KAGC_Synthetic, KAGC_Functions, KAGC_Context_Class
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def timed(fn, repeat):
+    """
+    Runs fn repeat times and returns the timings in seconds.
+    """
+    out = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn()
+        out.append(time.perf_counter() - t)
+    return out
+
+
+class Suite():
+    """
+    Collects the cases of one run.
+    """
+
+    def __init__(self, repeat, only=None):
+        self.repeat = repeat
+        self.only = only
+        self.results = {}
+        self.failures = {}
+
+    def case(self, group, name, fn, repeat=None):
+        if self.only and group not in self.only:
+            return
+        key = group + '/' + name
+        try:
+            t = timed(fn, repeat or self.repeat)
+        except Exception as e:
+            self.failures[key] = '%s: %s' % (type(e).__name__, e)
+            print('%-45s FAILED %s' % (key, self.failures[key]), flush=True)
+            return
+        self.results[key] = {'median_s': statistics.median(t), 'min_s': min(t), 'runs': len(t)}
+        print('%-45s %s' % (key, self.results[key]), flush=True)
+
+
+def run(args):
+    import KAGC_Functions as KAGC_FUN
+
+    with tempfile.TemporaryDirectory(prefix='kagc_bench_') as tmp:
+        try:
+            return run_cases(args, tmp)
+        finally:
+            # drop the memory-mapped snapshots before the folder is removed
+            KAGC_FUN._SNAPSHOTS.clear()
+
+
+def run_cases(args, tmp):
+    import warnings
+    import KAGC_Synthetic as KAGC_SYN
+    import KAGC_Functions as KAGC_FUN
+    import KAGC_Context_Class as co
+
+    warnings.simplefilter('ignore')
+    db = os.path.join(tmp, 'art.db')
+
+    t = time.perf_counter()
+    DUS = KAGC_SYN.Synthetic_DB(db, args.rows, args.contexts, args.dus, seed=args.seed)
+    gen_s = time.perf_counter() - t
+
+    s = Suite(args.repeat, args.only)
+    df = KAGC_FUN.DB_Con(db)
+    sizes = {k: len(v) for k, v in DUS.items()}
+    du = max(sizes, key=sizes.get)
+    DU = DUS[du]
+
+    # load
+    s.case('load', 'DB_Con', lambda: KAGC_FUN.DB_Con(db))
+    KAGC_FUN.DB_Export(db, os.path.join(tmp, 'snap'))
+
+    def open_snapshot():
+        KAGC_FUN._SNAPSHOTS.clear()
+        KAGC_FUN.DB_Open(os.path.join(tmp, 'snap'), db)
+    s.case('load', 'DB_Open', open_snapshot)
+    s.case('load', 'DU_Load', lambda: KAGC_FUN.DU_Load(db, DU, du))
+    first = list(DUS.items())[:50]
+
+    def session_loads():
+        with KAGC_FUN.DBSession(db) as ses:
+            for k, v in first:
+                KAGC_FUN.DU_Load(ses, v, k)
+    s.case('load', 'DBSession_50_DUs', session_loads)
+
+    # select
+    ix = KAGC_FUN.CxnIndex(df, DUS)
+    s.case('select', 'DU_Select', lambda: KAGC_FUN.DU_Select(df, DU, du))
+    s.case('select', 'DU_Select_index', lambda: KAGC_FUN.DU_Select(df, DU, du, index=ix))
+    s.case('select', 'CxnIndex_build', lambda: KAGC_FUN.CxnIndex(df, DUS))
+    s.case('select', 'DU_Explode_all', lambda: KAGC_FUN.DU_Explode(df, DUS))
+
+    # context
+    cdu = KAGC_FUN.DU_Select(df, DU, du)
+    methods = ['MCLS_Grps', 'MCLS_TPQS', 'CC_TPQS', 'UniqueForms', 'ResidualForms', 'FCounts', 
+               'DUCatNos', 'DUSmry', 'MKG1', 'MKG2', 'MKG3']
+    try:
+        import KAGC_MarkerArts
+    except ImportError:
+        # the MKG methods import the marker artifact lists under this name
+        methods = [m for m in methods if not m.startswith('MKG')]
+        if not args.only or 'context' in args.only:
+            s.results['context/MKG*'] = {'skipped': 'KAGC_MarkerArts not importable'}
+    for m in methods:
+        def first_call(m=m):
+            getattr(co.Context(cdu, -24), m)()
+        s.case('context', m, first_call)
+        c = co.Context(cdu, -24)
+        try:
+            getattr(c, m)()
+        except Exception:
+            continue
+        s.case('context', m + '_cached', lambda c=c, m=m: getattr(c, m)())
+
+    # the notebook filter on cached tables, and the methods on the compact schema
+    c = co.Context(cdu, -24)
+    s.case('context', 'FCounts_mcls_filter', lambda: c.FCounts()[c.FCounts().mcls == 'amp'])
+    s.case('context', 'cdu_mcls_filter', lambda: c.cdu[c.cdu.mcls == 'amp'])
+    cdu_c = KAGC_FUN.DU_Select(KAGC_FUN.DB_Con(db, compact=True), DU, du)
+    for m in ['FCounts', 'ResidualForms', 'DUSmry']:
+        s.case('context', m + '_compact', lambda m=m: getattr(co.Context(cdu_c, -24), m)())
+
+    # batch
+    s.case('batch', 'DUSmry_Batch', lambda: KAGC_FUN.DUSmry_Batch(df, DUS, -24), repeat=1)
+    s.case('batch', 'DUSmry_loop', lambda: [co.Context(KAGC_FUN.DU_Select(df, v, k), -24).DUSmry() 
+                                            for k, v in DUS.items()], repeat=1)
+    s.case('batch', 'UBQ_MCLS_loop', lambda: [KAGC_FUN.UBQ_MCLS(KAGC_FUN.DU_Select(df, v, k), v) 
+                                              for k, v in DUS.items()], repeat=1)
+    s.case('batch', 'UBQ_Site', lambda: KAGC_FUN.UBQ_Site(df, DUS), repeat=1)
+    s.case('batch', 'Jaccard_Matrix_DU', lambda: KAGC_FUN.Jaccard_Matrix(df, DUS=DUS, sparse=True), repeat=1)
+
+    # plots
+    try:
+        import matplotlib
+        matplotlib.use('Agg')
+        import matplotlib.pyplot as plt
+    except ImportError:
+        plt = None
+    if plt is not None:
+        c = co.Context(cdu, -24)
+        calls = {'SC_DSpanPlt': lambda: KAGC_FUN.SC_DSpanPlt(cdu, 'N', '', '', -700, 1400),
+                 'CC_DSpanPlt': lambda: KAGC_FUN.CC_DSpanPlt(c, 'N', '', '', -700, 1400),
+                 'FC_DatePlt': lambda: KAGC_FUN.FC_DatePlt(c, 'Y', 'N', '', '', -700, 1400),
+                 'FC_DatePlt_Filtered': lambda: KAGC_FUN.FC_DatePlt_Filtered(c.FCounts(), 'N', '', '', -700, 1400),
+                 'DU_MCLS_TPQ_Plt': lambda: KAGC_FUN.DU_MCLS_TPQ_Plt(c, 'N', '', '', -700, 1400),
+                 'dateplot': lambda: KAGC_FUN.dateplot(cdu, 'N', '', '', -700, 1400),
+                 'HeatMapUF': lambda: KAGC_FUN.HeatMapUF(c.FCounts(), 'N', '', ''),
+                 'DU_UniqueItemPlot': lambda: KAGC_FUN.DU_UniqueItemPlot(c.cdu, 'N', '', ''),
+                 'HeatMapFC': lambda: KAGC_FUN.HeatMapFC(c.FCounts(), 'N', '', '')}
+        for k, fn in calls.items():
+            s.case('plots', k, lambda fn=fn: (fn(), plt.close('all')), repeat=1)
+    elif not args.only or 'plots' in args.only:
+        s.results['plots/*'] = {'skipped': 'matplotlib not installed'}
+
+    return {'meta': meta(args, gen_s, len(df), len(DUS), du, len(cdu)), 'results': s.results, 
+            'failures': s.failures}
+
+
+def meta(args, gen_s, rows, dus, du, du_rows):
+    import numpy as np
+    import pandas as pd
+
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                                text=True).stdout.strip()
+    except OSError:
+        commit = ''
+    return {'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'commit': commit,
+            'python': platform.python_version(), 'pandas': pd.__version__, 'numpy': np.__version__,
+            'machine': platform.machine(), 'platform': platform.platform(),
+            'rows': rows, 'contexts': args.contexts, 'dus': dus, 'seed': args.seed,
+            'largest_du': du, 'largest_du_rows': du_rows, 'generate_s': gen_s, 'repeat': args.repeat}
+
+
+def compare(old, new):
+    """
+    Prints the median times of two result files side by side with their ratio (new / old).
+    """
+    runs = [json.load(open(f)) for f in (old, new)]
+    a, b = [r['results'] for r in runs]
+    fa, fb = [r.get('failures', {}) for r in runs]
+    print('%-45s %10s %10s %7s' % ('case', 'old s', 'new s', 'ratio'))
+    for k in sorted(set(a) | set(b) | set(fa) | set(fb)):
+        x, y = a.get(k, {}).get('median_s'), b.get(k, {}).get('median_s')
+        r = '%7.2f' % (y / x) if x and y else '%7s' % '-'
+        x = 'FAILED' if k in fa else '%.4f' % x if x else '-'
+        y = 'FAILED' if k in fb else '%.4f' % y if y else '-'
+        print('%-45s %10s %10s %s' % (k, x, y, r))
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description='KAGC benchmark suite')
+    ap.add_argument('--rows', type=int, default=100000)
+    ap.add_argument('--contexts', type=int, default=2000)
+    ap.add_argument('--dus', type=int, default=None)
+    ap.add_argument('--seed', type=int, default=0)
+    ap.add_argument('--repeat', type=int, default=3)
+    ap.add_argument('--only', nargs='*', choices=['load', 'select', 'context', 'batch', 'plots'])
+    ap.add_argument('--out', default=None, help='JSON file for the results')
+    ap.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help='compare two result files')
+    args = ap.parse_args(argv)
+
+    if args.compare:
+        return compare(*args.compare)
+    res = run(args)
+    out = args.out or 'kagc_bench_%s_%d.json' % (res['meta']['commit'] or 'run', args.rows)
+    with open(out, 'w') as f:
+        json.dump(res, f, indent=1)
+    print('saved', out)
+    if res['failures']:
+        print('%d case(s) failed: %s' % (len(res['failures']), ', '.join(sorted(res['failures']))))
+    return res
+
+
+if __name__ == '__main__':
+    res = main()
+    sys.exit(1 if res and res['failures'] else 0)